@@ -0,0 +1,98 @@
+"""
+norm_ami 前處理的微基準測試
+
+用法（於專案根目錄）：
+    PYTHONPATH=. python dev-tools/bench_norm_ami.py
+
+以 14 個代表日 × 96 個 15 分鐘時段的合成 AMI 資料，比較逐列 apply 與
+向量化 classify_tou_level 標註 tou_level 的耗時，並確認兩者結果一致。
+"""
+
+import timeit
+
+import numpy as np
+import pandas as pd
+
+from shared.core import config_loader
+
+WEEKDAYS = [
+    "Monday",
+    "Tuesday",
+    "Wednesday",
+    "Thursday",
+    "Friday",
+    "Saturday",
+    "Sunday",
+]
+
+
+def make_ami_frame(seed=0):
+    """產生 14 profile × 96 slot 的合成 AMI 資料，含 tou / tou_max / tou_min"""
+    rng = np.random.default_rng(seed)
+    rows = []
+    for is_summer in [1, 0]:
+        for weekday in WEEKDAYS:
+            for slot in range(96):
+                hour = slot // 4
+                if weekday == "Sunday":
+                    tou = 2.5
+                elif 16 <= hour < 22:
+                    tou = 9.0
+                elif 9 <= hour < 16:
+                    tou = 5.5
+                else:
+                    tou = 2.5
+                rows.append(
+                    {
+                        "season": "summer" if is_summer else "not_summer",
+                        "weekday2": weekday,
+                        "tou": tou,
+                        "load_kw": rng.uniform(100, 1000),
+                    }
+                )
+    df = pd.DataFrame(rows)
+    group = df.groupby(["season", "weekday2"])["tou"]
+    df["tou_max"] = group.transform("max")
+    df["tou_min"] = group.transform("min")
+    return df
+
+
+def classify_tou_apply(df):
+    """舊版逐列 apply 的實作，作為比較基準"""
+
+    def classify_tou(row):
+        if row["tou"] == row["tou_max"]:
+            return "high"
+        elif row["tou"] == row["tou_min"]:
+            return "low"
+        else:
+            return "other"
+
+    return df.apply(classify_tou, axis=1)
+
+
+def classify_tou_vectorized(df):
+    return config_loader.classify_tou_level(df["tou"], df["tou_max"], df["tou_min"])
+
+
+def bench(label, func, df, number=20):
+    seconds = min(timeit.repeat(lambda: func(df), number=number, repeat=5)) / number
+    print(f"{label:<24s} {seconds * 1000:8.3f} ms")
+    return seconds
+
+
+def main():
+    df = make_ami_frame()
+    print(f"AMI rows: {len(df)}")
+
+    expected = classify_tou_apply(df).to_numpy()
+    actual = classify_tou_vectorized(df)
+    assert (expected == actual).all(), "classify_tou_level 與 apply 結果不一致"
+
+    t_apply = bench("apply(classify_tou)", classify_tou_apply, df)
+    t_vec = bench("classify_tou_level", classify_tou_vectorized, df)
+    print(f"speedup: {t_apply / t_vec:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+"""
+financial_metrics 與逐列 npf.irr / 舊版純量公式的比對
+
+用法（於專案根目錄）：
+    PYTHONPATH=. python dev-tools/check_financial_metrics.py
+
+以固定亂數種子產生的 Net Cash 矩陣，逐列比較 financial_metrics.irr 與 npf.irr
+（atol 1e-9，兩者皆為 NaN 視為一致），並以舊版 generate_summary 的純量公式
+比較 ROI / Annual_ROI / Average_ROI / payback_year。涵蓋：
+- 只變號一次（Newton 法的快速路徑）
+- 完全不變號（NaN）
+- 開頭、結尾為 0
+- 變號兩次以上（多個解）
+- ROI <= -1（Annual_ROI 為 NaN、始終未回收）
+"""
+
+import numpy as np
+import numpy_financial as npf
+
+from shared.core import financial_metrics
+
+YEARS = 15
+ATOL = 1e-9
+
+
+def single_sign_change(rng, n=2000):
+    """一般的投資案：Year 0 投入，之後每年回收（IRR 由負到高報酬都有）"""
+    net_cash = rng.uniform(1e4, 5e6, (n, YEARS))
+    net_cash *= rng.uniform(0.02, 0.6, (n, 1))
+    year0 = -net_cash.sum(axis=1) * rng.uniform(0.3, 3, n)
+    # 前幾年虧損（仍只變號一次）
+    losses = rng.integers(0, 4, n)
+    for i, k in enumerate(losses):
+        net_cash[i, :k] = -rng.uniform(1e3, 1e5, k)
+    return np.column_stack([year0, net_cash])
+
+
+def no_sign_change(rng, n=200):
+    """全為正或全為負：IRR 無解"""
+    net_cash = rng.uniform(1e3, 1e6, (n, YEARS + 1))
+    net_cash[n // 2 :] *= -1
+    return net_cash
+
+
+def leading_trailing_zeros(rng, n=400):
+    """開頭或結尾為 0（如建置期、提前結束），以及全為 0"""
+    net_cash = single_sign_change(rng, n)
+    for i in range(n):
+        lead, trail = rng.integers(0, 4, 2)
+        shifted = np.zeros(YEARS + 1)
+        body = net_cash[i, : YEARS + 1 - lead - trail]
+        shifted[lead : lead + len(body)] = body
+        net_cash[i] = shifted
+    net_cash[::50] = 0
+    return net_cash
+
+
+def multiple_sign_changes(rng, n=400):
+    """中途有大額支出（如更換電池）或正負交錯，變號兩次以上"""
+    net_cash = single_sign_change(rng, n)
+    for i in range(n):
+        years = rng.choice(np.arange(2, YEARS + 1), rng.integers(1, 4), replace=False)
+        net_cash[i, years] = -net_cash[i, years] * rng.uniform(2, 20, len(years))
+    # 經典的多解案例：-100, 230, -132（10% 與 20%）
+    net_cash[0] = 0
+    net_cash[0, :3] = [-100, 230, -132]
+    return net_cash
+
+
+def total_loss(rng, n=100):
+    """ROI <= -1：回收不到任何成本（含 ROI 恰為 -1）"""
+    net_cash = np.zeros((n, YEARS + 1))
+    net_cash[:, 0] = -rng.uniform(1e5, 1e7, n)
+    net_cash[: n // 2, 1:] = -rng.uniform(0, 1e5, (n // 2, YEARS))
+    return net_cash
+
+
+def reference_metrics(row):
+    """舊版 generate_summary 逐情境的計算方式"""
+    自備資金 = -row[0]
+    ROI = (row[1:].sum() - 自備資金) / 自備資金
+    if ROI > -1:
+        Annual_ROI = (1 + ROI) ** (1 / YEARS) - 1
+    else:
+        Annual_ROI = float("nan")
+    cumulative = np.cumsum(row)
+    payback = next(
+        (year for year, value in enumerate(cumulative) if value >= 0), float("nan")
+    )
+    return {
+        "IRR": npf.irr(row),
+        "ROI": ROI,
+        "Annual_ROI": Annual_ROI,
+        "Average_ROI": ROI / YEARS,
+        "payback_year": payback,
+    }
+
+
+def mismatches(expected, actual):
+    close = np.isclose(actual, expected, rtol=0, atol=ATOL)
+    both_nan = np.isnan(actual) & np.isnan(expected)
+    return np.flatnonzero(~(close | both_nan))
+
+
+def check(label, net_cash):
+    with np.errstate(divide="ignore", invalid="ignore"):
+        actual = financial_metrics.compute_financial_metrics(net_cash)
+        expected = [reference_metrics(row) for row in net_cash]
+
+    failed = False
+    for metric, values in actual.items():
+        bad = mismatches(np.array([row[metric] for row in expected]), values)
+        if bad.size:
+            failed = True
+            i = bad[0]
+            print(
+                f"  {metric}: {bad.size} 列不一致，例如第 {i} 列 "
+                f"expected={expected[i][metric]!r} actual={values[i]!r}"
+            )
+    n_nan = int(np.isnan(actual["IRR"]).sum())
+    print(
+        f"{label:<24s} {len(net_cash):5d} 列  IRR 為 NaN: {n_nan:4d}  {'FAIL' if failed else 'OK'}"
+    )
+    return not failed
+
+
+def main():
+    rng = np.random.default_rng(20250101)
+    cases = [
+        ("只變號一次", single_sign_change(rng)),
+        ("完全不變號", no_sign_change(rng)),
+        ("開頭 / 結尾為 0", leading_trailing_zeros(rng)),
+        ("變號兩次以上", multiple_sign_changes(rng)),
+        ("ROI <= -1", total_loss(rng)),
+    ]
+    results = [check(label, net_cash) for label, net_cash in cases]
+    assert all(results), "financial_metrics 與 npf.irr / 舊版公式不一致"
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+unit_search.golden_section_search 與逐台試算的比對
+
+用法（於專案根目錄）：
+    PYTHONPATH=. python dev-tools/check_unit_search.py
+
+以合成的 IRR 對台數曲線取代 run_simulation，確認搜尋到的台數與逐台試算的最佳台數相同，
+並列出試算次數。涵蓋：
+- 單峰（一般的情況）
+- 前段 IRR 無解 (NaN)，之後才出現峰值
+- 台數間有跳動：高壓二段式電價、即時備轉單一投標的情境，1 台最好，
+  7 台掉到接近 0，8 台（達投標門檻）又跳回 0.236，8 台也是格點中最好的
+"""
+
+import math
+
+from shared.core import unit_search
+
+MAX_UNITS = 36
+# run_all_simulations 以 generate_fixed_step_combinations 產生的格點
+SEEDS = [8, 16, 24, 32]
+
+
+def unimodal(units):
+    """12 台附近最好"""
+    return 0.15 - 0.002 * (units - 12) ** 2 / 12
+
+
+def nan_then_peak(units):
+    """6 台以下 IRR 無解，8 台最好"""
+    if units <= 6:
+        return math.nan
+    if units == 7:
+        return -0.13
+    return 0.153 - 0.003 * (units - 8)
+
+
+def step_profile(units):
+    """1 台最好；2~7 台遞減到 0.007，8 台起跳回 0.236 後緩降"""
+    if units < 8:
+        return 0.743 - (0.743 - 0.007) * (units - 1) / 6
+    return 0.236 - 0.004 * (units - 8)
+
+
+def check(label, curve):
+    calls = []
+
+    def evaluate(requests):
+        calls.extend(requests)
+        return [curve(units) for _, units in requests]
+
+    result = unit_search.golden_section_search(
+        [label], 1, MAX_UNITS, evaluate, seeds=SEEDS
+    )[label]
+    expected = max(
+        range(1, MAX_UNITS + 1),
+        key=lambda units: unit_search._score(curve(units)),
+    )
+    ok = result["台數"] == expected
+    print(
+        f"{label:<16s} 最佳 {expected:2d} 台  搜尋結果 {result['台數']:2d} 台  "
+        f"試算 {len(calls):2d} 次  {'OK' if ok else 'FAIL'}"
+    )
+    return ok
+
+
+def main():
+    cases = [
+        ("單峰", unimodal),
+        ("前段無解", nan_then_peak),
+        ("台數間跳動", step_profile),
+    ]
+    results = [check(label, curve) for label, curve in cases]
+    assert all(results), "golden_section_search 與逐台試算的最佳台數不一致"
+
+
+if __name__ == "__main__":
+    main()
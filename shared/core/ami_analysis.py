@@ -0,0 +1,247 @@
+"""
+AMI 分析 context：同一次試算 (sweep) 各情境共用的 AMI 前置計算
+
+generate_summary 中的可轉移電量 (calculate_transferable_energy)、超約費用
+(calculate_over_capacity_penalties)、非夏月高峰數 (count_high_peaks)、
+即時備轉的負載統計 (compute_spinning_stats) 與日選時段型的抑低時段統計 (dr_window_stats)
+只跟 AMI 負載、計費類別、新契約容量與 PCS 功率有關，與 DR / 即時備轉 / 用電大戶方案無關。
+context 依 (PCS 功率, 時段, 是否考慮用電大戶) 快取這些結果，同一組台數的情境只需計算一次。
+非全日的時段與 DR 抑低時段統計由全日資料的 slot cube（各時段累加表）查表取得。
+可轉移電量與 DR 抑低契約容量再建成容量反應曲線 (calculator.transferable_energy_curve /
+dr_capacity_curve)，各年度、各台數相同 PCS 功率的容量都只需查表。
+
+快取的 DataFrame / dict 由所有情境共用，呼叫端只能讀取，不可修改。
+"""
+
+from shared.core import calculator, config_loader
+
+# 全日時段
+FULL_DAY = (("00:00", "23:45"),)
+
+
+def build_ami_context(df_ami, tou_program, contract_capacity):
+    """
+    建立 AMI 分析 context。
+
+    Parameters:
+        df_ami: norm_ami 後的 AMI 資料
+        tou_program: 計費類別
+        contract_capacity: 新契約容量 dict（config['電價方案']['契約容量']['new']）
+    """
+    return {
+        "df_ami": df_ami,
+        "tou_program": tou_program,
+        "contract_capacity": dict(contract_capacity),
+        "cache": {},
+    }
+
+
+def check_ami_context(context, tou_program, contract_capacity):
+    """確認 context 與目前情境的計費類別、新契約容量一致"""
+    if context["tou_program"] != tou_program:
+        raise ValueError(
+            f"ami_context 計費類別為 {context['tou_program']}，與 config 的 {tou_program} 不一致"
+        )
+    if context["contract_capacity"] != dict(contract_capacity):
+        raise ValueError("ami_context 的新契約容量與 config 不一致")
+
+
+def get_transferable_energy(
+    context, pcs_max_kW, time_periods=FULL_DAY, consider_large_consumer=False
+):
+    """
+    快取版 calculator.calculate_transferable_energy。
+    非全日的時段由全日結果的 slot cube 查表取得 df_ami2，不再重新計算。
+
+    Returns:
+        tuple: (df_segment, df_ami2)
+    """
+    time_periods = tuple(tuple(period) for period in time_periods)
+    key = ("transferable_energy", pcs_max_kW, time_periods, consider_large_consumer)
+    cache = context["cache"]
+    if key not in cache:
+        if time_periods == FULL_DAY:
+            cache[key] = calculator.calculate_transferable_energy(
+                context["df_ami"],
+                context["tou_program"],
+                context["contract_capacity"],
+                pcs_max_kW,
+                list(time_periods),
+                consider_large_consumer,
+            )
+        else:
+            df_full, _ = get_transferable_energy(context, pcs_max_kW)
+            start, end = time_periods[0]
+            slot = df_full["slot"]
+            df_segment = df_full[
+                (slot >= config_loader.time_str_to_slot(start, round_up=True))
+                & (slot <= config_loader.time_str_to_slot(end))
+            ].reset_index(drop=True)
+            cache[key] = (
+                df_segment,
+                calculator.transferable_energy_from_cube(
+                    get_slot_cube(context, pcs_max_kW),
+                    time_periods,
+                    consider_large_consumer,
+                ),
+            )
+    return cache[key]
+
+
+def get_slot_cube(context, pcs_max_kW):
+    """全日可轉移電量資料的 slot cube（calculator.build_slot_cube）"""
+    key = ("slot_cube", pcs_max_kW)
+    cache = context["cache"]
+    if key not in cache:
+        df_segment, _ = get_transferable_energy(context, pcs_max_kW)
+        cache[key] = calculator.build_slot_cube(df_segment)
+    return cache[key]
+
+
+def get_over_capacity_penalties(context, pcs_max_kW, consider_large_consumer=False):
+    """
+    快取版 config_loader.calculate_over_capacity_penalties（全日時段）。
+    consider_large_consumer 只用來重用同一份全日可轉移電量結果，不影響超約費用。
+    """
+    key = ("over_capacity_penalties", pcs_max_kW)
+    cache = context["cache"]
+    if key not in cache:
+        df_segment, _ = get_transferable_energy(
+            context, pcs_max_kW, FULL_DAY, consider_large_consumer
+        )
+        cache[key] = config_loader.calculate_over_capacity_penalties(
+            df_segment,
+            context["tou_program"],
+            config_loader.price_dict,
+            context["contract_capacity"],
+        )
+    return cache[key]
+
+
+def get_not_summer_high_peaks(context):
+    """非夏月週一的高峰段數，用來判斷非夏月是否可以兩循環"""
+    key = ("not_summer_high_peaks",)
+    cache = context["cache"]
+    if key not in cache:
+        df_ami = context["df_ami"]
+        cache[key] = calculator.count_high_peaks(
+            df_ami[
+                (df_ami["is_summer"] == 0) & (df_ami["weekday2"] == "Monday")
+            ].tou_level
+        )
+    return cache[key]
+
+
+def get_spinning_stats(context, pcs_max_kW, consider_large_consumer=False):
+    """
+    即時備轉收益所需、與可用容量無關的負載統計（以全日可轉移電量的資料計算）。
+
+    Returns:
+        tuple: (series_ami_weekend, df_spinning_stats)
+            series_ami_weekend: 非工作日的負載特徵 (spining_weekend_load_kw_stats)
+            df_spinning_stats: 工作日依 (season, spinning_level) 的統計 (compute_spinning_stats)
+    """
+    key = ("spinning_stats", pcs_max_kW, consider_large_consumer)
+    cache = context["cache"]
+    if key not in cache:
+        df_segment, _ = get_transferable_energy(
+            context, pcs_max_kW, FULL_DAY, consider_large_consumer
+        )
+        cache[key] = (
+            calculator.spining_weekend_load_kw_stats(
+                df_segment[df_segment["weekday"] != "week"], pcs_max_kW
+            ),
+            calculator.compute_spinning_stats(
+                df_segment[df_segment["weekday"] == "week"], pcs_max_kW
+            ),
+        )
+    return cache[key]
+
+
+def get_dr_window_stats(
+    context, pcs_max_kW, start_time, end_time, consider_large_consumer=False
+):
+    """
+    日選時段型抑低時段 (start_time ~ end_time) 內與儲能容量無關的統計
+    （以全日可轉移電量的資料計算，見 calculator.dr_window_stats）。
+    同一 sweep 中相同時段的 DR 方案與各年份共用。
+    """
+    key = ("dr_window_stats", pcs_max_kW, start_time, end_time, consider_large_consumer)
+    cache = context["cache"]
+    if key not in cache:
+        df_segment, df_ami2 = get_transferable_energy(
+            context, pcs_max_kW, FULL_DAY, consider_large_consumer
+        )
+        cache[key] = calculator.dr_window_stats(
+            df_segment,
+            df_ami2,
+            start_time,
+            end_time,
+            slot_cube=get_slot_cube(context, pcs_max_kW),
+        )
+    return cache[key]
+
+
+def get_transferable_energy_curve(
+    context, pcs_max_kW, season, time_periods=FULL_DAY, consider_large_consumer=False
+):
+    """可轉移電量的容量反應曲線（calculator.transferable_energy_curve）"""
+    time_periods = tuple(tuple(period) for period in time_periods)
+    key = (
+        "transferable_energy_curve",
+        pcs_max_kW,
+        season,
+        time_periods,
+        consider_large_consumer,
+    )
+    cache = context["cache"]
+    if key not in cache:
+        _, df_ami2 = get_transferable_energy(
+            context, pcs_max_kW, time_periods, consider_large_consumer
+        )
+        cache[key] = calculator.transferable_energy_curve(
+            df_ami2, season, consider_large_consumer
+        )
+    return cache[key]
+
+
+def lookup_transfered_energy(
+    context,
+    pcs_max_kW,
+    avail_kWh_series,
+    season,
+    rtt_loss_rate,
+    time_periods=FULL_DAY,
+    consider_large_consumer=False,
+):
+    """查表版 calculator.batch_calculate_transfered_energy，回傳值相同"""
+    return calculator.transfered_energy_from_curve(
+        get_transferable_energy_curve(
+            context, pcs_max_kW, season, time_periods, consider_large_consumer
+        ),
+        avail_kWh_series,
+        rtt_loss_rate,
+    )
+
+
+def get_dr_capacity_curve(
+    context, pcs_max_kW, start_time, end_time, dr_hr, consider_large_consumer=False
+):
+    """DR 抑低契約容量的容量反應曲線（calculator.dr_capacity_curve），dr_hr 需大於 0"""
+    key = (
+        "dr_capacity_curve",
+        pcs_max_kW,
+        start_time,
+        end_time,
+        dr_hr,
+        consider_large_consumer,
+    )
+    cache = context["cache"]
+    if key not in cache:
+        cache[key] = calculator.dr_capacity_curve(
+            get_dr_window_stats(
+                context, pcs_max_kW, start_time, end_time, consider_large_consumer
+            ),
+            dr_hr,
+        )
+    return cache[key]
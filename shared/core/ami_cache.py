@@ -0,0 +1,217 @@
+"""
+正規化後 AMI 資料 (norm_ami 輸出) 的 LRU 快取
+
+同一客戶重複試算時，讀取 AMI、依契約容量或手動曲線縮放、norm_ami 這幾步每次都相同。
+warm container 內以模組層級的 LRU 快取保存結果，key 為 AMI 輸入內容的雜湊
+（ID、手動曲線 JSON、縮放用契約容量）加上計費類別。
+
+df_tou_2025 以該計費類別時間電價的內容指紋 (config_loader.tou_fingerprint) 比對，
+呼叫端每次重新讀入時間電價表也能命中；內容改變時視為未命中。
+
+快取內的資料以唯讀 numpy 陣列保存，每次命中時重新組成 DataFrame（會複製），
+呼叫端可以自由新增或修改欄位，不會影響快取內容。
+
+記憶體上限預設 32 MB（256 MB 的 Lambda 留足空間給試算本身），
+可用環境變數 AMI_CACHE_MAX_BYTES 調整，設為 0 即停用快取。
+
+另外保留每個 (ID, 計費類別) 最近一次手動小時曲線的縮放結果，
+使用者在 UI 微調小時曲線時只需重算有變動的格子（見 config_loader.rescale_15min_by_hour）。
+"""
+
+import copy
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from shared.core.config_loader import tou_fingerprint
+
+DEFAULT_MAX_BYTES = 32 * 1024 * 1024
+DEFAULT_MAX_ENTRIES = 256
+# 保留最近幾組 (ID, 計費類別) 的小時曲線縮放結果
+DEFAULT_MAX_HOURLY_ENTRIES = 8
+
+_lock = threading.Lock()
+_entries = OrderedDict()
+_hourly_entries = OrderedDict()
+_stats = {"hits": 0, "misses": 0, "evictions": 0, "bytes": 0}
+_limits = {
+    "max_bytes": int(os.environ.get("AMI_CACHE_MAX_BYTES", DEFAULT_MAX_BYTES)),
+    "max_entries": DEFAULT_MAX_ENTRIES,
+}
+
+
+def make_key(
+    ID,
+    tou_program,
+    json_ami_hourly_update=None,
+    json_ami_15min=None,
+    main_contract_capacity=None,
+):
+    """
+    以 AMI 輸入內容計算快取 key。
+
+    只有實際影響 AMI 前處理的參數會列入：
+    - 手動 15 分鐘曲線：只看曲線內容（不讀 AMI 資料庫，與 ID 無關）
+    - 手動小時曲線：ID + 曲線內容
+    - 依契約容量縮放：ID + 經常契約
+    """
+    if json_ami_hourly_update:
+        payload = {"ID": ID, "hourly": json_ami_hourly_update}
+    elif json_ami_15min:
+        payload = {"15min": json_ami_15min}
+    else:
+        payload = {"ID": ID, "capacity": main_contract_capacity}
+    payload["tou_program"] = tou_program
+
+    raw = json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+def _freeze(df_ami):
+    """DataFrame → 唯讀欄位陣列，並估算佔用記憶體"""
+    columns = {}
+    for name in df_ami.columns:
+        values = df_ami[name].to_numpy(copy=True)
+        values.setflags(write=False)
+        columns[name] = values
+    nbytes = int(df_ami.memory_usage(index=False, deep=True).sum())
+    return columns, nbytes
+
+
+def _evict():
+    """從最久未使用的開始淘汰，直到符合上限（呼叫端需持有 _lock）"""
+    while _entries and (
+        _stats["bytes"] > _limits["max_bytes"] or len(_entries) > _limits["max_entries"]
+    ):
+        _, evicted = _entries.popitem(last=False)
+        _stats["bytes"] -= evicted["nbytes"]
+        _stats["evictions"] += 1
+
+
+def get(key, df_tou_2025, tou_program):
+    """
+    取出快取的 df_ami，未命中回傳 None。
+    tou_program 的時間電價內容與建立快取時不同時視為未命中。
+    """
+    fingerprint = tou_fingerprint(df_tou_2025, tou_program)
+    with _lock:
+        entry = _entries.get(key)
+        if entry is None or entry["tou_fingerprint"] != fingerprint:
+            _stats["misses"] += 1
+            return None
+        _entries.move_to_end(key)
+        _stats["hits"] += 1
+        columns = entry["columns"]
+
+    return pd.DataFrame({name: np.array(values) for name, values in columns.items()})
+
+
+def put(key, df_ami, df_tou_2025, tou_program):
+    """存入 df_ami；超過記憶體或筆數上限時，從最久未使用的開始淘汰"""
+    columns, nbytes = _freeze(df_ami)
+    fingerprint = tou_fingerprint(df_tou_2025, tou_program)
+
+    with _lock:
+        if nbytes > _limits["max_bytes"]:
+            return
+
+        old = _entries.pop(key, None)
+        if old is not None:
+            _stats["bytes"] -= old["nbytes"]
+
+        _entries[key] = {
+            "tou_fingerprint": fingerprint,
+            "columns": columns,
+            "nbytes": nbytes,
+        }
+        _stats["bytes"] += nbytes
+
+        _evict()
+
+
+def get_or_build(key, df_tou_2025, tou_program, build):
+    """
+    命中時直接回傳快取的 df_ami；否則呼叫 build() 產生並存入快取。
+    """
+    df_ami = get(key, df_tou_2025, tou_program)
+    if df_ami is not None:
+        return df_ami
+
+    df_ami = build()
+    put(key, df_ami, df_tou_2025, tou_program)
+    return df_ami
+
+
+def get_last_hourly_scaling(ID, tou_program, df_tou_2025):
+    """
+    取出同一 (ID, 計費類別) 最近一次的小時曲線與其 norm_ami 結果，
+    回傳 {"hourly": hourly_dicts, "df_ami": DataFrame}，沒有時回傳 None。
+    """
+    fingerprint = tou_fingerprint(df_tou_2025, tou_program)
+    with _lock:
+        entry = _hourly_entries.get((ID, tou_program))
+        if entry is None or entry["tou_fingerprint"] != fingerprint:
+            return None
+        _hourly_entries.move_to_end((ID, tou_program))
+        hourly = entry["hourly"]
+        columns = entry["columns"]
+
+    return {
+        "hourly": copy.deepcopy(hourly),
+        "df_ami": pd.DataFrame(
+            {name: np.array(values) for name, values in columns.items()}
+        ),
+    }
+
+
+def put_last_hourly_scaling(ID, tou_program, df_tou_2025, hourly_dicts, df_ami):
+    """記錄 (ID, 計費類別) 最近一次的小時曲線與其 norm_ami 結果"""
+    columns, nbytes = _freeze(df_ami)
+    fingerprint = tou_fingerprint(df_tou_2025, tou_program)
+
+    with _lock:
+        if nbytes > _limits["max_bytes"]:
+            return
+        _hourly_entries[(ID, tou_program)] = {
+            "tou_fingerprint": fingerprint,
+            "hourly": copy.deepcopy(hourly_dicts),
+            "columns": columns,
+        }
+        _hourly_entries.move_to_end((ID, tou_program))
+        while len(_hourly_entries) > DEFAULT_MAX_HOURLY_ENTRIES:
+            _hourly_entries.popitem(last=False)
+
+
+def get_stats():
+    """回傳快取統計：hits, misses, evictions, bytes, entries, max_bytes"""
+    with _lock:
+        return {
+            **_stats,
+            "entries": len(_entries),
+            "max_bytes": _limits["max_bytes"],
+        }
+
+
+def set_limits(max_bytes=None, max_entries=None):
+    """調整快取上限，並立即淘汰超出的部分"""
+    with _lock:
+        if max_bytes is not None:
+            _limits["max_bytes"] = int(max_bytes)
+        if max_entries is not None:
+            _limits["max_entries"] = int(max_entries)
+
+        _evict()
+
+
+def clear():
+    """清空快取與統計"""
+    with _lock:
+        _entries.clear()
+        _hourly_entries.clear()
+        for name in _stats:
+            _stats[name] = 0
@@ -0,0 +1,204 @@
+"""
+AMI 代表週負載的欄式儲存
+
+取代每次請求都開啟 ami_data.db、以 SQL 查詢單一 ID 再重新解析時間欄位的流程。
+資料以 NumPy .npy 欄位檔 + JSON offset 索引存放，依 ID 排序後連續擺放：
+
+    ami_store_data/
+        index.json      {"ID": [start, stop], ...}
+        is_summer.npy   int8
+        weekday.npy     int8   (0=Monday ... 6=Sunday)
+        slot.npy        int8   (0~95，當日第幾個 15 分鐘時段)
+        value.npy       float64
+
+讀取時以 mmap 開啟，單一 ID 的資料就是各欄位的一段切片，不需要解析時間字串。
+轉換既有 SQLite 資料：
+
+    python -m shared.core.ami_store path/to/ami_data.db path/to/ami_store_data
+"""
+
+import argparse
+import json
+import os
+import sqlite3
+
+import numpy as np
+import pandas as pd
+
+from shared.core.config_loader import SLOTS_PER_DAY
+
+WEEKDAYS = [
+    "Monday",
+    "Tuesday",
+    "Wednesday",
+    "Thursday",
+    "Friday",
+    "Saturday",
+    "Sunday",
+]
+
+# 時段序號 → 'HH:MM'
+SLOT_LABELS = np.array(
+    [f"{slot // 4:02d}:{slot % 4 * 15:02d}" for slot in range(SLOTS_PER_DAY)],
+    dtype=object,
+)
+
+COLUMN_DTYPES = {
+    "is_summer": np.int8,
+    "weekday": np.int8,
+    "slot": np.int8,
+    "value": np.float64,
+}
+
+# 已開啟的 store，warm container 內重複使用
+_store_cache = {}
+
+
+def get_ami_store_path():
+    """預設的 AMI store 目錄，與 ami_data.db 放在同一層"""
+    return os.path.join(os.path.dirname(os.path.abspath(__file__)), "ami_store_data")
+
+
+def open_store(store_dir=None):
+    """
+    以 mmap 開啟 AMI store，回傳 {'index': dict, 'columns': dict}。
+    store 不存在時回傳 None。
+    """
+    store_dir = store_dir or get_ami_store_path()
+    if store_dir in _store_cache:
+        return _store_cache[store_dir]
+
+    index_path = os.path.join(store_dir, "index.json")
+    if not os.path.exists(index_path):
+        return None
+
+    with open(index_path, encoding="utf-8") as f:
+        index = json.load(f)
+
+    columns = {
+        name: np.load(os.path.join(store_dir, f"{name}.npy"), mmap_mode="r")
+        for name in COLUMN_DTYPES
+    }
+    store = {"index": index, "columns": columns}
+    _store_cache[store_dir] = store
+    return store
+
+
+def get_profile_arrays(store, ID):
+    """
+    取出單一 ID 的欄位切片（零複製，唯讀）。
+
+    Returns:
+        dict: {'is_summer', 'weekday', 'slot', 'value'} → np.ndarray
+    """
+    key = str(ID)
+    if key not in store["index"]:
+        raise ValueError(f"AMI store 中找不到 ID：{ID}")
+    start, stop = store["index"][key]
+    return {name: column[start:stop] for name, column in store["columns"].items()}
+
+
+def profile_arrays_to_df(ID, arrays):
+    """
+    組成與 week_all 查詢結果相同欄位的 DataFrame：
+    ['ID', 'is_summer', 'weekday', 'variable', 'value', 'slot']，variable 為 'HH:MM'。
+    """
+    slot = np.asarray(arrays["slot"])
+    return pd.DataFrame(
+        {
+            "ID": ID,
+            "is_summer": np.asarray(arrays["is_summer"], dtype=np.int64),
+            "weekday": np.asarray(WEEKDAYS, dtype=object)[arrays["weekday"]],
+            "variable": SLOT_LABELS[slot],
+            "value": np.array(arrays["value"], dtype=float),
+            "slot": slot.astype(np.int8),
+        }
+    )
+
+
+def read_ami_profile_sqlite(ID, db_path):
+    """舊流程：從 ami_data.db 的 week_all 讀出單一 ID，並把時間欄位轉成 'HH:MM'"""
+    conn = sqlite3.connect(db_path)
+    try:
+        df_ami_raw = pd.read_sql(
+            "SELECT * FROM week_all WHERE ID = ?", conn, params=(ID,)
+        )
+    finally:
+        conn.close()
+    df_ami_raw["variable"] = pd.to_datetime(
+        df_ami_raw["variable"], format="%H:%M:%S.%f"
+    ).dt.strftime("%H:%M")
+    return df_ami_raw
+
+
+def load_ami_profile(ID, store_dir=None, db_path=None):
+    """
+    讀取單一 ID 的代表週負載。
+    AMI store 中有此 ID 時直接切片；沒有 store，或 ID 是建立 store 之後才加入
+    ami_data.db 的，退回讀取 SQLite (db_path)。
+    """
+    store = open_store(store_dir)
+    if store is not None and str(ID) in store["index"]:
+        return profile_arrays_to_df(ID, get_profile_arrays(store, ID))
+    if db_path is None:
+        if store is not None:
+            raise ValueError(f"AMI store 中找不到 ID：{ID}，且未提供 ami_data.db 路徑")
+        raise ValueError("找不到 AMI store，且未提供 ami_data.db 路徑")
+    return read_ami_profile_sqlite(ID, db_path)
+
+
+def convert_sqlite_to_store(db_path, store_dir, table="week_all"):
+    """
+    將 SQLite 的 week_all 表轉成 AMI store。
+    同一 ID 內維持原本的資料列順序。
+
+    Returns:
+        int: 轉換的 ID 數量
+    """
+    conn = sqlite3.connect(db_path)
+    try:
+        df = pd.read_sql(
+            f"SELECT ID, is_summer, weekday, variable, value FROM {table}", conn
+        )
+    finally:
+        conn.close()
+
+    if df.empty:
+        raise ValueError(f"{table} 沒有任何資料")
+
+    weekday_code = df["weekday"].map({name: i for i, name in enumerate(WEEKDAYS)})
+    if weekday_code.isna().any():
+        unknown = df.loc[weekday_code.isna(), "weekday"].unique().tolist()
+        raise ValueError(f"無法識別的 weekday：{unknown}")
+
+    times = pd.to_datetime(df["variable"], format="%H:%M:%S.%f")
+    df["weekday"] = weekday_code
+    df["slot"] = times.dt.hour * 4 + times.dt.minute // 15
+    df = df.sort_values("ID", kind="stable").reset_index(drop=True)
+
+    os.makedirs(store_dir, exist_ok=True)
+    for name, dtype in COLUMN_DTYPES.items():
+        np.save(os.path.join(store_dir, f"{name}.npy"), df[name].to_numpy(dtype=dtype))
+
+    ids = df["ID"].to_numpy()
+    boundaries = np.flatnonzero(ids[1:] != ids[:-1]) + 1
+    starts = np.concatenate([[0], boundaries])
+    stops = np.concatenate([boundaries, [len(df)]])
+    index = {
+        str(ids[start]): [int(start), int(stop)] for start, stop in zip(starts, stops)
+    }
+    with open(os.path.join(store_dir, "index.json"), "w", encoding="utf-8") as f:
+        json.dump(index, f)
+
+    _store_cache.pop(store_dir, None)
+    return len(index)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="將 ami_data.db 轉成 AMI store")
+    parser.add_argument("db_path", help="ami_data.db 路徑")
+    parser.add_argument("store_dir", help="輸出的 AMI store 目錄")
+    parser.add_argument("--table", default="week_all")
+    args = parser.parse_args()
+    count = convert_sqlite_to_store(args.db_path, args.store_dir, args.table)
+    print(f"已轉換 {count} 個 ID 到 {args.store_dir}")
@@ -0,0 +1,156 @@
+"""
+多年份 AMI 匯出檔的串流讀取
+
+convert_ami_to_json_15min 需要整份 DataFrame：寬格式先 melt 成長格式、整份排序，
+最後才 tail(96 * 365) 只留最後一年，三年份的檔案在記憶體中會完整展開好幾次。
+
+這裡改成分塊讀取：
+- 以第一個非空的分塊 (detect_ami_format) 判斷資料格式
+- 每個分塊轉成長格式後併入「最後一年」視窗，超出的舊資料立即丟棄
+- 讀完後以視窗內的資料計算 14 天代表日平均與年電費（與 convert_ami_to_json_15min 相同）
+
+記憶體用量只跟分塊大小與一年份的資料量有關，與檔案長度無關（256 MB 的 Lambda 也能處理多年份檔案）。
+
+用法：
+    json_15min, annual_cost_summary = convert_ami_to_json_15min_stream(
+        "ami_export.csv", "高壓三段式電價", df_tou_2025, contract_capacity_old, 1.0
+    )
+"""
+
+import os
+
+import pandas as pd
+
+from shared.core import config_loader
+
+# 保留的資料筆數：一年 365 天 x 96 個時段
+WINDOW_ROWS = 96 * 365
+
+# 每次讀取的原始列數（長格式約 30 天；寬格式每列為一天）
+DEFAULT_CHUNKSIZE = 96 * 30
+
+
+def iter_ami_chunks(source, chunksize=DEFAULT_CHUNKSIZE, **read_csv_kwargs):
+    """
+    依來源類型逐塊產生 DataFrame：
+    - CSV 檔案路徑或檔案物件：pd.read_csv(chunksize=...)
+    - DataFrame：依 chunksize 切片
+    - 其他可迭代物件：視為已分塊的 DataFrame 序列
+    """
+    if chunksize <= 0:
+        raise ValueError("chunksize 必須大於 0")
+
+    if isinstance(source, pd.DataFrame):
+        for start in range(0, len(source), chunksize):
+            yield source.iloc[start : start + chunksize]
+    elif isinstance(source, (str, os.PathLike)) or hasattr(source, "read"):
+        with pd.read_csv(source, chunksize=chunksize, **read_csv_kwargs) as reader:
+            yield from reader
+    else:
+        yield from source
+
+
+def _keep_last_rows(frames, window_rows=WINDOW_ROWS):
+    """合併分塊，依 datetime 排序後只保留最後 window_rows 筆"""
+    df = pd.concat(frames, ignore_index=True) if len(frames) > 1 else frames[0]
+    if not df["datetime"].is_monotonic_increasing:
+        df = df.sort_values(by="datetime", kind="stable")
+    return df.tail(window_rows).reset_index(drop=True)
+
+
+def read_last_year(source, chunksize=DEFAULT_CHUNKSIZE, **read_csv_kwargs):
+    """
+    串流讀取 AMI 資料，只保留最後一年的長格式資料。
+
+    分塊先暫存，累積超過兩年份時才合併截斷，避免每個分塊都複製整個視窗；
+    任何時候保留的資料不超過兩年份加一個分塊。
+
+    Returns:
+    --------
+    tuple : (format_type, df_ami_long)，df_ami_long 依 datetime 排序
+    """
+    format_type = None
+    frames = []
+    buffered_rows = 0
+
+    for chunk in iter_ami_chunks(source, chunksize, **read_csv_kwargs):
+        # 先去掉na的row，避免錯誤，有空值就去掉
+        chunk = chunk.dropna(how="any").reset_index(drop=True)
+        if chunk.empty:
+            continue
+
+        if format_type is None:
+            format_type = config_loader.detect_ami_format(chunk)
+            print(f"[debug] 檢測到的資料格式: {format_type}")
+
+        chunk_long = config_loader.ami_to_long(chunk, format_type)
+        # 寬格式的 date 欄位後續用不到，不放進視窗
+        frames.append(chunk_long.drop(columns=["date"], errors="ignore"))
+        buffered_rows += len(chunk_long)
+
+        if buffered_rows >= 2 * WINDOW_ROWS:
+            frames = [_keep_last_rows(frames)]
+            buffered_rows = len(frames[0])
+
+    if not frames:
+        raise ValueError("AMI 資料為空")
+
+    return format_type, _keep_last_rows(frames)
+
+
+def convert_ami_to_json_15min_stream(
+    source,
+    tou_program,
+    df_tou_2025,
+    contract_capacity_old,
+    tariff_adjust_factor,
+    chunksize=DEFAULT_CHUNKSIZE,
+    **read_csv_kwargs,
+):
+    """
+    串流版 config_loader.convert_ami_to_json_15min，回傳值相同。
+
+    Parameters:
+    -----------
+    source : str | PathLike | file | DataFrame | Iterable[DataFrame]
+        AMI 資料來源，CSV 以 pd.read_csv 分塊讀取（read_csv_kwargs 會一併傳入）
+    chunksize : int
+        每次讀取的原始列數
+
+    Returns:
+    --------
+    tuple : (JSON 格式的 15分鐘資料, 年電費摘要)
+    """
+    _, df_ami_long = read_last_year(source, chunksize, **read_csv_kwargs)
+    return config_loader.summarize_ami_long(
+        df_ami_long,
+        tou_program,
+        df_tou_2025,
+        contract_capacity_old,
+        tariff_adjust_factor,
+    )
+
+
+if __name__ == "__main__":
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(
+        description="串流讀取 AMI 匯出檔，顯示保留的最後一年資料範圍"
+    )
+    parser.add_argument("path", help="AMI 匯出 CSV")
+    parser.add_argument("--chunksize", type=int, default=DEFAULT_CHUNKSIZE)
+    args = parser.parse_args()
+
+    fmt, df_last_year = read_last_year(args.path, args.chunksize)
+    print(
+        json.dumps(
+            {
+                "format": fmt,
+                "rows": len(df_last_year),
+                "start": str(df_last_year["datetime"].iloc[0]),
+                "end": str(df_last_year["datetime"].iloc[-1]),
+            },
+            ensure_ascii=False,
+        )
+    )
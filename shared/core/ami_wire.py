@@ -0,0 +1,155 @@
+"""
+df_ami 的精簡傳輸格式
+
+RunSimulationRequest.df_ami 原本是 DataFrame.to_dict() 的結果：
+{欄位: {index: 值}}，每一列的 index key 在每個欄位都重複一次。
+這裡改以欄式編碼，每欄為下列其中一種：
+
+    數值欄  {"dtype": "<f4", "data": base64(zlib(bytes))}
+    類別欄  {"dtype": "int64", "categories": [...], "codes": base64(zlib(int8/int16))}
+
+整體格式：
+
+    {
+        "encoding": "ami_columnar_v1",
+        "length": 1344,
+        "columns": {"load_kw": {...}, "season": {...}, ...}
+    }
+
+- load_kw 預設以 little-endian float32 傳送，其餘高基數的數值欄維持原本 dtype
+- 重複值少的欄位（season / weekday / slot / tou / tou_tag ...）只傳類別表與代碼
+- 解碼時以 np.frombuffer 直接讀取解壓後的 bytes，不逐筆轉換
+
+舊的 dict 格式仍可透過 df_ami_from_payload 讀取。
+"""
+
+import base64
+import zlib
+
+import numpy as np
+import pandas as pd
+
+ENCODING = "ami_columnar_v1"
+
+# 以 float32 傳送的欄位
+FLOAT32_COLUMNS = ("load_kw",)
+
+# 不重複值數量不超過此值的欄位以類別表 + 代碼傳送
+MAX_CATEGORIES = 1024
+
+
+def _b64encode(values, dtype):
+    raw = np.ascontiguousarray(values, dtype=dtype).tobytes()
+    return base64.b64encode(zlib.compress(raw)).decode("ascii")
+
+
+def _b64decode(data, dtype):
+    return np.frombuffer(zlib.decompress(base64.b64decode(data)), dtype=dtype)
+
+
+def _to_json_value(value):
+    """類別表轉成 JSON 可序列化的值，NaN 轉成 None"""
+    if isinstance(value, np.integer):
+        return int(value)
+    if isinstance(value, (np.floating, float)):
+        return None if np.isnan(value) else float(value)
+    return value
+
+
+def _encode_column(name, series, float32_columns):
+    dtype = series.dtype
+    if name in float32_columns:
+        return {"dtype": "<f4", "data": _b64encode(series.to_numpy(), "<f4")}
+
+    codes, categories = pd.factorize(series, use_na_sentinel=True)
+    if len(categories) <= MAX_CATEGORIES:
+        code_dtype = "<i1" if len(categories) < 128 else "<i2"
+        return {
+            "dtype": str(dtype),
+            "categories": [_to_json_value(value) for value in categories],
+            "codes": _b64encode(codes, code_dtype),
+            "code_dtype": code_dtype,
+        }
+
+    if dtype.kind not in "iuf":
+        raise ValueError(f"欄位 {name} 為非數值且類別過多，無法編碼")
+    wire_dtype = dtype.newbyteorder("<").str
+    return {"dtype": wire_dtype, "data": _b64encode(series.to_numpy(), wire_dtype)}
+
+
+def encode_df_ami(df_ami, float32_columns=FLOAT32_COLUMNS):
+    """
+    將 df_ami 編碼成 ami_columnar_v1 格式（可直接放入 JSON）。
+
+    Parameters:
+        df_ami: norm_ami 後的 AMI 資料
+        float32_columns: 以 float32 傳送的欄位，傳入空 tuple 則全部維持原精度
+    """
+    return {
+        "encoding": ENCODING,
+        "length": len(df_ami),
+        "columns": {
+            name: _encode_column(name, df_ami[name], float32_columns)
+            for name in df_ami.columns
+        },
+    }
+
+
+def _decode_column(spec, length):
+    if "categories" in spec:
+        codes = _b64decode(spec["codes"], spec.get("code_dtype", "<i2"))
+        dtype = np.dtype(spec["dtype"])
+        if dtype.kind in "iub":
+            categories = np.array(spec["categories"], dtype=dtype)
+        elif dtype.kind == "f":
+            categories = np.array(
+                [np.nan if value is None else value for value in spec["categories"]],
+                dtype=dtype,
+            )
+        else:
+            categories = np.array(spec["categories"], dtype=object)
+
+        if len(codes) != length:
+            raise ValueError("df_ami 欄位長度與 length 不一致")
+        if (codes < 0).any():
+            # factorize 以 -1 表示缺值
+            categories = np.append(categories.astype(object), np.nan)
+            if dtype.kind == "f":
+                categories = categories.astype(dtype)
+        return categories[codes]
+
+    values = _b64decode(spec["data"], spec["dtype"])
+    if len(values) != length:
+        raise ValueError("df_ami 欄位長度與 length 不一致")
+    return values
+
+
+def decode_df_ami(payload):
+    """將 ami_columnar_v1 格式還原成 DataFrame，float32 欄位轉回 float64"""
+    if payload.get("encoding") != ENCODING:
+        raise ValueError(f"不支援的 df_ami 編碼：{payload.get('encoding')}")
+
+    length = int(payload["length"])
+    data = {}
+    for name, spec in payload["columns"].items():
+        values = _decode_column(spec, length)
+        if values.dtype == np.float32:
+            values = values.astype(np.float64)
+        data[name] = values
+    return pd.DataFrame(data)
+
+
+def is_encoded(payload):
+    return isinstance(payload, dict) and payload.get("encoding") == ENCODING
+
+
+def df_ami_from_payload(payload):
+    """
+    讀取請求中的 df_ami：支援 ami_columnar_v1 與舊的 DataFrame.to_dict() 格式。
+    payload 為空時回傳 None。
+    """
+    if not payload or not isinstance(payload, dict):
+        return None
+    if is_encoded(payload):
+        return decode_df_ami(payload)
+    return pd.DataFrame(payload)
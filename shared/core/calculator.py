@@ -1,6 +1,18 @@
 import numpy as np
 import pandas as pd
 
+from shared.core.config_loader import dr_program_dict, time_str_to_slot, time_to_slot
+
+
+def get_slot(df):
+    """
+    取得每列的時段序號 (0~95)。
+    norm_ami 產生的資料已有 slot 欄位；舊格式只有 'HH:MM' timestamp 時才臨時換算。
+    """
+    if "slot" in df.columns:
+        return df["slot"].to_numpy()
+    return time_to_slot(df["timestamp"])
+
 
 def loan_pmt_per_year(loan, loan_year, loan_interest_rate_percent):
     # print('融資金額(NTD)：', loan, ' 融資年限(Year)：', loan_year, '融資年利率(%):', loan_interest_rate_percent)
@@ -22,10 +34,13 @@ def calculate_transferable_energy(
     time_periods,
     consider_large_consumer=False,  # 新增參數
 ):
-    mask = (df_ami["timestamp"] >= time_periods[0][0]) & (
-        df_ami["timestamp"] <= time_periods[0][1]
+    slot = get_slot(df_ami)
+    mask = (slot >= time_str_to_slot(time_periods[0][0], round_up=True)) & (
+        slot <= time_str_to_slot(time_periods[0][1])
     )
     df_segment = df_ami.loc[mask].copy()
+    if "slot" not in df_segment.columns:
+        df_segment["slot"] = slot[mask].astype(np.int8)
 
     df_segment["可放電功率"] = np.where(
         df_segment["tou_level"] == "high",
@@ -161,8 +176,8 @@ def calculate_transferable_energy(
 
     # 若考慮 large consumer，直接統計 18:00~19:45 這段時段
     if consider_large_consumer:
-        mask_lc = (df_segment["timestamp"] >= "18:00") & (
-            df_segment["timestamp"] <= "19:45"
+        mask_lc = (df_segment["slot"] >= time_str_to_slot("18:00", round_up=True)) & (
+            df_segment["slot"] <= time_str_to_slot("19:45")
         )
         df_lc = df_segment.loc[mask_lc]
         lc_stats = (
@@ -188,77 +203,224 @@ def calculate_transferable_energy(
     return df_segment, df_ami2
 
 
+def _transferable_by_day(df_season, eff_kWh, can_avoid_over, consider_large_consumer):
+    """
+    (年數 × 代表日數) 的一般 / 用電大戶義務可轉移電量，尚未對代表日平均。
+
+    Parameters:
+        eff_kWh: (年數, 1) 的有效可用電量
+        can_avoid_over: 與 eff_kWh 同形狀，各年是否能以儲能完全抵銷超約
+
+    Returns:
+        tuple: (一般可轉移電量, 用電大戶義務可轉移電量)，不考慮用電大戶時後者為 None
+    """
+    可放電量 = df_season["可放電量"].to_numpy(dtype=float)
+    可充電量 = df_season["可充電量"].to_numpy(dtype=float)
+
+    # 一般可轉移電量
+    transferable = np.minimum(eff_kWh, np.minimum(可放電量, 可充電量))
+    transferable = np.where(
+        can_avoid_over,
+        np.clip(
+            transferable - df_season["超約調整等價電量"].to_numpy(dtype=float),
+            0,
+            None,
+        ),
+        transferable,
+    )
+
+    # 用電大戶義務可轉移電量
+    if not (consider_large_consumer and "用電大戶義務可放電量" in df_season.columns):
+        return transferable, None
+
+    # 如果超約可以用儲能完全抵銷，則用電大戶義務可轉移電量將會減少，反之，就跟原本一樣
+    lc_avail_kWh = np.where(
+        can_avoid_over,
+        np.clip(eff_kWh - df_season["避免超約電量"].to_numpy(dtype=float), 0, None),
+        eff_kWh,
+    )
+    lc_transferable = np.clip(
+        np.minimum(
+            lc_avail_kWh,
+            np.minimum(
+                df_season["用電大戶義務可放電量"].to_numpy(dtype=float), 可充電量
+            ),
+        ),
+        0,
+        None,
+    )
+    return transferable, lc_transferable
+
+
+def _season_weekdays(df_ami2, season):
+    """某季節的代表日資料，以及各代表日是否為工作日"""
+    df_season = df_ami2[df_ami2["season"] == season]
+    is_weekday = (
+        df_season["weekday2"]
+        .isin(["Monday", "Tuesday", "Wednesday", "Thursday", "Friday"])
+        .to_numpy()
+    )
+    return df_season, is_weekday
+
+
 def batch_calculate_transfered_energy(
     df_ami2, avail_kWh_series, season, rtt_loss_rate, consider_large_consumer=False
 ):
     """
     同時回傳一般可轉移電量與用電大戶義務可轉移電量
+    所有年度一次以 (年數 × 代表日數) 的矩陣計算，不再逐年改寫 DataFrame 欄位。
     Returns:
         dict: {
             '可轉移電量': pd.Series,
             '用電大戶義務可轉移電量': pd.Series
         }
     """
-    df_season = df_ami2.query("season == @season").copy()
+    df_season, is_weekday = _season_weekdays(df_ami2, season)
 
-    # 一般可轉移電量
-    results_normal = []
-    for avail_kWh in avail_kWh_series:
-        df_season["可轉移電量"] = np.minimum(
-            avail_kWh * np.sqrt(1 - rtt_loss_rate),
-            np.minimum(df_season["可放電量"], df_season["可充電量"]),
+    # 年 × 日 矩陣：每一列是一個年度的有效可用電量，每一欄是一個代表日
+    eff_kWh = np.asarray(avail_kWh_series, dtype=float)[:, None] * np.sqrt(
+        1 - rtt_loss_rate
+    )
+
+    # 如果超約可以用儲能完全抵銷，需扣減超約調整等價電量，否則，就不管超約！
+    # 記住，夏月，非夏月，結果可能不同，可能非夏月可以避免超約，夏月不行
+    can_avoid_over = eff_kWh > df_season["超約電量"].max()
+
+    transferable, lc_transferable = _transferable_by_day(
+        df_season, eff_kWh, can_avoid_over, consider_large_consumer
+    )
+    results_normal = np.round(transferable[:, is_weekday].mean(axis=1), 2)
+
+    if lc_transferable is not None:
+        results_large_consumer = np.round(
+            lc_transferable[:, is_weekday].mean(axis=1), 2
         )
+    else:
+        results_large_consumer = [0] * len(avail_kWh_series)
+
+    return {
+        "可轉移電量": pd.Series(results_normal),
+        "用電大戶義務可轉移電量": pd.Series(results_large_consumer),
+    }
 
-        # 如果超約可以用儲能完全抵銷，需扣減超約調整等價電量，否則，就不管超約！
-        # 記住，夏月，非夏月，結果可能不同，可能非夏月可以避免超約，夏月不行
-        if avail_kWh * np.sqrt(1 - rtt_loss_rate) > df_season["超約電量"].max():
-            df_season["可轉移電量"] = (
-                df_season["可轉移電量"] - df_season["超約調整等價電量"]
-            ).clip(lower=0)
 
-        mean_kWh = df_season[
-            df_season["weekday2"].isin(
-                ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday"]
-            )
-        ]["可轉移電量"].mean()
-        results_normal.append(round(mean_kWh, 2))
+# === 容量反應曲線 ===
+# 可轉移電量、用電大戶義務可轉移電量與 DR 抑低契約容量，對固定的 AMI 資料都是
+# 有效可用電量的分段線性函數（各代表日取 min / clip 後平均），轉折點只會出現在
+# 各代表日的可放電量 / 可充電量 / 超約電量等門檻上；只有「能否完全抵銷超約」
+# 會在超約電量上限處跳動，因此上下各建一條曲線。
+# 在轉折點上以原本的公式計算一次後，任何容量（台數、衰減年度）都只需 np.interp 查表。
+
+
+def _response_curve(evaluate, breakpoints, left_slope):
+    """
+    在 breakpoints 與 0 上計算 evaluate，得到可用 np.interp 查表的分段線性曲線。
+    evaluate 在相鄰轉折點之間需為線性；大於最大轉折點時為常數，
+    小於最小轉折點時以 left_slope 線性外插。
+    """
+    breakpoints = np.asarray(breakpoints, dtype=float).ravel()
+    x = np.unique(np.append(breakpoints[np.isfinite(breakpoints)], 0.0))
+    return {"x": x, "y": evaluate(x), "left_slope": left_slope}
+
+
+def interp_response_curve(curve, x):
+    """以 np.interp 查表，x 可為任意形狀的有效可用電量"""
+    x = np.asarray(x, dtype=float)
+    x0, y0 = curve["x"][0], curve["y"][0]
+    y = np.interp(x, curve["x"], curve["y"])
+    return np.where(x < x0, y0 + (x - x0) * curve["left_slope"], y)
+
+
+def _threshold_curves(threshold, evaluate, breakpoints, left_slopes):
+    """有效可用電量大於 threshold（可完全抵銷超約）前後各一條曲線"""
+    return {
+        "threshold": threshold,
+        "below": _response_curve(
+            lambda x: evaluate(x, False), breakpoints, left_slopes[0]
+        ),
+        "above": _response_curve(
+            lambda x: evaluate(x, True), breakpoints, left_slopes[1]
+        ),
+    }
+
+
+def _interp_threshold_curves(curves, x):
+    x = np.asarray(x, dtype=float)
+    return np.where(
+        x > curves["threshold"],
+        interp_response_curve(curves["above"], x),
+        interp_response_curve(curves["below"], x),
+    )
+
+
+def transferable_energy_curve(df_ami2, season, consider_large_consumer=False):
+    """
+    batch_calculate_transfered_energy 的容量反應曲線（x 為有效可用電量，已扣往返損失）。
+
+    Returns:
+        dict: {
+            '可轉移電量': 曲線,
+            '用電大戶義務可轉移電量': 曲線，不考慮用電大戶時為 None
+        }
+    """
+    df_season, is_weekday = _season_weekdays(df_ami2, season)
+    max_over = df_season["超約電量"].max()
+    days = df_season[is_weekday]
+
+    def evaluate(column):
+        def by_capacity(eff_kWh, can_avoid_over):
+            values = _transferable_by_day(
+                df_season,
+                eff_kWh[:, None],
+                np.full((len(eff_kWh), 1), can_avoid_over),
+                consider_large_consumer,
+            )[column]
+            return values[:, is_weekday].mean(axis=1)
+
+        return by_capacity
+
+    可放電量 = days["可放電量"].to_numpy(dtype=float)
+    可充電量 = days["可充電量"].to_numpy(dtype=float)
+    可轉移上限 = np.minimum(可放電量, 可充電量)
+    curves = {
+        # min(e, 可轉移上限) - 超約調整等價電量 在 0 截斷
+        "可轉移電量": _threshold_curves(
+            max_over,
+            evaluate(0),
+            [可轉移上限, days["超約調整等價電量"].to_numpy(dtype=float)],
+            (1.0, 0.0),
+        ),
+        "用電大戶義務可轉移電量": None,
+    }
 
-    # 用電大戶義務可轉移電量
-    results_large_consumer = []
     if consider_large_consumer and "用電大戶義務可放電量" in df_season.columns:
-        for avail_kWh in avail_kWh_series:
-            # 如果超約可以用儲能完全抵銷，則用電大戶義務可轉移電量將會減少，反之，就跟原本一樣
-            if avail_kWh * np.sqrt(1 - rtt_loss_rate) > df_season["超約電量"].max():
-                # 每天計算
-                df_season["避免超約後可用電量"] = (
-                    avail_kWh * np.sqrt(1 - rtt_loss_rate) - df_season["避免超約電量"]
-                ).clip(lower=0)
-                df_season["用電大戶義務可轉移電量"] = np.minimum(
-                    df_season["避免超約後可用電量"],
-                    np.minimum(
-                        df_season["用電大戶義務可放電量"], df_season["可充電量"]
-                    ),
-                ).clip(lower=0)
-                mean_kWh = df_season[
-                    df_season["weekday2"].isin(
-                        ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday"]
-                    )
-                ]["用電大戶義務可轉移電量"].mean()
-                results_large_consumer.append(round(mean_kWh, 2))
-
-            else:
-                df_season["用電大戶義務可轉移電量"] = np.minimum(
-                    avail_kWh * np.sqrt(1 - rtt_loss_rate),
-                    np.minimum(
-                        df_season["用電大戶義務可放電量"], df_season["可充電量"]
-                    ),
-                ).clip(lower=0)
-                mean_kWh = df_season[
-                    df_season["weekday2"].isin(
-                        ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday"]
-                    )
-                ]["用電大戶義務可轉移電量"].mean()
-                results_large_consumer.append(round(mean_kWh, 2))
+        # min(e - 避免超約電量, 用電大戶可轉移上限) 在 0 截斷
+        lc_上限 = np.minimum(
+            days["用電大戶義務可放電量"].to_numpy(dtype=float), 可充電量
+        )
+        避免超約電量 = np.clip(days["避免超約電量"].to_numpy(dtype=float), 0, None)
+        curves["用電大戶義務可轉移電量"] = _threshold_curves(
+            max_over,
+            evaluate(1),
+            [lc_上限, 避免超約電量, 避免超約電量 + lc_上限],
+            (0.0, 0.0),
+        )
+    return curves
+
+
+def transfered_energy_from_curve(curves, avail_kWh_series, rtt_loss_rate):
+    """
+    由 transferable_energy_curve 查表，回傳值與 batch_calculate_transfered_energy 相同。
+    """
+    eff_kWh = np.asarray(avail_kWh_series, dtype=float) * np.sqrt(1 - rtt_loss_rate)
+    results_normal = np.round(
+        _interp_threshold_curves(curves["可轉移電量"], eff_kWh), 2
+    )
+
+    if curves["用電大戶義務可轉移電量"] is not None:
+        results_large_consumer = np.round(
+            _interp_threshold_curves(curves["用電大戶義務可轉移電量"], eff_kWh), 2
+        )
     else:
         results_large_consumer = [0] * len(avail_kWh_series)
 
@@ -276,7 +438,7 @@ def filter_summer_week_data(
     根據夏月與工作日條件，篩選指定時間區間內的資料。
 
     Parameters:
-        df (pd.DataFrame): 原始資料，需包含 'is_summer', 'weekday', 'timestamp' 欄位
+        df (pd.DataFrame): 原始資料，需包含 'is_summer', 'weekday', 'slot'（或 'timestamp'）欄位
         start_time_str (str): 起始時間 (格式如 '18:00')
         end_time_str (str): 結束時間 (格式如 '20:00')
         only_summer (bool): 是否僅篩選夏月資料 (is_summer == 1)
@@ -287,26 +449,185 @@ def filter_summer_week_data(
     """
     # print ('filter_summer_week_data', start_time_str, end_time_str)
 
-    df_filtered = df.copy()
+    slot = get_slot(df)
+    mask = (slot >= time_str_to_slot(start_time_str, round_up=True)) & (
+        slot < time_str_to_slot(end_time_str, round_up=True)
+    )
 
     if only_summer:
-        df_filtered = df_filtered[df_filtered["is_summer"] == 1]
+        mask &= (df["is_summer"] == 1).to_numpy()
     if only_weekday:
-        df_filtered = df_filtered[df_filtered["weekday"] == "week"]
+        mask &= (df["weekday"] == "week").to_numpy()
 
-    # df_filtered['timestamp'] = pd.to_datetime(df_filtered['timestamp'])
-    df_filtered["timestamp"] = pd.to_datetime(df_filtered["timestamp"], format="%H:%M")
+    return df[mask]
 
-    # start_time = pd.to_datetime(start_time_str).time()
-    # end_time = pd.to_datetime(end_time_str).time()
 
-    start_time = pd.to_datetime(start_time_str, format="%H:%M").time()
-    end_time = pd.to_datetime(end_time_str, format="%H:%M").time()
+# 時段累加表 (slot cube) 預設累加的欄位
+SLOT_CUBE_COLUMNS = (
+    "load_kw",
+    "可放電功率",
+    "可充電功率",
+    "over_capacity_kw",
+    "weight_over_capacity_kw",
+)
 
-    mask = (df_filtered["timestamp"].dt.time >= start_time) & (
-        df_filtered["timestamp"].dt.time < end_time
-    )
-    return df_filtered[mask]
+
+def _two_sum(a, b):
+    """a + b 的浮點結果與其捨入誤差 (Knuth TwoSum)"""
+    total = a + b
+    b_virtual = total - a
+    return total, (a - (total - b_virtual)) + (b - b_virtual)
+
+
+def _compensated_prefix_sum(matrix):
+    """
+    沿最後一軸的累加值，以 (高位, 低位) 兩個陣列保存捨入誤差，
+    區間相減後仍等同直接加總（與 pandas groupby sum 的補償加總一致）。
+    """
+    n_rows, n_cols = matrix.shape
+    high = np.zeros((n_rows, n_cols + 1))
+    low = np.zeros((n_rows, n_cols + 1))
+    for k in range(n_cols):
+        high[:, k + 1], error = _two_sum(high[:, k], matrix[:, k])
+        low[:, k + 1] = low[:, k] + error
+    return high, low
+
+
+def build_slot_cube(df_segment, columns=SLOT_CUBE_COLUMNS):
+    """
+    依 (season, weekday2) 代表日建立各欄位沿時段 (slot) 的累加表，
+    任一時段區間的加總 / 平均只需兩次查表，不必再對 DataFrame 做遮罩與 groupby。
+
+    Parameters:
+        df_segment: calculate_transferable_energy 全日時段的 df_segment
+        columns: 要累加的欄位，df_segment 沒有的欄位略過
+
+    Returns:
+        dict: {
+            'season' / 'weekday2' / 'weekday' / 'is_summer': 各代表日的屬性（依 groupby 排序）,
+            'cumsum': {欄位: (高位, 低位)，各為 (代表日數, 97)，第 k 欄為 slot < k 的加總},
+            'valid': {欄位: (代表日數, 97) 的非缺值累加筆數},
+            'count': (代表日數, 97) 的累加筆數
+        }
+    """
+    grouped = df_segment.groupby(["season", "weekday2"], sort=True)
+    profile = grouped.ngroup().to_numpy()
+    first = grouped[["is_summer", "weekday"]].first()
+    n_profiles = len(first)
+    slot = get_slot(df_segment).astype(np.intp)
+
+    def slot_matrix(values):
+        matrix = np.zeros((n_profiles, 96))
+        # 與 groupby sum 相同，缺值視為 0
+        np.add.at(matrix, (profile, slot), np.nan_to_num(values))
+        return matrix
+
+    def prefix_count(mask):
+        count = slot_matrix(mask.astype(float)).cumsum(axis=1)
+        return np.concatenate([np.zeros((n_profiles, 1)), count], axis=1)
+
+    columns = [column for column in columns if column in df_segment.columns]
+    return {
+        "season": first.index.get_level_values("season").to_numpy(),
+        "weekday2": first.index.get_level_values("weekday2").to_numpy(),
+        "weekday": first["weekday"].to_numpy(),
+        "is_summer": first["is_summer"].to_numpy(),
+        "cumsum": {
+            column: _compensated_prefix_sum(
+                slot_matrix(df_segment[column].to_numpy(dtype=float))
+            )
+            for column in columns
+        },
+        "valid": {
+            column: prefix_count(df_segment[column].notna().to_numpy())
+            for column in columns
+        },
+        "count": prefix_count(np.ones(len(df_segment), dtype=bool)),
+    }
+
+
+def window_count(slot_cube, column, start_slot, end_slot):
+    """各代表日在 start_slot <= slot < end_slot 區間內的筆數（column 不為 None 時只算非缺值）"""
+    start_slot = min(max(start_slot, 0), 96)
+    end_slot = min(max(end_slot, start_slot), 96)
+    count = slot_cube["count"] if column is None else slot_cube["valid"][column]
+    return count[:, end_slot] - count[:, start_slot]
+
+
+def window_sum(slot_cube, column, start_slot, end_slot):
+    """各代表日在 start_slot <= slot < end_slot 區間內的加總（缺值視為 0）"""
+    start_slot = min(max(start_slot, 0), 96)
+    end_slot = min(max(end_slot, start_slot), 96)
+
+    high, low = slot_cube["cumsum"][column]
+    total, error = _two_sum(high[:, end_slot], -high[:, start_slot])
+    return total + (error + (low[:, end_slot] - low[:, start_slot]))
+
+
+def transferable_energy_from_cube(
+    slot_cube, time_periods, consider_large_consumer=False
+):
+    """
+    以 slot cube 計算 calculate_transferable_energy 的 df_ami2（各代表日的可放電量、
+    可充電量、超約電量...），時段與 calculate_transferable_energy 相同（含結束時段）。
+    """
+    start_slot = time_str_to_slot(time_periods[0][0], round_up=True)
+    end_slot = time_str_to_slot(time_periods[0][1]) + 1
+
+    count = window_count(slot_cube, None, start_slot, end_slot)
+    present = count > 0
+
+    def energy(column):
+        return (window_sum(slot_cube, column, start_slot, end_slot) / 4)[present]
+
+    df_ami2 = pd.DataFrame(
+        {
+            "season": slot_cube["season"][present],
+            "weekday2": slot_cube["weekday2"][present],
+            "可放電量": energy("可放電功率"),
+            "可充電量": energy("可充電功率"),
+            "超約電量": energy("over_capacity_kw"),
+            "超約調整等價電量": energy("weight_over_capacity_kw"),
+        }
+    ).round(2)
+
+    # 若考慮 large consumer，直接統計 18:00~19:45 這段時段（與上面時段的交集）
+    if consider_large_consumer:
+        lc_start = max(start_slot, time_str_to_slot("18:00", round_up=True))
+        lc_end = min(end_slot, time_str_to_slot("19:45") + 1)
+        lc_present = (window_count(slot_cube, None, lc_start, lc_end) > 0)[present]
+
+        def lc_energy(column):
+            values = (window_sum(slot_cube, column, lc_start, lc_end) / 4)[present]
+            return np.where(lc_present, np.round(values), np.nan)
+
+        df_ami2["用電大戶義務可放電量"] = lc_energy("可放電功率")
+        df_ami2["用電大戶超約電量"] = lc_energy("over_capacity_kw")
+        df_ami2["避免超約電量"] = (
+            df_ami2["超約電量"] - df_ami2["用電大戶超約電量"]
+        ).clip(lower=0)
+
+    return df_ami2
+
+
+def _weekday2_mean(slot_cube, column, profiles, start_slot, end_slot):
+    """
+    指定代表日在時段區間內依 weekday2 合併的平均（略過缺值，同 groupby mean）與筆數，
+    只回傳區間內有資料的 weekday2。
+    """
+    weekday2, inverse = np.unique(slot_cube["weekday2"][profiles], return_inverse=True)
+    n = len(weekday2)
+
+    def combine(values):
+        return np.bincount(inverse, values[profiles], n)
+
+    count = combine(window_count(slot_cube, None, start_slot, end_slot))
+    valid = combine(window_count(slot_cube, column, start_slot, end_slot))
+    total = combine(window_sum(slot_cube, column, start_slot, end_slot))
+    present = count > 0
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mean = np.where(valid > 0, total / valid, np.nan)
+    return weekday2[present], mean[present], count[present]
 
 
 # 計算 最小的DR容量
@@ -376,6 +697,196 @@ def calculate_dr_capacity(df_ami, df_ami2, start_time, end_time, dr_hr, bms_kWh)
     return df_grouped, dr_contract_kw
 
 
+# DR 抑低時段內、與儲能容量無關的統計，同一份 AMI 每個時段只需計算一次
+def dr_window_stats(df_ami, df_ami2, start_time, end_time, slot_cube=None):
+    """
+    calculate_dr_capacity 中與 bms_kWh 無關的部分：
+    - 超約電量上限：夏月工作日的最大超約電量
+    - 平均可放電量 / 小時數 / 平均超約電量：夏月工作日抑低時段內，依 weekday2 統計
+    - baseline可放電功率：全年工作日抑低時段內，依 weekday2 的平均可放電功率
+
+    有 slot_cube（build_slot_cube(df_ami)）時直接查表，不再篩選 df_ami。
+    """
+    df_season = df_ami2[
+        (df_ami2["season"] == "summer")
+        & (
+            df_ami2["weekday2"].isin(
+                ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday"]
+            )
+        )
+    ]
+
+    if slot_cube is not None:
+        # 與 filter_summer_week_data 相同的時段：不含結束時段
+        start_slot = time_str_to_slot(start_time, round_up=True)
+        end_slot = time_str_to_slot(end_time, round_up=True)
+        week = slot_cube["weekday"] == "week"
+        summer_week = week & (slot_cube["is_summer"] == 1)
+
+        weekday2, 平均可放電量, count = _weekday2_mean(
+            slot_cube, "可放電功率", summer_week, start_slot, end_slot
+        )
+        _, 平均超約電量, _ = _weekday2_mean(
+            slot_cube, "over_capacity_kw", summer_week, start_slot, end_slot
+        )
+        _, baseline, _ = _weekday2_mean(
+            slot_cube, "可放電功率", week, start_slot, end_slot
+        )
+        return {
+            "超約電量上限": df_season["超約電量"].max(),
+            "weekday2": weekday2,
+            "平均可放電量": 平均可放電量,
+            "小時數": count / 4,
+            "平均超約電量": 平均超約電量,
+            "baseline可放電功率": baseline,
+        }
+
+    # 夏月工作日
+    df_grouped = (
+        filter_summer_week_data(
+            df_ami, start_time, end_time, only_summer=True, only_weekday=True
+        )
+        .groupby("weekday2")
+        .agg({"可放電功率": "mean", "weekday": "count", "over_capacity_kw": "mean"})
+    )
+
+    # 非夏月工作日 baseline
+    df_baseline = (
+        filter_summer_week_data(
+            df_ami, start_time, end_time, only_summer=False, only_weekday=True
+        )
+        .groupby("weekday2")
+        .agg({"可放電功率": "mean"})
+    )
+
+    return {
+        "超約電量上限": df_season["超約電量"].max(),
+        "weekday2": df_grouped.index.to_numpy(),
+        "平均可放電量": df_grouped["可放電功率"].to_numpy(dtype=float),
+        "小時數": df_grouped["weekday"].to_numpy() / 4,
+        "平均超約電量": df_grouped["over_capacity_kw"].to_numpy(dtype=float),
+        "baseline可放電功率": df_baseline["可放電功率"].to_numpy(dtype=float),
+    }
+
+
+def _pad_nan(values, length):
+    """最後一軸補 NaN 到指定長度"""
+    pad = length - values.shape[-1]
+    if pad <= 0:
+        return values
+    return np.concatenate(
+        [values, np.full(values.shape[:-1] + (pad,), np.nan)], axis=-1
+    )
+
+
+def dr_capacity_from_stats(stats, dr_hr, bms_kWh):
+    """
+    由 dr_window_stats 的結果計算平均抑低契約容量，bms_kWh 可為各年容量的陣列。
+    與 calculate_dr_capacity 的 dr_contract_kw 相同，回傳與 bms_kWh 等長的陣列。
+    """
+    bms_kWh = np.atleast_1d(np.asarray(bms_kWh, dtype=float))
+    # 儲能可解決超約時，計算超約的影響，並扣掉多降的；反之，就不避免超約，套到滿
+    return _dr_capacity(stats, dr_hr, bms_kWh, bms_kWh > stats["超約電量上限"])
+
+
+def _dr_capacity(stats, dr_hr, bms_kWh, solves_over):
+    """dr_capacity_from_stats，solves_over 為各容量是否能解決超約"""
+    n = len(bms_kWh)
+
+    # 計算抑低時段長度（小時）
+    with np.errstate(divide="ignore", invalid="ignore"):
+        dr_avail_kWh = (bms_kWh / dr_hr)[:, None]
+
+    平均可放電量 = stats["平均可放電量"][None, :]
+    平均超約電量 = np.clip(stats["平均超約電量"], 0, None)[None, :]
+
+    solves_over = np.broadcast_to(solves_over, bms_kWh.shape)[:, None]
+    平均最大可放電量 = np.where(
+        solves_over,
+        np.minimum(平均可放電量, dr_avail_kWh - 平均超約電量),
+        np.minimum(平均可放電量, dr_avail_kWh),
+    )
+
+    # 最大可抑低量：取 baseline 和最大可放電量的最小值（依列位置對齊，缺的補 NaN）
+    baseline = np.broadcast_to(
+        stats["baseline可放電功率"], (n, len(stats["baseline可放電功率"]))
+    )
+    length = max(平均最大可放電量.shape[-1], baseline.shape[-1])
+    最大可抑低量 = np.minimum(
+        _pad_nan(平均最大可放電量, length), _pad_nan(baseline, length)
+    )
+
+    # 計算平均抑低契約容量（略過 NaN）
+    valid = ~np.isnan(最大可抑低量)
+    count = valid.sum(axis=-1)
+    total = np.where(valid, 最大可抑低量, 0.0).sum(axis=-1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(count > 0, total / count, np.nan)
+
+
+def dr_capacity_curve(stats, dr_hr):
+    """
+    dr_capacity_from_stats 的容量反應曲線（x 為儲能容量 bms_kWh）。
+    各代表日的抑低量為 min(平均可放電量, bms_kWh / dr_hr [- 平均超約電量], baseline)，
+    轉折點在 dr_hr × (平均可放電量或 baseline [+ 平均超約電量])。
+    """
+    if not dr_hr > 0:
+        raise ValueError(f"執行時數需大於 0，實際為 {dr_hr}")
+
+    # 與 dr_capacity_from_stats 相同，baseline 依列位置與夏月工作日對齊
+    length = max(len(stats["平均可放電量"]), len(stats["baseline可放電功率"]))
+    平均可放電量 = _pad_nan(stats["平均可放電量"], length)
+    baseline = _pad_nan(stats["baseline可放電功率"], length)
+    平均超約電量 = _pad_nan(np.clip(stats["平均超約電量"], 0, None), length)
+    門檻 = np.array([平均可放電量, baseline])
+    return _threshold_curves(
+        stats["超約電量上限"],
+        lambda bms_kWh, solves_over: _dr_capacity(stats, dr_hr, bms_kWh, solves_over),
+        [dr_hr * 門檻, dr_hr * (門檻 + 平均超約電量)],
+        (1 / dr_hr, 1 / dr_hr),
+    )
+
+
+def dr_capacity_from_curve(curves, bms_kWh):
+    """由 dr_capacity_curve 查表，回傳值與 dr_capacity_from_stats 相同"""
+    return _interp_threshold_curves(curves, np.atleast_1d(bms_kWh))
+
+
+def calculate_dr_capacity_by_program(df_ami, df_ami2, bms_kWh, dr_programs=None):
+    """
+    一次計算多個日選時段型方案、多個儲能容量的平均抑低契約容量。
+
+    Parameters:
+        bms_kWh: 儲能容量（可為各年容量的陣列）
+        dr_programs: {方案: {"start_time", "end_time", "duration_hr", ...}}，
+            預設為 dr_program_dict 中執行時數大於 0 的方案
+
+    Returns:
+        dict: {方案: 與 bms_kWh 等長的平均抑低契約容量陣列}
+    """
+    if dr_programs is None:
+        dr_programs = {
+            name: program
+            for name, program in dr_program_dict.items()
+            if program["duration_hr"] > 0
+        }
+
+    # 各方案共用同一份 slot cube，相同時段的方案共用同一份統計
+    slot_cube = build_slot_cube(df_ami)
+    window_stats = {}
+    dr_capacity = {}
+    for name, program in dr_programs.items():
+        window = (program["start_time"], program["end_time"])
+        if window not in window_stats:
+            window_stats[window] = dr_window_stats(
+                df_ami, df_ami2, *window, slot_cube=slot_cube
+            )
+        dr_capacity[name] = dr_capacity_from_stats(
+            window_stats[window], program["duration_hr"], bms_kWh
+        )
+    return dr_capacity
+
+
 # 計算模擬即時備轉所需要參數
 # max_bms_kW 最大輸出功率
 def spining_weekend_load_kw_stats(df, max_bms_kW):
@@ -396,14 +907,11 @@ def spining_weekend_load_kw_stats(df, max_bms_kW):
     )
 
 
-# 計算即時備轉模擬統計資料，好計算收益
-def compute_spinning_summary(df_ami_week, max_bms_kW, avail_kWh):
+# 即時備轉模擬統計資料中與可用容量無關的部分
+def compute_spinning_stats(df_ami_week, max_bms_kW):
     """
-    計算即時備轉模擬統計表格。
-    - df_ami_week: 含有 load_kw, 可放電功率, tou_level, tou, season 等欄位的 DataFrame
-    - max_bms_kW: 單位為 kW，整體最大輸出功率
-    - avail_kWh: 加總的電池容量（單位 kWh）
-    回傳: 包含可放電功率、小時數、平均負載等統計欄位的 df_ami_week2
+    依 (season, spinning_level) 統計工作日的可放電功率、小時數與負載特徵。
+    結果與 avail_kWh 無關，同一份 AMI 只需計算一次（見 compute_spinning_summary）。
     """
     # 標記尖峰與非尖峰
     df_ami_week = df_ami_week.copy()
@@ -418,7 +926,6 @@ def compute_spinning_summary(df_ami_week, max_bms_kW, avail_kWh):
     )
 
     df_ami_week2["小時數"] = df_ami_week2["小時數"] / (4 * 5)
-    df_ami_week2["總放電時數"] = avail_kWh / df_ami_week2["可放電功率"]
 
     # 計算負載統計
     df_stats = (
@@ -441,6 +948,24 @@ def compute_spinning_summary(df_ami_week, max_bms_kW, avail_kWh):
     return df_ami_week2
 
 
+# 計算即時備轉模擬統計資料，好計算收益
+def compute_spinning_summary(df_ami_week, max_bms_kW, avail_kWh):
+    """
+    計算即時備轉模擬統計表格。
+    - df_ami_week: 含有 load_kw, 可放電功率, tou_level, tou, season 等欄位的 DataFrame
+    - max_bms_kW: 單位為 kW，整體最大輸出功率
+    - avail_kWh: 加總的電池容量（單位 kWh）
+    回傳: 包含可放電功率、小時數、平均負載等統計欄位的 df_ami_week2
+    """
+    df_ami_week2 = compute_spinning_stats(df_ami_week, max_bms_kW)
+    df_ami_week2.insert(
+        df_ami_week2.columns.get_loc("load_kw") + 1,
+        "總放電時數",
+        avail_kWh / df_ami_week2["可放電功率"],
+    )
+    return df_ami_week2
+
+
 # 計算非工作日的即時備轉收益，同時包括夏月跟非夏月
 def compute_spinning_gain_A(
     series_ami_weekend, non_working_days, capacity_price, performance_price
@@ -562,6 +1087,117 @@ def compute_total_spinning_gain_sum(
     return total_single, total_agg
 
 
+# 即時備轉收益的逐年向量化版本：avail_kWh 為各年的可用容量
+def compute_spinning_gain_B_by_year(
+    df_stats,
+    season,
+    avail_kWh,
+    days,
+    capacity_price,
+    performance_price,
+    dr_hour,
+    cycles,
+):
+    """
+    與 compute_spinning_gain_B 相同，但 df_stats 為 compute_spinning_stats 的結果，
+    總放電時數由 avail_kWh（各年的可用容量陣列）直接計算，一次算完所有年份。
+    """
+    # 尖峰的行為
+    row_1 = df_stats[
+        (df_stats["season"] == season) & (df_stats["spinning_level"] == 1)
+    ].iloc[0]
+    # 非尖峰的行為
+    row_0 = df_stats[
+        (df_stats["season"] == season) & (df_stats["spinning_level"] == 0)
+    ].iloc[0]
+
+    總放電時數 = np.asarray(avail_kWh, dtype=float) / row_1["可放電功率"]
+
+    if season == "summer":
+        # 假設放電時段都不投
+        不可投標時數_1 = np.maximum(np.ceil(總放電時數), dr_hour)
+        # 假設充放電時數一樣，充電也不投
+        不可投標時數_0 = np.round(總放電時數)
+    else:
+        # 非夏月的情況，才會受2循環影響
+        不可投標時數_1 = np.maximum(np.ceil(總放電時數), dr_hour) * cycles
+        不可投標時數_0 = np.round(總放電時數) * cycles
+
+    小時數_1 = row_1["小時數"]
+    小時數_0 = row_0["小時數"]
+
+    daily_benefit_single = (capacity_price + performance_price) * (
+        小時數_1 - 不可投標時數_1
+    ) * row_1["load_kw_gt1000_mean"] / 1000 * row_1["gt1000_ratio"] + (
+        capacity_price + performance_price
+    ) * (小時數_0 - 不可投標時數_0) * row_0["load_kw_gt1000_mean"] / 1000 * row_0[
+        "gt1000_ratio"
+    ]
+    total_single = days * daily_benefit_single
+
+    # 聚合場域計算
+    daily_benefit_agg = (capacity_price + performance_price) * (
+        小時數_1 - 不可投標時數_1
+    ) * row_1["load_kw_mean"] / 1000 + (capacity_price + performance_price) * (
+        小時數_0 - 不可投標時數_0
+    ) * row_0["load_kw_mean"] / 1000
+    total_agg = days * daily_benefit_agg
+
+    return total_single, total_agg
+
+
+def compute_total_spinning_gain_by_year(
+    series_ami_weekend,
+    df_stats,
+    avail_kWh,
+    non_working_days,
+    working_days_summer,
+    working_days_not_summer,
+    capacity_price,
+    performance_price,
+    dr_hour,
+    cycles,
+):
+    """
+    compute_total_spinning_gain_sum 的逐年版本：avail_kWh 為各年的可用容量，
+    回傳 (total_single, total_agg) 兩個與 avail_kWh 等長的陣列。
+    """
+    # Case A: 非工作日收益，與可用容量無關
+    sp_A_single, sp_A_agg = compute_spinning_gain_A(
+        series_ami_weekend, non_working_days, capacity_price, performance_price
+    )
+
+    # Case B: 非夏月收益
+    sp_B_single_ns, sp_B_agg_ns = compute_spinning_gain_B_by_year(
+        df_stats,
+        "not_summer",
+        avail_kWh,
+        working_days_not_summer,
+        capacity_price,
+        performance_price,
+        dr_hour,
+        cycles,
+    )
+
+    # Case B: 夏月收益
+    sp_B_single_s, sp_B_agg_s = compute_spinning_gain_B_by_year(
+        df_stats,
+        "summer",
+        avail_kWh,
+        working_days_summer,
+        capacity_price,
+        performance_price,
+        dr_hour,
+        cycles,
+    )
+
+    # 合計總收益
+    total_single = sp_A_single + sp_B_single_ns + sp_B_single_s
+    total_agg = sp_A_agg + sp_B_agg_ns + sp_B_agg_s
+
+    return total_single, total_agg
+
+
 # 計算分析的台數
 def generate_fixed_step_combinations(contract_capacity, pcs_power=125, max_groups=4):
     max_units = contract_capacity // pcs_power
@@ -1,3 +1,4 @@
+import hashlib
 import warnings
 
 import numpy as np
@@ -773,6 +774,80 @@ def load_config():
 
 
 ### 更新手動曲線
+# 代表日負載曲線：14 條 (夏月/非夏月 x 星期一~日) x 24 小時
+N_PROFILES = 14
+HOURS_PER_DAY = 24
+
+
+def _profile_hour_group(df_15min):
+    """
+    每列的 (代表日, 小時) 群組編碼：(is_summer * 7 + 星期) * 24 + 小時。
+    無法識別的代表日為 -1。
+    """
+    weekday_code = pd.Categorical(
+        df_15min["weekday"], categories=AMI_JSON_WEEKDAYS
+    ).codes.astype(np.int64)
+    is_summer = df_15min["is_summer"].to_numpy()
+    profile = np.where(
+        (weekday_code >= 0) & np.isin(is_summer, [0, 1]),
+        is_summer * 7 + weekday_code,
+        -1,
+    )
+
+    # AMI store 讀出的資料已帶 slot，不需要再解析時間字串
+    if "slot" in df_15min.columns:
+        hour = df_15min["slot"].to_numpy(dtype=np.int64) // 4
+    else:
+        codes, uniques = pd.factorize(df_15min["variable"])
+        hour = np.array([int(str(t)[:2]) for t in uniques], dtype=np.int64)[codes]
+
+    valid = (profile >= 0) & (hour >= 0) & (hour < HOURS_PER_DAY)
+    return np.where(valid, profile * HOURS_PER_DAY + hour, -1)
+
+
+def hourly_target_matrix(hourly_dicts):
+    """
+    將 [{'hour':'00:00','summerMonday': …}, …] 轉成攤平的 (14 x 24) 目標小時平均。
+
+    Returns:
+        tuple: (target, given)，target 沒有給值的格子為 NaN，
+        given 標記有出現在 hourly_dicts 中的格子
+    """
+    target = np.full(N_PROFILES * HOURS_PER_DAY, np.nan)
+    given = np.zeros(N_PROFILES * HOURS_PER_DAY, dtype=bool)
+    for hour_record in hourly_dicts:
+        hour = int(str(hour_record["hour"])[:2])
+        if not 0 <= hour < HOURS_PER_DAY:
+            continue
+        for key, value in hour_record.items():
+            parsed = parse_season_weekday_key(key) if key != "hour" else None
+            if parsed is None:
+                continue
+            is_summer, weekday = parsed
+            profile = is_summer * 7 + AMI_JSON_WEEKDAYS.index(weekday)
+            cell = profile * HOURS_PER_DAY + hour
+            target[cell] = np.nan if value is None else float(value)
+            given[cell] = True
+    return target, given
+
+
+def _scale_rows(values, group, target, rows):
+    """
+    依原始小時平均與目標值縮放 rows 指定的資料列；
+    倍率無法計算（沒有目標值、原始平均為 NaN）的列維持原值。
+    """
+    row_group = group[rows]
+    row_values = values[rows]
+    valid = ~np.isnan(row_values)
+    n_groups = N_PROFILES * HOURS_PER_DAY
+    total = np.bincount(row_group[valid], weights=row_values[valid], minlength=n_groups)
+    count = np.bincount(row_group[valid], minlength=n_groups)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        orig_avg = np.where(count > 0, total / count, np.nan)
+        scaled = np.round(row_values * (target[row_group] / orig_avg[row_group]))
+    return np.where(np.isnan(scaled), row_values, scaled)
+
+
 def scale_15min_by_hour(df_15min: pd.DataFrame, hourly_dicts: list) -> pd.DataFrame:
     """
     依『調整後的小時平均負載』，將原始 15 分鐘資料等比例縮放，輸出調整後的 15 分鐘負載。
@@ -788,57 +863,145 @@ def scale_15min_by_hour(df_15min: pd.DataFrame, hourly_dicts: list) -> pd.DataFr
     Returns
     -------
     pd.DataFrame
-        在原 DataFrame 基礎上多一欄 'scaled_value'（調整後的 15 分鐘負載）。
+        與原 DataFrame 相同欄位與順序，value 為調整後的 15 分鐘負載。
     """
+    # 每列對應到 (代表日, 小時) 群組，倍率 = 目標小時平均 / 原始小時平均
+    group = _profile_hour_group(df_15min)
+    target, _ = hourly_target_matrix(hourly_dicts)
 
-    # ---------- 1) 將 hourly_dicts 轉成長格式 ----------
-    df_hour_wide = pd.DataFrame(hourly_dicts)
-    df_hour_long = df_hour_wide.melt(
-        id_vars="hour", var_name="season_weekday", value_name="target_avg"
-    )
-    # 拆 season 與 weekday
-    df_hour_long["is_summer"] = (
-        df_hour_long["season_weekday"].str.startswith("summer").astype(int)
-    )
-    df_hour_long["weekday"] = df_hour_long["season_weekday"].str.replace(
-        r"^(summer|nonSummer)", "", regex=True
-    )
-    df_hour_long["hour"] = df_hour_long["hour"].str.slice(0, 2).astype(int)
-    df_hour_target = df_hour_long[["is_summer", "weekday", "hour", "target_avg"]]
+    values = df_15min["value"].to_numpy(dtype=float)
+    rows = np.flatnonzero(group >= 0)
 
-    # ---------- 2) 加入 hour 欄位到原始 15 分鐘資料 ----------
-    df_15min = df_15min.copy()
-    df_15min["hour"] = df_15min["variable"].str.slice(0, 2).astype(int)
+    df_scaled = df_15min.reset_index(drop=True)
+    scaled_values = values.copy()
+    scaled_values[rows] = _scale_rows(values, group, target, rows)
+    df_scaled["value"] = scaled_values
+    return df_scaled
 
-    # ---------- 3) 計算原始小時平均 ----------
-    orig_avg = (
-        df_15min.groupby(["is_summer", "weekday", "hour"])["value"]
-        .mean()
-        .reset_index()
-        .rename(columns={"value": "orig_avg"})
-    )
 
-    # ---------- 4) 合併目標與原始平均、算倍率 ----------
-    scale_df = orig_avg.merge(
-        df_hour_target, on=["is_summer", "weekday", "hour"], how="inner"
+def diff_hourly_dicts(previous_hourly_dicts, hourly_dicts):
+    """
+    比較兩份小時曲線，回傳只含有變動格子的 hourly_dicts。
+    前一份有、這一份沒有的格子以 None 表示（縮放時維持原值）。
+    """
+    previous_target, previous_given = hourly_target_matrix(previous_hourly_dicts)
+    target, given = hourly_target_matrix(hourly_dicts)
+    same = (previous_given == given) & (
+        (previous_target == target) | (np.isnan(previous_target) & np.isnan(target))
     )
-    scale_df["scale_factor"] = scale_df["target_avg"] / scale_df["orig_avg"]
 
-    # ---------- 5) 把倍率併回 15 分鐘資料並計算縮放後值 ----------
-    df_scaled = df_15min.merge(
-        scale_df[["is_summer", "weekday", "hour", "scale_factor"]],
-        on=["is_summer", "weekday", "hour"],
-        how="left",
-    )
-    df_scaled["scaled_value"] = df_scaled["value"] * df_scaled["scale_factor"]
-    df_scaled["scaled_value"] = df_scaled["scaled_value"].round()
+    changed = {}
+    for cell in np.flatnonzero(~same):
+        profile, hour = divmod(int(cell), HOURS_PER_DAY)
+        is_summer, weekday = divmod(profile, 7)
+        key = ("summer" if is_summer else "nonSummer") + AMI_JSON_WEEKDAYS[weekday]
+        hour_record = changed.setdefault(hour, {"hour": f"{hour:02d}:00"})
+        hour_record[key] = None if np.isnan(target[cell]) else float(target[cell])
+    return [changed[hour] for hour in sorted(changed)]
 
-    # 如果有無匹配到的組別，維持原值
-    df_scaled["scaled_value"].fillna(df_scaled["value"], inplace=True)
-    df_scaled["value"] = df_scaled["scaled_value"]
-    df_scaled.drop(columns=["hour", "scaled_value", "scale_factor"], inplace=True)
 
-    return df_scaled
+def rescale_15min_by_hour(df_scaled, df_15min, changed_hourly_dicts):
+    """
+    增量版 scale_15min_by_hour：只重算有變動的 (代表日, 小時) 格子。
+
+    Parameters
+    ----------
+    df_scaled : pd.DataFrame
+        上一次的縮放結果，列順序需與 df_15min 相同。
+        可以是 scale_15min_by_hour 的輸出（value 欄），
+        也可以是其 norm_ami 結果（load_kw 欄）；norm_ami 的其他欄位只跟時間電價有關，不需重算。
+    df_15min : pd.DataFrame
+        原始 15 分鐘資料（縮放前），倍率以原始小時平均計算
+    changed_hourly_dicts : list
+        只含變動格子的 hourly_dicts（見 diff_hourly_dicts）
+
+    Returns
+    -------
+    pd.DataFrame
+        df_scaled 的副本，只更新受影響的資料列。
+    """
+    if len(df_scaled) != len(df_15min):
+        raise ValueError("df_scaled 與 df_15min 的資料筆數不一致")
+    value_column = "load_kw" if "load_kw" in df_scaled.columns else "value"
+
+    group = _profile_hour_group(df_15min)
+    target, given = hourly_target_matrix(changed_hourly_dicts)
+    rows = np.flatnonzero((group >= 0) & given[np.clip(group, 0, None)])
+
+    df_rescaled = df_scaled.copy()
+    if len(rows) == 0:
+        return df_rescaled
+
+    values = df_15min["value"].to_numpy(dtype=float)
+    scaled_values = df_rescaled[value_column].to_numpy(dtype=float, copy=True)
+    scaled_values[rows] = _scale_rows(values, group, target, rows)
+    df_rescaled[value_column] = scaled_values
+    return df_rescaled
+
+
+# 代表日 JSON 的季節前綴：summerMonday -> (1, "Monday")
+AMI_JSON_SEASON_PREFIXES = (("summer", 1), ("nonSummer", 0))
+AMI_JSON_WEEKDAYS = [
+    "Monday",
+    "Tuesday",
+    "Wednesday",
+    "Thursday",
+    "Friday",
+    "Saturday",
+    "Sunday",
+]
+
+
+def parse_season_weekday_key(key):
+    """
+    解析季節+星期欄位名稱，例如 'summerMonday' -> (1, 'Monday')。
+    無法識別的欄位回傳 None。
+    """
+    for prefix, is_summer in AMI_JSON_SEASON_PREFIXES:
+        if key.startswith(prefix):
+            weekday = key[len(prefix) :]
+            if weekday in AMI_JSON_WEEKDAYS:
+                return is_summer, weekday
+            return None
+    return None
+
+
+def _ami_15min_columns_to_df(times, columns):
+    """
+    由時間陣列與 {季節+星期: 數值陣列} 組成長格式 DataFrame。
+    季節、星期只依欄位名稱解析一次；列的順序為時間優先，同一時間內依欄位順序。
+    """
+    keys = []
+    is_summer = []
+    weekdays = []
+    for key in columns:
+        parsed = parse_season_weekday_key(key)
+        if parsed is not None:
+            keys.append(key)
+            is_summer.append(parsed[0])
+            weekdays.append(parsed[1])
+
+    n_times = len(times)
+    if not keys or n_times == 0:
+        return pd.DataFrame()
+
+    # (時間, 季節+星期) 數值矩陣，None 視為 0
+    values = np.column_stack(
+        [np.asarray(columns[key], dtype=float).reshape(-1) for key in keys]
+    )
+    if values.shape[0] != n_times:
+        raise ValueError("json_ami_15min 各欄位長度與 time 不一致")
+    values = np.where(np.isnan(values), 0.0, values)
+
+    n_keys = len(keys)
+    return pd.DataFrame(
+        {
+            "is_summer": np.tile(np.asarray(is_summer, dtype=np.int64), n_times),
+            "weekday": np.tile(np.asarray(weekdays, dtype=object), n_times),
+            "variable": np.repeat(np.asarray(times, dtype=object), n_keys),
+            "value": values.reshape(-1),
+        }
+    )
 
 
 # 將 json_result 轉換成 DataFrame 格式
@@ -848,65 +1011,201 @@ def ami_15min_json_to_df(json_data):
 
     Parameters:
     -----------
-    json_data : list
-        由 convert_ami_to_json_15min 函數產生的 JSON 資料
+    json_data : list | dict
+        - list：由 convert_ami_to_json_15min 函數產生的 JSON 資料，
+          每個時間一筆 {"time": ..., "summerMonday": ..., ...}
+        - dict：欄式格式 {"time": [...], "summerMonday": [...], ...}，
+          每個季節+星期一個陣列，直接組成數值矩陣
 
     Returns:
     --------
     DataFrame : 包含 is_summer, weekday, variable, value 欄位的 DataFrame
     """
+    if isinstance(json_data, dict):
+        columns = {key: value for key, value in json_data.items() if key != "time"}
+        return _ami_15min_columns_to_df(json_data["time"], columns)
+
+    if len(json_data) == 0:
+        return pd.DataFrame()
+
+    # 各筆的欄位順序一致時（convert_ami_to_json_15min 的輸出），整批轉成欄式
+    first_keys = tuple(json_data[0])
+    if all(tuple(time_record) == first_keys for time_record in json_data):
+        matrix = np.array(
+            [list(time_record.values()) for time_record in json_data], dtype=object
+        )
+        columns = {
+            key: matrix[:, i] for i, key in enumerate(first_keys) if key != "time"
+        }
+        return _ami_15min_columns_to_df(matrix[:, first_keys.index("time")], columns)
 
-    # 定義有效的星期名稱
-    valid_weekdays = [
-        "Monday",
-        "Tuesday",
-        "Wednesday",
-        "Thursday",
-        "Friday",
-        "Saturday",
-        "Sunday",
+    # 欄位不一致時逐筆轉換，缺少的欄位不產生資料
+    frames = [
+        _ami_15min_columns_to_df(
+            [time_record["time"]],
+            {key: [value] for key, value in time_record.items() if key != "time"},
+        )
+        for time_record in json_data
     ]
+    return pd.concat(frames, ignore_index=True)
 
-    # 收集所有資料
-    data_rows = []
-
-    for time_record in json_data:
-        time_value = time_record["time"]
-
-        # 遍歷除了 time 以外的所有欄位
-        for key, value in time_record.items():
-            if key != "time":
-                # 解析 key，例如 'summerMonday' -> is_summer=1, weekday='Monday'
-                if key.startswith("summer"):
-                    is_summer = 1
-                    weekday = key[6:]  # 移除 'summer' 前綴
-                elif key.startswith("nonSummer"):
-                    is_summer = 0
-                    weekday = key[9:]  # 移除 'nonSummer' 前綴
-                else:
-                    continue  # 跳過無法識別的欄位
 
-                # 確保 weekday 是有效的
-                if weekday in valid_weekdays:
-                    data_rows.append(
-                        {
-                            "is_summer": is_summer,
-                            "weekday": weekday,
-                            "variable": time_value,
-                            "value": float(value) if value is not None else 0.0,
-                        }
-                    )
+# 季節、代表日類別的整數編碼，一天 96 個 15 分鐘時段
+SEASON_CODES = {"not_summer": 0, "summer": 1}
+WEEKDAY_CLASS_CODES = {"week": 0, "sat": 1, "sun": 2}
+SLOTS_PER_DAY = 96
+
+# 各計費類別的時間電價索引，warm container 內重複使用
+_tou_index_cache = {}
+
+# 時間電價索引用到的 df_tou_2025 欄位
+TOU_INDEX_COLUMNS = ("datetime", "season", "weekday", "tou", "tou_tag")
+
+# 各計費類別最近一次的 df_tou_2025 內容指紋
+_tou_fingerprint_cache = {}
+
+
+def tou_fingerprint(df_tou_2025, 計費類別):
+    """
+    單一計費類別的時間電價內容指紋（TOU_INDEX_COLUMNS 的雜湊）。
+
+    呼叫端每次重新讀入 df_tou_2025 時物件不同，但內容相同即得到相同的指紋，
+    warm container 內的快取（時間電價索引、ami_cache）以此判斷是否可以沿用。
+    同一個 DataFrame 物件只計算一次。
+    """
+    cached = _tou_fingerprint_cache.get(計費類別)
+    if cached is not None and cached["source"] is df_tou_2025:
+        return cached["fingerprint"]
+
+    df_tou = df_tou_2025.loc[
+        df_tou_2025["type"] == 計費類別, list(TOU_INDEX_COLUMNS)
+    ].reset_index(drop=True)
+    row_hashes = pd.util.hash_pandas_object(df_tou, index=False).to_numpy()
+    fingerprint = hashlib.sha1(row_hashes.tobytes()).hexdigest()
+
+    _tou_fingerprint_cache[計費類別] = {
+        "source": df_tou_2025,
+        "fingerprint": fingerprint,
+    }
+    return fingerprint
+
 
-    # 轉換成 DataFrame
-    df = pd.DataFrame(data_rows)
+def time_to_slot(times):
+    """
+    將 'HH:MM' 時間字串轉成當日第幾個 15 分鐘時段 (0~95)。
+    無法解析或不在 15 分鐘整點上的時間回傳 -1。
+    只解析不重複的時間字串（一年份資料也只有 96 種），再以代碼展開。
+    """
+    codes, uniques = pd.factorize(pd.Series(times), use_na_sentinel=False)
+    uniques = pd.Series(uniques).astype(str)
+    hour = pd.to_numeric(uniques.str.slice(0, 2), errors="coerce")
+    minute = pd.to_numeric(uniques.str.slice(3, 5), errors="coerce")
+    slot = hour * 4 + minute // 15
+    on_grid = hour.between(0, 23) & minute.between(0, 59) & (minute % 15 == 0)
+    return slot.where(on_grid, -1).fillna(-1).to_numpy(dtype=np.int64)[codes]
+
+
+def time_str_to_slot(time_str, round_up=False):
+    """
+    將單一 'HH:MM' 時間轉成時段序號，用於時間區間的上下界。
+    不在 15 分鐘整點上的時間預設捨去；round_up=True 時進位到下一個時段。
+    """
+    hour, minute = (int(x) for x in time_str.split(":")[:2])
+    minutes = hour * 60 + minute
+    if round_up:
+        return -(-minutes // 15)
+    return minutes // 15
 
-    return df
+
+def get_tou_index(df_tou_2025, 計費類別):
+    """
+    取得（必要時建立）單一計費類別的時間電價索引。
+
+    索引為 (季節, 代表日類別, 時段) = (2, 3, 96) 的陣列：
+    - tou: 時間電價，缺值為 NaN
+    - tou_tag_code: tou_tag 的整數編碼，缺值為 -1
+    - tou_tag_categories: 編碼對應的 tou_tag 名稱，最後一個元素為 NaN，讓 -1 直接對到缺值
+
+    同一份時間電價內容（tou_fingerprint 相同）下，每個計費類別只建立一次；
+    呼叫端每次重新讀入 df_tou_2025 也能沿用。
+    """
+    fingerprint = tou_fingerprint(df_tou_2025, 計費類別)
+    cached = _tou_index_cache.get(計費類別)
+    if cached is not None and cached["fingerprint"] == fingerprint:
+        return cached
+
+    df_tou = df_tou_2025[df_tou_2025["type"] == 計費類別]
+    tou_datetime = pd.to_datetime(df_tou["datetime"])
+    minute = tou_datetime.dt.minute.to_numpy()
+    slot = tou_datetime.dt.hour.to_numpy() * 4 + minute // 15
+    season_code = df_tou["season"].map(SEASON_CODES).to_numpy()
+    weekday_code = df_tou["weekday"].map(WEEKDAY_CLASS_CODES).to_numpy()
+    valid = (minute % 15 == 0) & ~np.isnan(season_code) & ~np.isnan(weekday_code)
+
+    tag_code, tag_categories = pd.factorize(df_tou["tou_tag"])
+
+    shape = (len(SEASON_CODES), len(WEEKDAY_CLASS_CODES), SLOTS_PER_DAY)
+    tou = np.full(shape, np.nan)
+    tou_tag_code = np.full(shape, -1, dtype=np.int16)
+    key = (
+        season_code[valid].astype(np.int64),
+        weekday_code[valid].astype(np.int64),
+        slot[valid],
+    )
+    tou[key] = df_tou["tou"].to_numpy(dtype=float)[valid]
+    tou_tag_code[key] = tag_code[valid]
+
+    tou_index = {
+        "fingerprint": fingerprint,
+        "tou": tou,
+        "tou_tag_code": tou_tag_code,
+        "tou_tag_categories": np.append(
+            np.asarray(tag_categories, dtype=object), np.nan
+        ),
+    }
+    _tou_index_cache[計費類別] = tou_index
+    return tou_index
+
+
+def lookup_tou(tou_index, season_code, weekday_code, slot):
+    """
+    依 (季節, 代表日類別, 時段) 編碼，從時間電價索引取出 tou 與 tou_tag。
+    任一編碼為 -1 時視為查無資料，回傳 NaN。
+    """
+    valid = (season_code >= 0) & (weekday_code >= 0) & (slot >= 0)
+    key = (
+        np.where(valid, season_code, 0),
+        np.where(valid, weekday_code, 0),
+        np.where(valid, slot, 0),
+    )
+    tou = np.where(valid, tou_index["tou"][key], np.nan)
+    tou_tag_code = np.where(valid, tou_index["tou_tag_code"][key], -1)
+    return tou, tou_index["tou_tag_categories"][tou_tag_code]
+
+
+# 依代表日最高/最低電價，標註時間電價等級
+def classify_tou_level(tou, tou_max, tou_min):
+    """
+    向量化標註 tou_level：等於該組最高電價為 high，等於最低電價為 low，其餘為 other。
+
+    Parameters:
+        tou, tou_max, tou_min (array-like): 同長度的電價、組內最高電價、組內最低電價
+
+    Returns:
+        np.ndarray: 'high' / 'low' / 'other' 字串陣列
+    """
+    tou = np.asarray(tou)
+    return np.select(
+        [tou == np.asarray(tou_max), tou == np.asarray(tou_min)],
+        ["high", "low"],
+        default="other",
+    ).astype(object)
 
 
 # 正規化AMI資料
 # 鉤稽時間電價，標註最高最低價等
 def norm_ami(df_ami, df_tou_2025, 計費類別):
-    df_tou = df_tou_2025[df_tou_2025["type"] == 計費類別].copy()
+    tou_index = get_tou_index(df_tou_2025, 計費類別)
     # df_ami = df_ami_raw[df_ami_raw["ID"] == ID].copy()
     df_ami["weekday2"] = df_ami["weekday"]
     df_ami["season"] = df_ami["is_summer"].map({1: "summer", 0: "not_summer"})
@@ -916,14 +1215,21 @@ def norm_ami(df_ami, df_tou_2025, 計費類別):
         np.where(df_ami["weekday"].isin(["Sunday"]), "sun", "week"),
     )
 
-    df_tou["datetime"] = pd.to_datetime(df_tou["datetime"])
-    df_tou["variable"] = df_tou["datetime"].dt.strftime("%H:%M")
-
-    df_ami = df_ami.merge(
-        df_tou[["tou", "tou_tag", "season", "weekday", "variable"]],
-        how="left",
-        on=["season", "weekday", "variable"],
+    # 以 (季節, 代表日類別, 時段) 直接索引時間電價，取代字串鍵 merge
+    df_ami = df_ami.reset_index(drop=True)
+    # AMI store 讀出的資料已帶 slot，不需要再解析時間字串
+    if "slot" in df_ami.columns:
+        slot = df_ami["slot"].to_numpy(dtype=np.int64)
+    else:
+        slot = time_to_slot(df_ami["variable"])
+    df_ami["tou"], df_ami["tou_tag"] = lookup_tou(
+        tou_index,
+        df_ami["season"].map(SEASON_CODES).fillna(-1).to_numpy(dtype=np.int64),
+        df_ami["weekday"].map(WEEKDAY_CLASS_CODES).to_numpy(dtype=np.int64),
+        slot,
     )
+    # 時段序號 (0~95)，後續的時間區間篩選一律用整數比較
+    df_ami["slot"] = slot.astype(np.int8)
     df_ami.rename(columns={"variable": "timestamp", "value": "load_kw"}, inplace=True)
 
     # 找出每個 group (season + weekday2) 的 max/min
@@ -932,15 +1238,9 @@ def norm_ami(df_ami, df_tou_2025, 計費類別):
     df_ami["tou_min"] = group.transform("min")
 
     # 判斷分類
-    def classify_tou(row):
-        if row["tou"] == row["tou_max"]:
-            return "high"
-        elif row["tou"] == row["tou_min"]:
-            return "low"
-        else:
-            return "other"
-
-    df_ami["tou_level"] = df_ami.apply(classify_tou, axis=1)
+    df_ami["tou_level"] = classify_tou_level(
+        df_ami["tou"], df_ami["tou_max"], df_ami["tou_min"]
+    )
 
     # 移除中間欄位（如不需要）
     df_ami.drop(columns=["tou_max", "tou_min"], inplace=True)
@@ -948,13 +1248,17 @@ def norm_ami(df_ami, df_tou_2025, 計費類別):
     return df_ami.copy()
 
 
-def get_contract_capacity_parameter(
-    tou_program, price_dict, contract_capacities, season
-):
-    """
-    根據電價方案和季節獲取契約容量參數
+# 超約分攤的優先順序：尖峰 → 半尖峰 → 週六半尖峰 → 離峰
+TOU_TAG_PRIORITY = ["尖峰", "半尖峰", "週六半尖峰", "離峰"]
+
+
+def _contract_capacity_values(tou_program, price_dict, contract_capacities, season):
     """
+    依電價方案和季節計算各時段 (依 TOU_TAG_PRIORITY 排序) 的契約容量與基本電費單價
 
+    Returns:
+        tuple: (capacity_kw list, unit_price list)
+    """
     # 欄位對應表：使用者輸入名稱 → 依電價型態映射的實際欄位
     field_alias_mapping = {
         "半尖峰契約/非夏月契約": {
@@ -1001,47 +1305,56 @@ def get_contract_capacity_parameter(
     p_sat = unit_prices.get("週六半尖峰契約", 0)
     p_off = unit_prices.get("離峰契約", 0)
 
-    if any(keyword in tou_program for keyword in ["二段式", "批次"]):
-        # 非夏月尖峰，是經常性 + 非夏月契約
-        if season == "summer":
-            contract_data = {
-                "is_summer": [1] * 4,
-                "tou_tag": ["尖峰", "半尖峰", "週六半尖峰", "離峰"],
-                "capacity_kw": [
-                    ec,
-                    ec + sec_cap,
-                    ec + sec_cap + wk_sat,
-                    ec + sec_cap + wk_sat + offp,
-                ],
-                "unit_price": [p_ec, p_sec, p_sat, p_off],
-            }
-        else:
-            contract_data = {
-                "is_summer": [0] * 4,
-                "tou_tag": ["尖峰", "半尖峰", "週六半尖峰", "離峰"],
-                "capacity_kw": [
-                    ec + sec_cap,
-                    ec + sec_cap,
-                    ec + sec_cap + wk_sat,
-                    ec + sec_cap + wk_sat + offp,
-                ],
-                "unit_price": [p_ec, p_sec, p_sat, p_off],
-            }
+    capacity_kw = [
+        ec,
+        ec + sec_cap,
+        ec + sec_cap + wk_sat,
+        ec + sec_cap + wk_sat + offp,
+    ]
+    # 二段式、批次的非夏月尖峰，是經常性 + 非夏月契約
+    if (
+        any(keyword in tou_program for keyword in ["二段式", "批次"])
+        and season != "summer"
+    ):
+        capacity_kw[0] = ec + sec_cap
 
-    else:
-        contract_data = {
+    return capacity_kw, [p_ec, p_sec, p_sat, p_off]
+
+
+def get_contract_capacity_parameter(
+    tou_program, price_dict, contract_capacities, season
+):
+    """
+    根據電價方案和季節獲取契約容量參數
+    """
+    capacity_kw, unit_price = _contract_capacity_values(
+        tou_program, price_dict, contract_capacities, season
+    )
+    return pd.DataFrame(
+        {
             "is_summer": [1 if season == "summer" else 0] * 4,
-            "tou_tag": ["尖峰", "半尖峰", "週六半尖峰", "離峰"],
-            "capacity_kw": [
-                ec,
-                ec + sec_cap,
-                ec + sec_cap + wk_sat,
-                ec + sec_cap + wk_sat + offp,
-            ],
-            "unit_price": [p_ec, p_sec, p_sat, p_off],
+            "tou_tag": list(TOU_TAG_PRIORITY),
+            "capacity_kw": capacity_kw,
+            "unit_price": unit_price,
         }
+    )
+
+
+def get_contract_capacity_matrix(tou_program, price_dict, contract_capacities):
+    """
+    契約容量與基本電費單價的 (季節 × 時段) 矩陣。
 
-    return pd.DataFrame(contract_data)
+    Returns:
+        tuple: (capacity_kw, unit_price)，皆為 shape (2, 4) 的 float 陣列，
+        第一軸為 is_summer (0=非夏月, 1=夏月)，第二軸依 TOU_TAG_PRIORITY 排序
+    """
+    capacity_kw = np.empty((2, 4))
+    unit_price = np.empty((2, 4))
+    for season, is_summer in SEASON_CODES.items():
+        capacity_kw[is_summer], unit_price[is_summer] = _contract_capacity_values(
+            tou_program, price_dict, contract_capacities, season
+        )
+    return capacity_kw, unit_price
 
 
 def calculate_annual_basic_fee(
@@ -1151,128 +1464,144 @@ def calculate_annual_basic_fee(
     }
 
 
-def calculate_over_capacity_penalties(
-    df_segment, tou_program, price_dict, contract_capacity
-):
+def group_max_by_season_tou_tag(is_summer, tou_tag, values):
     """
-    計算超約費用的整合函數
+    依 (is_summer, tou_tag) 取 values 最大值，回傳 (2, 4) 矩陣與有資料的組別遮罩。
 
-    參數:
-    df_segment: DataFrame - 包含 is_summer, tou_tag, over_capacity_kw 欄位
-    tou_program: str - 電價方案名稱 (如 '高壓三段式電價')
-    price_dict: dict - 電價資料字典
-    contract_capacity: dict - 契約容量設定
-
-    回傳:
-    dict - 包含夏月和非夏月的超約費用
+    Returns:
+        tuple: (max_values, present)，沒有資料的組別 max_values 為 0
     """
+    season_code = np.asarray(is_summer, dtype=np.int64)
+    tag_code = pd.Categorical(tou_tag, categories=TOU_TAG_PRIORITY).codes
+    values = np.asarray(values, dtype=float)
 
-    # 步驟1: 按夏月/非夏月和時段分組，取各組最大超約量
-    df_segment2 = (
-        df_segment.groupby(["is_summer", "tou_tag"])
-        .agg({"over_capacity_kw": "max"})
-        .reset_index()
-    )
-
-    # 步驟2: 獲取契約容量參數並合併
-    df_contract_summer = get_contract_capacity_parameter(
-        tou_program, price_dict, contract_capacity, "summer"
-    )
-    df_contract_not_summer = get_contract_capacity_parameter(
-        tou_program, price_dict, contract_capacity, "not_summer"
-    )
-    df_contract2 = pd.concat([df_contract_summer, df_contract_not_summer]).reset_index(
-        drop=True
-    )
-
-    # 步驟3: 合併契約容量資料
-    df_segment3 = df_segment2.merge(
-        df_contract2, on=["is_summer", "tou_tag"], how="left"
-    )
-
-    # 步驟4: 調整超約容量 - 按優先順序分配
-    df = df_segment3.copy()
-
-    # 定義優先順序
-    priority = {"尖峰": 1, "半尖峰": 2, "週六半尖峰": 3, "離峰": 4}
-    df["priority"] = df["tou_tag"].map(priority)
+    valid = (tag_code >= 0) & (season_code >= 0) & (season_code <= 1)
+    flat = season_code[valid] * 4 + tag_code[valid]
 
-    # 處理每個季節分開計算
-    def adjust_over_capacity(group):
-        used_capacity = 0
-        adjusted = []
+    present = np.bincount(flat, minlength=8).reshape(2, 4) > 0
+    max_values = np.full(8, -np.inf)
+    np.maximum.at(max_values, flat, np.nan_to_num(values[valid], nan=-np.inf))
+    max_values = np.where(np.isfinite(max_values), max_values, 0).reshape(2, 4)
+    return max_values, present
 
-        # 按照優先順序排序
-        group = group.sort_values("priority")
 
-        for _, row in group.iterrows():
-            oc = max(row["over_capacity_kw"] - used_capacity, 0)
-            adjusted.append(oc)
-            # 更新已佔用的超約容量
-            used_capacity += oc
+def cascade_over_capacity(max_over_kw):
+    """
+    依優先順序分攤超約量（最後一軸依 TOU_TAG_PRIORITY 排序）：
+    較高優先時段已計入的超約量不重複計算，即 diff(cummax(max_over_kw))
+    """
+    max_over_kw = np.clip(np.asarray(max_over_kw, dtype=float), 0, None)
+    return np.diff(np.maximum.accumulate(max_over_kw, axis=-1), axis=-1, prepend=0)
 
-        group["adj_over_capacity_kw"] = adjusted
-        return group
 
-    df = (
-        df.groupby(["is_summer"], group_keys=True)
-        .apply(adjust_over_capacity, include_groups=False)
-        .reset_index(level=["is_summer"])
-    )
+def over_capacity_penalty_kernel(max_over_kw, capacity_kw, unit_price):
+    """
+    超約費用核心計算，全部以陣列運算完成。
 
-    # 步驟5: 計算超約費用
-    over_col = "adj_over_capacity_kw"
+    最後一軸為時段，依 TOU_TAG_PRIORITY (尖峰 → 半尖峰 → 週六半尖峰 → 離峰) 排序，
+    前面的軸可以是季節、月份或多組契約容量，皆可 broadcast。
 
-    # 10% 門檻 (每列以該列的契約容量為準)
-    threshold = 0.10 * df["capacity_kw"]
+    1. 依優先順序分攤：較高優先時段已計入的超約量不重複計算，
+       即 adj = diff(cummax(max_over_kw))
+    2. 契約容量 10% 以內 → 2 倍單價；超過 10% → 3 倍單價
 
-    # 分攤超約量：10% 以內與超過 10% 的兩段
-    df["over_within_10pct_kw"] = np.minimum(df[over_col], threshold).clip(lower=0)
-    df["over_above_10pct_kw"] = (df[over_col] - threshold).clip(lower=0)
+    Returns:
+        np.ndarray: 沿最後一軸加總的單月超約費用
+    """
+    adj_over_kw = cascade_over_capacity(max_over_kw)
 
-    # 計算每列的超約費用
-    # 10%以內 → 2倍單價；超過10% → 3倍單價
-    df["overage_fee"] = (
-        2.0 * df["unit_price"] * df["over_within_10pct_kw"]
-        + 3.0 * df["unit_price"] * df["over_above_10pct_kw"]
-    )
+    # 10% 門檻 (每個時段以該時段的契約容量為準)
+    threshold = 0.10 * np.asarray(capacity_kw, dtype=float)
+    over_within_10pct_kw = np.clip(np.minimum(adj_over_kw, threshold), 0, None)
+    over_above_10pct_kw = np.clip(adj_over_kw - threshold, 0, None)
 
-    # 步驟6: 按季節匯總超約費用
-    monthly_fee = df.groupby(["is_summer"], as_index=False).agg(
-        total_overage_fee=("overage_fee", "sum")
+    overage_fee = (
+        2.0 * unit_price * over_within_10pct_kw + 3.0 * unit_price * over_above_10pct_kw
     )
+    return overage_fee.sum(axis=-1)
 
-    # print(monthly_fee)
 
-    # 步驟7: 計算年度超約費用
-    # 確定夏月和非夏月的月數
+def _penalty_result(monthly_fee, present_season, tou_program):
+    """單月超約費用 (依 is_summer 排列) 轉成 calculate_over_capacity_penalties 的回傳格式"""
     number_of_summer_months = (
         5 if "高壓" in tou_program or "特高壓" in tou_program else 4
     )
     number_of_not_summer_months = 12 - number_of_summer_months
 
-    # 轉換為字典格式回傳
     result = {}
-    for _, row in monthly_fee.iterrows():
-        if row["is_summer"] == 1:
-            result["summer_monthly_fee"] = row["total_overage_fee"]
-            result["summer_annual_capacity_penalty"] = (
-                row["total_overage_fee"] * number_of_summer_months
-            )
-        else:
-            result["not_summer_monthly_fee"] = row["total_overage_fee"]
-            result["not_summer_annual_capacity_penalty"] = (
-                row["total_overage_fee"] * number_of_not_summer_months
-            )
+    if present_season[1]:
+        result["summer_monthly_fee"] = float(monthly_fee[1])
+        result["summer_annual_capacity_penalty"] = float(
+            monthly_fee[1] * number_of_summer_months
+        )
+    if present_season[0]:
+        result["not_summer_monthly_fee"] = float(monthly_fee[0])
+        result["not_summer_annual_capacity_penalty"] = float(
+            monthly_fee[0] * number_of_not_summer_months
+        )
+    return result
 
-    # 計算總年度費用
-    # result['total_annual_fee'] = result.get('summer_annual_fee', 0) + result.get('not_summer_annual_fee', 0)
 
-    # # 也回傳詳細的計算過程供參考
-    # result['detail_df'] = df
-    # result['monthly_summary'] = monthly_fee
+def calculate_over_capacity_penalties(
+    df_segment, tou_program, price_dict, contract_capacity
+):
+    """
+    計算超約費用的整合函數
 
-    return result
+    參數:
+    df_segment: DataFrame - 包含 is_summer, tou_tag, over_capacity_kw 欄位
+    tou_program: str - 電價方案名稱 (如 '高壓三段式電價')
+    price_dict: dict - 電價資料字典
+    contract_capacity: dict - 契約容量設定
+
+    回傳:
+    dict - 包含夏月和非夏月的超約費用
+    """
+    # 各 (季節, 時段) 的最大超約量
+    max_over_kw, present = group_max_by_season_tou_tag(
+        df_segment["is_summer"], df_segment["tou_tag"], df_segment["over_capacity_kw"]
+    )
+    capacity_kw, unit_price = get_contract_capacity_matrix(
+        tou_program, price_dict, contract_capacity
+    )
+    monthly_fee = over_capacity_penalty_kernel(max_over_kw, capacity_kw, unit_price)
+    return _penalty_result(monthly_fee, present.any(axis=1), tou_program)
+
+
+def batch_over_capacity_penalties(
+    df_ami, tou_program, price_dict, contract_capacity_candidates
+):
+    """
+    一次計算多組契約容量的超約費用。
+
+    超約量 = max(負載 - 契約容量, 0)，契約容量在同一 (季節, 時段) 內為常數，
+    所以各組的最大超約量 = max(該組最大負載 - 契約容量, 0)，
+    只需對 AMI 做一次分組最大值，再對所有候選契約容量 broadcast。
+
+    參數:
+    df_ami: DataFrame - 包含 is_summer, tou_tag, load_kw 欄位
+    contract_capacity_candidates: list[dict] - 候選契約容量
+
+    回傳:
+    list[dict] - 與候選順序相同，格式同 calculate_over_capacity_penalties
+    """
+    max_load_kw, present = group_max_by_season_tou_tag(
+        df_ami["is_summer"], df_ami["tou_tag"], df_ami["load_kw"]
+    )
+    matrices = [
+        get_contract_capacity_matrix(tou_program, price_dict, contract_capacity)
+        for contract_capacity in contract_capacity_candidates
+    ]
+    if not matrices:
+        return []
+    capacity_kw = np.stack([capacity for capacity, _ in matrices])
+    unit_price = np.stack([price for _, price in matrices])
+
+    max_over_kw = np.where(present, np.clip(max_load_kw - capacity_kw, 0, None), 0)
+    monthly_fee = over_capacity_penalty_kernel(max_over_kw, capacity_kw, unit_price)
+
+    present_season = present.any(axis=1)
+    return [_penalty_result(fee, present_season, tou_program) for fee in monthly_fee]
 
 
 # 計算15年的年度罰金
@@ -1291,44 +1620,25 @@ def calculate_annual_capacity_penalties(
     回傳:
     list: 15年的年度罰金列表
     """
-    annual_penalties = []
-
     # 從result取得年度罰金
     summer_annual_penalty = result["summer_annual_capacity_penalty"]
     not_summer_annual_penalty = result["not_summer_annual_capacity_penalty"]
 
-    for i, available_kWh in enumerate(usable_kWh_list):
-        year = i + 1
-        annual_penalty = 0
-
-        available_kWh = available_kWh * np.sqrt(1 - rtt_loss_rate)
-        # 判斷是否能處理夏月超約
-        can_handle_summer = available_kWh >= max_summer_over
-        # 判斷是否能處理非夏月超約
-        can_handle_not_summer = available_kWh >= max_not_summer_over
-
-        # 如果不能處理，就要付罰金
-        if not can_handle_summer:
-            annual_penalty += summer_annual_penalty
-        if not can_handle_not_summer:
-            annual_penalty += not_summer_annual_penalty
-
-        annual_penalties.append(float(annual_penalty))
-
-        # 列印詳細資訊
-        status = []
-        if can_handle_summer and can_handle_not_summer:
-            status.append("夏月、非夏月都可處理")
-        elif can_handle_summer and not can_handle_not_summer:
-            status.append("只能處理夏月")
-        elif not can_handle_summer and can_handle_not_summer:
-            status.append("只能處理非夏月")
-        else:
-            status.append("夏月、非夏月都無法處理")
+    # 所有年份一次判斷（可用電量也可以是多組情境攤平的序列）
+    available_kWh = np.asarray(usable_kWh_list, dtype=float) * np.sqrt(
+        1 - rtt_loss_rate
+    )
+    # 判斷是否能處理夏月、非夏月超約，不能處理就要付罰金
+    can_handle_summer = available_kWh >= max_summer_over
+    can_handle_not_summer = available_kWh >= max_not_summer_over
+
+    annual_penalties = np.where(can_handle_summer, 0, summer_annual_penalty) + np.where(
+        can_handle_not_summer, 0, not_summer_annual_penalty
+    )
 
-        # print(f"第 {year:2d} 年: 可用電量 {available_kWh:6.0f} kWh, {status[0]}, 年度罰金: {annual_penalty:,.0f} 元")
+    # print(f"可用電量 {available_kWh}, 夏月可處理 {can_handle_summer}, 非夏月可處理 {can_handle_not_summer}, 年度罰金: {annual_penalties}")
 
-    return annual_penalties
+    return annual_penalties.astype(float).tolist()
 
 
 # 計算年度電費
@@ -1493,39 +1803,38 @@ def calculator_annual_cost_ami_365(
 
     """
 
-    # 1. 準備 AMI 資料，整合時間電價資訊
-    df_ami["weekday2"] = df_ami["weekday"]
-    df_ami["season"] = df_ami["is_summer"].map({1: "summer", 0: "not_summer"})
-    df_ami["weekday"] = np.where(
-        df_ami["weekday"].isin(["Saturday"]),
-        "sat",
-        np.where(df_ami["weekday"].isin(["Sunday", "Holiday"]), "sun", "week"),
+    # 1. 將 AMI 資料轉成整數編碼：季節、代表日類別、時段、月份、日期、時段標籤
+    load_kw = df_ami["value"].to_numpy(dtype=float)
+    datetimes = pd.to_datetime(df_ami["datetime"])
+    is_summer = df_ami["is_summer"].to_numpy()
+    season_code = np.where(np.isin(is_summer, [0, 1]), is_summer, -1).astype(np.int64)
+    weekday_code = np.select(
+        [
+            df_ami["weekday"].isin(["Saturday"]).to_numpy(),
+            df_ami["weekday"].isin(["Sunday", "Holiday"]).to_numpy(),
+        ],
+        [WEEKDAY_CLASS_CODES["sat"], WEEKDAY_CLASS_CODES["sun"]],
+        default=WEEKDAY_CLASS_CODES["week"],
     )
+    slot = time_to_slot(df_ami["time"])
+    month_code = datetimes.dt.month.to_numpy() - 1
+    day = datetimes.to_numpy().astype("datetime64[D]")
 
-    df_tou = df_tou_2025[df_tou_2025["type"] == tou_program].copy()
-
-    df_tou["datetime"] = pd.to_datetime(df_tou["datetime"])
-    df_tou["time"] = df_tou["datetime"].dt.strftime("%H:%M")
-
-    df_ami = df_ami.merge(
-        df_tou[["tou", "tou_tag", "season", "weekday", "time"]],
-        how="left",
-        on=["season", "weekday", "time"],
-    )
-    df_ami.rename(columns={"time": "timestamp", "value": "load_kw"}, inplace=True)
+    # 時間電價：以 (季節, 代表日類別, 時段) 直接查表，不再以字串欄位 merge
+    tou_index = get_tou_index(df_tou_2025, tou_program)
+    tou, tou_tag = lookup_tou(tou_index, season_code, weekday_code, slot)
+    # tou_tag 依超約分攤優先順序編碼 (TOU_TAG_PRIORITY)，查無資料為 -1
+    tag_code = pd.Categorical(tou_tag, categories=TOU_TAG_PRIORITY).codes
 
     # 取出起始跟結束的日期 df_ami_long
-    start_date = df_ami["datetime"].iloc[0].date().strftime("%Y-%m-%d")
-    end_date = df_ami["datetime"].iloc[-1].date().strftime("%Y-%m-%d")
+    start_date = datetimes.iloc[0].date().strftime("%Y-%m-%d")
+    end_date = datetimes.iloc[-1].date().strftime("%Y-%m-%d")
     # print(f"AMI 資料起始日期: {start_date}, 結束日期: {end_date}")
 
     # 計算夏月跟非夏月的月數
-    # print(df_ami)
-    number_of_summer_months = round(
-        df_ami[df_ami["is_summer"] == 1].shape[0] / (30.4 * 96), 2
-    )
+    number_of_summer_months = round(np.count_nonzero(is_summer == 1) / (30.4 * 96), 2)
     number_of_not_summer_months = round(
-        df_ami[df_ami["is_summer"] == 0].shape[0] / (30.4 * 96), 2
+        np.count_nonzero(is_summer == 0) / (30.4 * 96), 2
     )
     print(
         f"[debug] 夏月月數: {number_of_summer_months}, 非夏月月數: {number_of_not_summer_months}"
@@ -1542,9 +1851,10 @@ def calculator_annual_cost_ami_365(
 
     print(f"[debug] 基本電費計算結果: {result}")
 
-    # 計算流動電費
-    total_annual_fee = ((df_ami["load_kw"] * df_ami["tou"]).sum() / 4).round()
-    total_annual_kwh = df_ami["load_kw"].sum() / 4
+    # 計算流動電費（與 pandas sum 相同，缺值視為 0）
+    energy_fee = load_kw * tou
+    total_annual_fee = np.round(np.where(np.isnan(energy_fee), 0, energy_fee).sum() / 4)
+    total_annual_kwh = np.where(np.isnan(load_kw), 0, load_kw).sum() / 4
     cost_Contract_Capacity = result["年總基本電費"]
 
     if "簡易" in tou_program:
@@ -1556,7 +1866,7 @@ def calculator_annual_cost_ami_365(
     cost_Contract_Capacity = round(cost_Contract_Capacity * tariff_adjust_factor)
 
     annual_cost_summary = {
-        "資料天數": len(df_ami["datetime"].dt.date.unique()),
+        "資料天數": len(np.unique(day)),
         "起始日期": start_date,
         "結束日期": end_date,
         "年用電度數(度)": total_annual_kwh,
@@ -1576,142 +1886,64 @@ def calculator_annual_cost_ami_365(
         return annual_cost_summary
 
     # Step 4: 計算超約費用
-    df_ami2 = (
-        df_ami.groupby(["is_summer", df_ami["datetime"].dt.month, "tou_tag"])
-        .agg({"load_kw": "max"})
-        .reset_index()
+    # 各 (季節, 月份, 時段) 的最大負載，一次 reduction 得到 (2, 12, 4) 矩陣
+    valid = (season_code >= 0) & (tag_code >= 0) & (month_code >= 0)
+    flat = (season_code[valid] * 12 + month_code[valid]) * 4 + tag_code[valid]
+    present = np.bincount(flat, minlength=2 * 12 * 4).reshape(2, 12, 4) > 0
+    max_load_kw = np.full(2 * 12 * 4, -np.inf)
+    np.maximum.at(max_load_kw, flat, np.nan_to_num(load_kw[valid], nan=-np.inf))
+    max_load_kw = max_load_kw.reshape(2, 12, 4)
+
+    capacity_kw, unit_price = get_contract_capacity_matrix(
+        tou_program, price_dict, contract_capacity_old
     )
-    df_ami2.columns = ["is_summer", "month", "tou_tag", "max_load_kw"]
-
-    df_contract = pd.concat(
-        [
-            get_contract_capacity_parameter(
-                tou_program, price_dict, contract_capacity_old, "summer"
-            ),
-            get_contract_capacity_parameter(
-                tou_program, price_dict, contract_capacity_old, "not_summer"
-            ),
-        ]
-    ).reset_index(drop=True)
-
-    # print(f"[debug] 契約容量參數：{df_contract}")
-
-    df_ami3 = df_ami2.merge(df_contract, how="left", on=["is_summer", "tou_tag"])
-    df_ami3["over_capacity_kw"] = df_ami3["max_load_kw"] - df_ami3["capacity_kw"]
-    df_ami3["over_capacity_kw"] = df_ami3["over_capacity_kw"].clip(lower=0)
-
-    df = df_ami3.copy()
-
-    # 定義優先順序
-    priority = {"尖峰": 1, "半尖峰": 2, "週六半尖峰": 3, "離峰": 4}
-
-    # 如果 tou_tag 在 priority 中，轉成排序值
-    df["priority"] = df["tou_tag"].map(priority)
-
-    # 處理每個月份 & is_summer 分開計算
-    def adjust_over_capacity(group):
-        used_capacity = 0
-        adjusted = []
-
-        # 按照優先順序排序
-        group = group.sort_values("priority")
-
-        for _, row in group.iterrows():
-            oc = max(row["over_capacity_kw"] - used_capacity, 0)
-            adjusted.append(oc)
-            # 更新已佔用的超約容量
-            used_capacity += oc
-
-        group["adj_over_capacity_kw"] = adjusted
-        return group
-
-    df = (
-        df.groupby(["is_summer", "month"], group_keys=True)
-        .apply(adjust_over_capacity, include_groups=False)
-        .reset_index(level=["is_summer", "month"])
+    max_over_kw = np.where(
+        present & np.isfinite(max_load_kw),
+        np.clip(max_load_kw - capacity_kw[:, None, :], 0, None),
+        0,
     )
-
-    over_col = "adj_over_capacity_kw"
-
-    # 10% 門檻 (每列以該列的契約容量為準)
-    threshold = 0.10 * df["capacity_kw"]
-
-    # 分攤超約量：10% 以內與超過 10% 的兩段
-    df["over_within_10pct_kw"] = np.minimum(df[over_col], threshold).clip(lower=0)
-    df["over_above_10pct_kw"] = (df[over_col] - threshold).clip(lower=0)
-
-    # 計算每列的超約費用
-    # 10%以內 → 2倍單價；超過10% → 3倍單價
-    df["overage_fee"] = (
-        2.0 * df["unit_price"] * df["over_within_10pct_kw"]
-        + 3.0 * df["unit_price"] * df["over_above_10pct_kw"]
+    adj_over_kw = cascade_over_capacity(max_over_kw)
+    monthly_fee = over_capacity_penalty_kernel(
+        max_over_kw, capacity_kw[:, None, :], unit_price[:, None, :]
     )
 
-    # 依 is_summer, month 匯總每月超約費用（你可依需求保留細項）
-    monthly_fee = df.groupby(["is_summer", "month"], as_index=False).agg(
-        total_overage_fee=("overage_fee", "sum")
+    # print(f"[debug] 每月超約費用明細：\n{adj_over_kw}")
+    annual_cost_summary["最高超約需量(kW)"] = (
+        adj_over_kw[present].max() if present.any() else np.nan
     )
 
-    # 如果也想看每月各時段明細，可額外輸出：
-    detail_fee = df[
-        [
-            "is_summer",
-            "month",
-            "tou_tag",
-            over_col,
-            "over_within_10pct_kw",
-            "over_above_10pct_kw",
-            "overage_fee",
-        ]
-    ]
-    # print(f"[debug] 每月超約費用明細：\n{detail_fee}")
-    annual_cost_summary["最高超約需量(kW)"] = detail_fee["adj_over_capacity_kw"].max()
-
     # 主結果：每月總超約費用
-    # 處理 5, 10月一半夏月，一半非夏月的問題
-    monthly_fee2 = (
-        monthly_fee.groupby("month")
-        .agg(total_overage_fee=("total_overage_fee", "mean"))
-        .reset_index()
-    )
+    # 處理 5, 10月一半夏月，一半非夏月的問題：同月份兩季取平均
+    month_present = present.any(axis=-1)
+    month_count = month_present.sum(axis=0)
+    month_fee_sum = np.where(month_present, monthly_fee, 0).sum(axis=0)
+    monthly_fee2 = month_fee_sum[month_count > 0] / month_count[month_count > 0]
 
     # 將每月超約費用加總到年費用中
     annual_cost_summary["年超約費用(元)"] = round(
-        monthly_fee2["total_overage_fee"].sum().round() * tariff_adjust_factor
+        np.round(monthly_fee2.sum()) * tariff_adjust_factor
     )
     annual_cost_summary["年總電費(元)"] += annual_cost_summary["年超約費用(元)"]
     annual_cost_summary["年平均電費(元/度)"] = round(
         annual_cost_summary["年總電費(元)"] / total_annual_kwh, 2
     )
 
-    # Step 5：計算超約天數跟度數
+    # Step 5：計算超約天數跟度數，沿用上面的編碼與契約容量矩陣
     if annual_cost_summary["年超約費用(元)"] > 0:
-        df_ami_contract = df_ami.merge(
-            df_contract, how="left", on=["is_summer", "tou_tag"]
-        )
-        df_ami_contract["over_contract_kw"] = (
-            df_ami_contract["load_kw"] - df_ami_contract["capacity_kw"]
+        row_capacity_kw = np.where(
+            (tag_code >= 0) & (season_code >= 0),
+            capacity_kw[np.clip(season_code, 0, 1), np.clip(tag_code, 0, 3)],
+            np.nan,
         )
-        df_ami_contract["over_contract_kw"] = df_ami_contract["over_contract_kw"].clip(
-            lower=0
-        )
-        df_ami_contract2 = df_ami_contract[df_ami_contract["over_contract_kw"] > 0]
+        over_contract_kw = np.clip(load_kw - row_capacity_kw, 0, None)
+        is_over = over_contract_kw > 0
 
-        df_ami_contract3 = (
-            df_ami_contract2.groupby(df_ami_contract2["datetime"].dt.date)
-            .agg({"over_contract_kw": "sum"})
-            .reset_index()
-        )
-        df_ami_contract3["over_contract_kwh"] = (
-            df_ami_contract3["over_contract_kw"] / 4
-        ).round()
-
-        annual_cost_summary["年超約天數(天)"] = df_ami_contract2[
-            "datetime"
-        ].dt.date.nunique()
-        annual_cost_summary["日平均超約度數(kWh)"] = (
-            df_ami_contract3["over_contract_kwh"].mean().round()
-        )
+        over_days, day_index = np.unique(day[is_over], return_inverse=True)
+        daily_over_kw = np.bincount(day_index, weights=over_contract_kw[is_over])
+        daily_over_kwh = np.round(daily_over_kw / 4)
+
+        annual_cost_summary["年超約天數(天)"] = len(over_days)
+        annual_cost_summary["日平均超約度數(kWh)"] = np.round(daily_over_kwh.mean())
 
     else:
         annual_cost_summary["年超約天數(天)"] = 0
@@ -1727,148 +1959,167 @@ def calculator_annual_cost_ami_365(
     return annual_cost_summary
 
 
-def convert_ami_to_json_15min(
-    df_ami, tou_program, df_tou_2025, contract_capacity_old, tariff_adjust_factor
-):
+# 國定假日清單，格式為 'YYYY-MM-DD'
+HOLIDAY_LST = [
+    "2022-01-01",
+    "2022-01-31",
+    "2022-02-01",
+    "2022-02-02",
+    "2022-02-03",
+    "2022-02-04",
+    "2022-02-05",
+    "2022-02-28",
+    "2022-04-04",
+    "2022-04-05",
+    "2022-06-03",
+    "2022-09-10",
+    "2022-10-10",
+    "2023-01-21",
+    "2023-01-23",
+    "2023-01-24",
+    "2023-01-25",
+    "2023-01-26",
+    "2023-02-28",
+    "2023-04-04",
+    "2023-04-05",
+    "2023-05-01",
+    "2023-06-22",
+    "2023-09-29",
+    "2023-10-10",
+    "2024-01-01",
+    "2024-02-09",
+    "2024-02-10",
+    "2024-02-12",
+    "2024-02-13",
+    "2024-02-14",
+    "2024-02-28",
+    "2024-04-04",
+    "2024-05-01",
+    "2024-06-10",
+    "2024-09-17",
+    "2024-10-10",
+    "2025-01-01",
+    "2025-01-28",
+    "2025-01-29",
+    "2025-01-30",
+    "2025-01-31",
+    "2025-02-01",
+    "2025-02-28",
+    "2025-04-04",
+    "2025-05-01",
+    "2025-05-31",
+    "2025-10-06",
+    "2025-10-10",
+]
+
+
+def day_ordinals(dates):
+    """日期（字串或 datetime）轉成 1970-01-01 起算的天數 (int64)"""
+    return (
+        pd.to_datetime(pd.Series(dates))
+        .to_numpy(dtype="datetime64[ns]")
+        .astype("datetime64[D]")
+        .astype(np.int64)
+    )
+
+
+# 假日的天數序號，已排序，以 searchsorted 判斷是否為假日
+HOLIDAY_DAY_INDEX = np.unique(day_ordinals(HOLIDAY_LST))
+
+
+def is_holiday(datetimes, holiday_day_index=HOLIDAY_DAY_INDEX):
+    """判斷每個時間點是否落在假日（holiday_day_index 需已排序）"""
+    days = day_ordinals(datetimes)
+    if len(holiday_day_index) == 0:
+        return np.zeros(len(days), dtype=bool)
+    pos = np.searchsorted(holiday_day_index, days).clip(max=len(holiday_day_index) - 1)
+    return holiday_day_index[pos] == days
+
+
+def is_summer_month_day(datetimes, tou_program):
     """
-    將 AMI 原始資料轉換成 JSON 15分鐘格式
-    支援自動檢測寬格式和長格式資料，不依賴固定欄位名稱
+    依計費類別判斷夏月 (1) / 非夏月 (0)，以月*100+日的整數比較：
+    高壓 05-16 ~ 10-15，其餘 06-01 ~ 09-30
+    """
+    datetimes = pd.Series(datetimes)
+    month_day = datetimes.dt.month.to_numpy() * 100 + datetimes.dt.day.to_numpy()
+    if "高壓" in tou_program:
+        summer_start, summer_end = 516, 1015
+    else:
+        summer_start, summer_end = 601, 930
+    return ((month_day >= summer_start) & (month_day <= summer_end)).astype(np.int64)
 
-    Parameters:
-    -----------
-    df_ami : DataFrame
-        AMI 資料，支援兩種格式：
-        - 長格式：2欄 (第一欄是日期/時間，第二欄是數值)
-        - 寬格式：96-97欄 (第一欄是日期，後面96欄是15分鐘數值)
-    tou_program : str
-        電價方案名稱，用於判斷夏月期間
-    holiday_lst : list
-        假日清單，格式為 ['YYYY-MM-DD', ...]
 
-    Returns:
-    --------
-    list : JSON 格式的 15分鐘資料
-    """
-
-    holiday_lst = [
-        "2022-01-01",
-        "2022-01-31",
-        "2022-02-01",
-        "2022-02-02",
-        "2022-02-03",
-        "2022-02-04",
-        "2022-02-05",
-        "2022-02-28",
-        "2022-04-04",
-        "2022-04-05",
-        "2022-06-03",
-        "2022-09-10",
-        "2022-10-10",
-        "2023-01-21",
-        "2023-01-23",
-        "2023-01-24",
-        "2023-01-25",
-        "2023-01-26",
-        "2023-02-28",
-        "2023-04-04",
-        "2023-04-05",
-        "2023-05-01",
-        "2023-06-22",
-        "2023-09-29",
-        "2023-10-10",
-        "2024-01-01",
-        "2024-02-09",
-        "2024-02-10",
-        "2024-02-12",
-        "2024-02-13",
-        "2024-02-14",
-        "2024-02-28",
-        "2024-04-04",
-        "2024-05-01",
-        "2024-06-10",
-        "2024-09-17",
-        "2024-10-10",
-        "2025-01-01",
-        "2025-01-28",
-        "2025-01-29",
-        "2025-01-30",
-        "2025-01-31",
-        "2025-02-01",
-        "2025-02-28",
-        "2025-04-04",
-        "2025-05-01",
-        "2025-05-31",
-        "2025-10-06",
-        "2025-10-10",
-    ]
+def format_hhmm(datetimes):
+    """時間點轉成 'HH:MM' 字串，只格式化不重複的時刻"""
+    datetimes = pd.Series(datetimes)
+    minutes = datetimes.dt.hour.to_numpy() * 60 + datetimes.dt.minute.to_numpy()
+    codes, uniques = pd.factorize(minutes)
+    labels = np.array([f"{m // 60:02d}:{m % 60:02d}" for m in uniques], dtype=object)
+    return labels[codes]
 
-    # 1. 自動檢測資料格式
-    def detect_ami_format(df):
-        """
-        檢測 AMI 資料格式，基於欄位數量和結構而非固定欄位名稱
-        - 長格式：2欄 (第一欄是日期/時間，第二欄是數值)
-        - 寬格式：96-97欄 (第一欄是日期，後面96欄是15分鐘數值)
-        """
-        num_cols = len(df.columns)
-
-        # 檢查是否為長格式 (2欄)
-        if num_cols == 2:
-            # 檢查第一欄是否為日期時間格式
-            first_col_sample = str(df.iloc[0, 0])
-            # 嘗試解析第一欄為日期時間
-            try:
-                pd.to_datetime(first_col_sample)
-                return "long_format"
-            except:
-                return "unknown"
-
-        # 檢查是否為寬格式 (96-97欄)
-        elif num_cols == 97:
-            # 檢查第一欄是否為日期格式
-            first_col_sample = str(df.iloc[0, 0])
-            try:
-                pd.to_datetime(first_col_sample)
-
-                # 進一步檢查後續欄位的特徵
-                columns = df.columns.tolist()
-
-                # 檢查是否有時間格式的欄位 (如 00:00, 00:15 等)
-                time_pattern = any(":" in str(col) for col in columns[1:10])
-                if time_pattern:
-                    return "wide_time_format"
+
+# 15 分鐘時段的時間標籤 00:00 ~ 23:45
+AMI_TIME_LABELS = [f"{i:02d}:{j * 15:02d}" for i in range(24) for j in range(4)]
+
+
+def detect_ami_format(df):
+    """
+    檢測 AMI 資料格式，基於欄位數量和結構而非固定欄位名稱
+    - 長格式：2欄 (第一欄是日期/時間，第二欄是數值)
+    - 寬格式：96-97欄 (第一欄是日期，後面96欄是15分鐘數值)
+    """
+    num_cols = len(df.columns)
+
+    # 檢查是否為長格式 (2欄)
+    if num_cols == 2:
+        # 檢查第一欄是否為日期時間格式
+        first_col_sample = str(df.iloc[0, 0])
+        # 嘗試解析第一欄為日期時間
+        try:
+            pd.to_datetime(first_col_sample)
+            return "long_format"
+        except:
+            return "unknown"
+
+    # 檢查是否為寬格式 (96-97欄)
+    elif num_cols == 97:
+        # 檢查第一欄是否為日期格式
+        first_col_sample = str(df.iloc[0, 0])
+        try:
+            pd.to_datetime(first_col_sample)
+
+            # 進一步檢查後續欄位的特徵
+            columns = df.columns.tolist()
+
+            # 檢查是否有時間格式的欄位 (如 00:00, 00:15 等)
+            time_pattern = any(":" in str(col) for col in columns[1:10])
+            if time_pattern:
+                return "wide_time_format"
+            else:
+                # 檢查是否為數字欄位 (0, 1, 2, ... 95)
+                numeric_pattern = all(str(col).isdigit() for col in columns[1:10])
+                if numeric_pattern:
+                    return "wide_numeric_format"
                 else:
-                    # 檢查是否為數字欄位 (0, 1, 2, ... 95)
-                    numeric_pattern = all(str(col).isdigit() for col in columns[1:10])
-                    if numeric_pattern:
-                        return "wide_numeric_format"
-                    else:
-                        return "wide_mixed_format"
-            except:
-                return "unknown"
-
-        return "unknown"
-
-    # 2. 設定時間欄位名稱
-    time = []
-    for i in range(24):
-        for j in range(4):
-            time.append(str(i).zfill(2) + ":" + str(j * 15).zfill(2))
+                    return "wide_mixed_format"
+        except:
+            return "unknown"
 
-    # 先去掉na的row，避免錯誤，有空值就去掉
-    df_ami = df_ami.dropna(how="any").reset_index(drop=True)
+    return "unknown"
 
-    # 3. 根據格式進行相應處理
-    format_type = detect_ami_format(df_ami)
-    print(f"[debug] 檢測到的資料格式: {format_type}")
 
+def ami_to_long(df_ami, format_type):
+    """
+    依 detect_ami_format 的結果將 AMI 資料轉成長格式。
+    長格式只有 datetime, value 兩欄；寬格式另有 date, time 欄位（時間標籤沿用欄位名稱）。
+    """
     if format_type == "long_format":
         # 長格式 - 2欄 (日期時間, 數值)
         df_ami_long = df_ami.copy()
         # 統一欄位名稱，不管原來叫什麼
         df_ami_long.columns = ["datetime", "value"]
         df_ami_long["datetime"] = pd.to_datetime(df_ami_long["datetime"])
-        # 提取時間部分用於後續處理
-        df_ami_long["time"] = df_ami_long["datetime"].dt.strftime("%H:%M")
 
     elif format_type == "wide_time_format":
         # 寬格式 - 已有時間欄位名稱
@@ -1886,9 +2137,9 @@ def convert_ami_to_json_15min(
         # 寬格式 - 數字或混合欄位名稱
         df_ami_copy = df_ami.copy()
         # 重新命名欄位：第一欄為date，後續96欄為時間
-        df_ami_copy.columns = ["date"] + time
+        df_ami_copy.columns = ["date"] + AMI_TIME_LABELS
         # 轉換成 long format
-        df_ami_long = pd.melt(df_ami_copy, id_vars=["date"], value_vars=time)
+        df_ami_long = pd.melt(df_ami_copy, id_vars=["date"], value_vars=AMI_TIME_LABELS)
         df_ami_long.columns = ["date", "time", "value"]
         df_ami_long["datetime"] = df_ami_long["date"] + " " + df_ami_long["time"]
         df_ami_long["datetime"] = pd.to_datetime(df_ami_long["datetime"])
@@ -1898,36 +2149,35 @@ def convert_ami_to_json_15min(
             f"無法識別的資料格式: {format_type}，欄位: {df_ami.columns.tolist()[:10]}"
         )
 
-    # 4. 統一後續處理
-    df_ami_long.sort_values(by="datetime", inplace=True)
-    df_ami_long = df_ami_long.tail(96 * 365)
-    df_ami_long.reset_index(drop=True, inplace=True)
+    return df_ami_long
 
-    # 5. 添加 is_summer 欄位
-    if "高壓" in tou_program:
-        summer_start = "05-16"
-        summer_end = "10-15"
-    else:
-        summer_start = "06-01"
-        summer_end = "09-30"
 
-    def is_summer_period(date):
-        month_day = date.strftime("%m-%d")
-        return 1 if summer_start <= month_day <= summer_end else 0
+def summarize_ami_long(
+    df_ami_long, tou_program, df_tou_2025, contract_capacity_old, tariff_adjust_factor
+):
+    """
+    由最後一年的長格式 AMI 資料 (已依 datetime 排序) 產生 14 天代表日 JSON 與年電費摘要。
 
-    df_ami_long["is_summer"] = df_ami_long["datetime"].apply(is_summer_period)
+    Returns:
+    --------
+    tuple : (JSON 格式的 15分鐘資料, 年電費摘要)
+    """
+    if "time" not in df_ami_long.columns:
+        # 長格式在取最後一年後才提取時間部分
+        df_ami_long["time"] = format_hhmm(df_ami_long["datetime"])
+
+    # 5. 添加 is_summer 欄位
+    df_ami_long["is_summer"] = is_summer_month_day(df_ami_long["datetime"], tou_program)
 
     # 6. 添加星期幾標註
     df_ami_long["weekday"] = df_ami_long["datetime"].dt.day_name()
 
     # 7. 標記假日資料
-    if holiday_lst:
-        # df_ami_long = df_ami_long[~df_ami_long['datetime'].dt.date.astype(str).isin(holiday_lst)].copy()
-        df_ami_long["weekday"] = np.where(
-            df_ami_long["datetime"].dt.date.astype(str).isin(holiday_lst),
-            "Holiday",
-            df_ami_long["weekday"],
-        )
+    df_ami_long["weekday"] = np.where(
+        is_holiday(df_ami_long["datetime"]),
+        "Holiday",
+        df_ami_long["weekday"],
+    )
 
     # 8. 計算 14 天代表日的平均值
     df_ami_long_14 = (
@@ -1950,31 +2200,77 @@ def convert_ami_to_json_15min(
 
     # 9. 轉換成 JSON 格式
     # 創建季節+星期的組合欄位
-    df_ami_long_14["season_weekday"] = df_ami_long_14.apply(
-        lambda row: ("summer" if row["is_summer"] else "nonSummer") + row["weekday"],
-        axis=1,
+    df_ami_long_14["season_weekday"] = (
+        np.where(df_ami_long_14["is_summer"] != 0, "summer", "nonSummer")
+        + df_ami_long_14["weekday"]
     )
 
-    # 建立樞紐表
-    pivot_df = df_ami_long_14.pivot(
-        index="time", columns="season_weekday", values="value"
-    ).reset_index()
+    # 建立樞紐表，缺值補 0
+    pivot_df = (
+        df_ami_long_14.pivot(index="time", columns="season_weekday", values="value")
+        .sort_index()
+        .round(2)
+        .fillna(0.0)
+        .reset_index()
+    )
 
-    # 轉換成目標格式
-    json_ami_15min_update = []
-    pivot_df = pivot_df.sort_values("time").reset_index(drop=True)
+    # 轉換成目標格式：每個時間一筆 {"time": ..., 各季節+星期: 數值}
+    json_ami_15min_update = pivot_df.to_dict("records")
 
-    for idx, row in pivot_df.iterrows():
-        time_dict = {"time": row["time"]}
+    return json_ami_15min_update, annual_cost_summary
 
-        # 添加各個季節+星期的數值
-        for col in pivot_df.columns:
-            if col != "time":
-                time_dict[col] = round(row[col], 2) if pd.notna(row[col]) else 0.0
 
-        json_ami_15min_update.append(time_dict)
+def convert_ami_to_json_15min(
+    df_ami, tou_program, df_tou_2025, contract_capacity_old, tariff_adjust_factor
+):
+    """
+    將 AMI 原始資料轉換成 JSON 15分鐘格式
+    支援自動檢測寬格式和長格式資料，不依賴固定欄位名稱
 
-    return json_ami_15min_update, annual_cost_summary
+    Parameters:
+    -----------
+    df_ami : DataFrame
+        AMI 資料，支援兩種格式：
+        - 長格式：2欄 (第一欄是日期/時間，第二欄是數值)
+        - 寬格式：96-97欄 (第一欄是日期，後面96欄是15分鐘數值)
+    tou_program : str
+        電價方案名稱，用於判斷夏月期間
+    df_tou_2025 : DataFrame
+        時間電價資料
+    contract_capacity_old : dict
+        舊契約容量，用於年電費試算
+    tariff_adjust_factor : float
+        電價調整係數
+
+    Returns:
+    --------
+    tuple : (JSON 格式的 15分鐘資料, 年電費摘要)
+
+    假日依模組層級的 HOLIDAY_LST 判斷。
+    """
+
+    # 先去掉na的row，避免錯誤，有空值就去掉
+    df_ami = df_ami.dropna(how="any").reset_index(drop=True)
+
+    # 1. 自動檢測資料格式
+    format_type = detect_ami_format(df_ami)
+    print(f"[debug] 檢測到的資料格式: {format_type}")
+
+    # 2~3. 根據格式轉成長格式
+    df_ami_long = ami_to_long(df_ami, format_type)
+
+    # 4. 統一後續處理：只保留最後一年
+    df_ami_long.sort_values(by="datetime", inplace=True)
+    df_ami_long = df_ami_long.tail(96 * 365)
+    df_ami_long.reset_index(drop=True, inplace=True)
+
+    return summarize_ami_long(
+        df_ami_long,
+        tou_program,
+        df_tou_2025,
+        contract_capacity_old,
+        tariff_adjust_factor,
+    )
 
 
 # ID: 透過 ID 來找出契約容量，歷史資料庫AMI的ID
@@ -0,0 +1,200 @@
+"""
+多情境的財務指標 (IRR / NPV / ROI / 年化 ROI / 平均 ROI / 回收年)
+
+輸入為 (情境數, 年數 + 1) 的 Net Cash 矩陣，第 0 欄為 Year 0（-自備資金），
+所有情境一次計算，不再逐一呼叫 npf.irr。
+
+IRR 為 NPV(r) = Σ v_t / (1 + r)^t = 0 的解，令 x = 1 / (1 + r) 後即
+f(x) = Σ v_t x^t 的正實根（與 npf.irr 相同）：
+- 現金流只變號一次（一般的投資案：先投入、後回收）時，正實根唯一，
+  以夾擠 (bracket) 的 Newton 法搭配二分法對所有情境同時求解
+- 完全不變號時無解，回傳 NaN
+- 變號兩次以上可能有多個解，與 npf.irr 相同以伴隨矩陣的特徵值求出所有根，
+  取最接近 0 的解（相同次數的情境一次計算）
+"""
+
+import numpy as np
+
+# Newton 法的收斂條件：x 的相對變化量
+IRR_TOL = 1e-14
+IRR_MAXITER = 200
+
+
+def _sign_changes(net_cash):
+    """每列略過 0 之後的變號次數，以及第一個非 0 值的正負號"""
+    signs = np.sign(net_cash)
+    nonzero = signs != 0
+    rows = np.arange(len(signs))[:, None]
+    # 0 沿用前一個非 0 值的正負號（開頭的 0 維持 0）
+    last_nonzero = np.maximum.accumulate(
+        np.where(nonzero, np.arange(signs.shape[1]), 0), axis=1
+    )
+    filled = signs[rows, last_nonzero]
+    changes = ((filled[:, 1:] != filled[:, :-1]) & (filled[:, :-1] != 0)).sum(axis=1)
+    first_sign = signs[rows[:, 0], nonzero.argmax(axis=1)]
+    return changes, first_sign
+
+
+def _polyval(net_cash, x):
+    """f(x) = Σ v_t x^t 與 f'(x)，逐列對應各自的 x"""
+    periods = np.arange(net_cash.shape[1])
+    powers = x[:, None] ** periods
+    value = (net_cash * powers).sum(axis=1)
+    derivative = (net_cash[:, 1:] * periods[1:] * powers[:, :-1]).sum(axis=1)
+    return value, derivative
+
+
+@np.errstate(divide="ignore", invalid="ignore")
+def _irr_single_sign_change(net_cash, first_sign, tol=IRR_TOL, maxiter=IRR_MAXITER):
+    """
+    只變號一次的現金流：f(x) 在 (0, ∞) 恰有一個根。
+    f 在 0 附近與 first_sign 同號，先找出異號的上界，再以 Newton 法求解，
+    跳出夾擠區間時改用二分法。
+    """
+    n_rows = len(net_cash)
+    lo = np.zeros(n_rows)
+    hi = np.ones(n_rows)
+
+    # 上界：x = 1 (r = 0) 起倍增，直到 f(hi) 與 first_sign 異號
+    f_hi, df_one = _polyval(net_cash, hi)
+    guess = 1 - f_hi / df_one
+    pending = np.flatnonzero(np.sign(f_hi) == first_sign)
+    while pending.size:
+        lo[pending] = hi[pending]
+        hi[pending] *= 2
+        f_hi[pending], _ = _polyval(net_cash[pending], hi[pending])
+        pending = pending[
+            (np.sign(f_hi[pending]) == first_sign[pending]) & np.isfinite(hi[pending])
+        ]
+
+    # 起始值：由 x = 1 (r = 0) 走一步 Newton 法，不在夾擠區間內時取上界
+    x = np.where((lo < guess) & (guess < hi), guess, hi)
+    x[f_hi == 0] = hi[f_hi == 0]
+
+    # 只對尚未收斂的列繼續計算
+    active = np.flatnonzero(f_hi != 0)
+    for _ in range(maxiter):
+        if not active.size:
+            break
+        x_active = x[active]
+        f, df = _polyval(net_cash[active], x_active)
+
+        # 更新夾擠區間：與 first_sign 同號的一側為下界
+        same = np.sign(f) == first_sign[active]
+        lo_active = np.where(same, x_active, lo[active])
+        hi_active = np.where(same, hi[active], x_active)
+        lo[active] = lo_active
+        hi[active] = hi_active
+
+        step = f / df
+        x_newton = x_active - step
+        converged = (f == 0) | (np.abs(step) <= tol * x_active)
+        # Newton 法跳出夾擠區間（或導數為 0）時改用二分法
+        outside = ~((x_newton > lo_active) & (x_newton < hi_active))
+        x_newton = np.where(outside & ~converged, (lo_active + hi_active) / 2, x_newton)
+
+        x[active] = np.where(f == 0, x_active, x_newton)
+        active = active[~converged]
+
+    return 1 / x - 1
+
+
+def _irr_polynomial_roots(net_cash):
+    """
+    以伴隨矩陣 (companion matrix) 的特徵值求 f(x) 的所有根，做法與 np.roots 相同，
+    相同次數的列一次計算；取正實根中換算後最接近 0 的 IRR（同 npf.irr）。
+    """
+    result = np.full(len(net_cash), np.nan)
+    nonzero = net_cash != 0
+    first = nonzero.argmax(axis=1)
+    last = net_cash.shape[1] - 1 - nonzero[:, ::-1].argmax(axis=1)
+
+    # 開頭的 0 只會產生 x = 0 的根（不是正根），結尾的 0 不影響次數
+    for degree in np.unique(last - first):
+        rows = np.flatnonzero(last - first == degree)
+        if degree == 0:
+            continue
+        # 係數由高次到低次：v_last, ..., v_first
+        index = last[rows, None] - np.arange(degree + 1)
+        coefficients = net_cash[rows[:, None], index]
+        companion = np.zeros((len(rows), degree, degree))
+        companion[:, 0, :] = -coefficients[:, 1:] / coefficients[:, :1]
+        companion[:, np.arange(1, degree), np.arange(degree - 1)] = 1
+        roots = np.linalg.eigvals(companion)
+
+        positive = (roots.imag == 0) & (roots.real > 0)
+        with np.errstate(divide="ignore"):
+            rates = np.where(positive, 1 / roots.real - 1, np.nan)
+        found = positive.any(axis=1)
+        closest = np.argmin(np.where(positive, np.abs(rates), np.inf), axis=1)
+        result[rows[found]] = rates[found, closest[found]]
+    return result
+
+
+def irr(net_cash):
+    """
+    各情境的 IRR，與 npf.irr 逐列計算的結果相同（誤差在 1e-9 以內）。
+
+    Parameters:
+        net_cash: (情境數, 期數) 的現金流，單一情境可傳入一維序列
+
+    Returns:
+        np.ndarray: (情境數,) 的 IRR，無解時為 NaN
+    """
+    net_cash = np.atleast_2d(np.asarray(net_cash, dtype=float))
+    result = np.full(len(net_cash), np.nan)
+
+    finite = np.isfinite(net_cash).all(axis=1)
+    changes, first_sign = _sign_changes(np.where(finite[:, None], net_cash, 0))
+
+    single = finite & (changes == 1)
+    if single.any():
+        result[single] = _irr_single_sign_change(net_cash[single], first_sign[single])
+
+    # 變號兩次以上可能有多個解，求出所有根後沿用 npf.irr 的選擇（最接近 0 的解）
+    multiple = finite & (changes > 1)
+    if multiple.any():
+        result[multiple] = _irr_polynomial_roots(net_cash[multiple])
+    return result
+
+
+def npv(net_cash, rate):
+    """各情境以折現率 rate 計算的淨現值，Year 0 不折現（同 npf.npv）"""
+    net_cash = np.atleast_2d(np.asarray(net_cash, dtype=float))
+    return net_cash @ (1 + rate) ** -np.arange(net_cash.shape[1], dtype=float)
+
+
+def payback_year(net_cash):
+    """累積淨現金流（含 Year 0）首次不小於 0 的年度，始終未回收時為 NaN"""
+    net_cash = np.atleast_2d(np.asarray(net_cash, dtype=float))
+    recovered = np.cumsum(net_cash, axis=1) >= 0
+    return np.where(recovered.any(axis=1), recovered.argmax(axis=1), np.nan)
+
+
+def compute_financial_metrics(net_cash):
+    """
+    由 Net Cash 矩陣一次算出所有情境的財務指標。
+
+    Parameters:
+        net_cash: (情境數, 年數 + 1)，第 0 欄為 Year 0（-自備資金），其餘為各年淨現金流
+
+    Returns:
+        dict: {'IRR', 'ROI', 'Annual_ROI', 'Average_ROI', 'payback_year'}，各為 (情境數,) 陣列
+    """
+    net_cash = np.atleast_2d(np.asarray(net_cash, dtype=float))
+    years = net_cash.shape[1] - 1
+    自備資金 = -net_cash[:, 0]
+    淨現金總和 = net_cash[:, 1:].sum(axis=1)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ROI = (淨現金總和 - 自備資金) / 自備資金
+        # 出現-1時，其實表示全部賠光，計算可能就沒意義
+        Annual_ROI = np.where(ROI > -1, np.power(1 + ROI, 1 / years) - 1, np.nan)
+
+    return {
+        "IRR": irr(net_cash),
+        "ROI": ROI,
+        "Annual_ROI": Annual_ROI,
+        "Average_ROI": ROI / years,
+        "payback_year": payback_year(net_cash),
+    }
@@ -0,0 +1,172 @@
+"""
+generate_summary 的逐年財務帳 (ledger)
+
+原本 df_summary 先建成空字串的 DataFrame（object dtype），再逐行 .loc 指定，
+加總時每一步都經過 Python 物件運算。這裡改用：
+
+- values：float64 的 (行數, 年數 + 1) 陣列，第 0 欄為 Year 0
+- layout：由 SCENARIO_ROWS 的行名編譯成的行序號與收入 / 支出的索引陣列
+
+總收入、總支出與 Net Cash 都是對索引陣列的一次加總；
+只在回傳給呼叫端時才以 to_frame 轉成 DataFrame。
+
+new_ledger 指定 batch 時，values 為 (batch, 行數, 年數 + 1)，
+多組情境（如蒙地卡羅的抽樣）共用同一個行配置，一次填值與加總。
+
+用法：
+    layout = ledger.compile_layout(tuple(SCENARIO_ROWS[mode]))
+    book = ledger.new_ledger(layout, years)
+    ledger.set_row(book, "建置容量(kWh)", 建置容量)
+    ledger.set_totals(book)
+    df_summary = ledger.to_frame(book)
+"""
+
+from functools import cache
+
+import numpy as np
+import pandas as pd
+
+# 計入總收入的行
+INCOME_ROWS = (
+    "降契約容量收益",
+    "電價差收益",
+    "日選時段型",
+    "輔助服務價金",
+    "用電大戶收益",
+    "自定義收益",
+)
+
+# 計入總支出的行
+EXPENSE_ROWS = (
+    "超約費用",
+    "土地租金",
+    "保險費用",
+    "維運+監控EMS費用",
+    "聚合分潤比例",
+    "利息費用",
+)
+
+# 總支出(不含利息) 不計入的行
+INTEREST_ROWS = ("利息費用",)
+
+# Year 0 與 Year 1 相同的行
+YEAR0_COPY_ROWS = ("建置容量(kWh)", "實際可用容量(kWh)", "投標容量", "保留容量")
+
+
+def _positions(row_index, labels):
+    """labels 中存在於 row_index 的行序號（依 labels 的順序）"""
+    return np.array(
+        [row_index[label] for label in labels if label in row_index], dtype=np.intp
+    )
+
+
+@cache
+def compile_layout(row_labels):
+    """
+    將一個模式的行名 (tuple) 編譯成 ledger 的行配置。
+
+    Returns:
+        dict: {
+            'labels': 行名,
+            'row_index': {行名: 行序號},
+            'income' / 'expense' / 'expense_ex_interest' / 'year0_copy': 行序號陣列
+        }
+    """
+    row_index = {label: i for i, label in enumerate(row_labels)}
+    return {
+        "labels": row_labels,
+        "row_index": row_index,
+        "income": _positions(row_index, INCOME_ROWS),
+        "expense": _positions(row_index, EXPENSE_ROWS),
+        "expense_ex_interest": _positions(
+            row_index,
+            [label for label in EXPENSE_ROWS if label not in INTEREST_ROWS],
+        ),
+        "year0_copy": _positions(row_index, YEAR0_COPY_ROWS),
+    }
+
+
+def new_ledger(layout, years, batch=None):
+    """
+    建立 years 年（另加 Year 0）的空帳，尚未填入的值為 NaN。
+    batch 不為 None 時建立 batch 組情境的帳，values 多一個最前面的維度。
+    """
+    shape = (len(layout["labels"]), years + 1)
+    if batch is not None:
+        shape = (batch, *shape)
+    return {
+        "layout": layout,
+        "years": years,
+        "values": np.full(shape, np.nan),
+    }
+
+
+def has_row(ledger, label):
+    return label in ledger["layout"]["row_index"]
+
+
+def set_row(ledger, label, values):
+    """
+    填入 Year 1 ~ Year N；values 可為單一數值或長度為年數的序列，
+    批次帳另可為 (batch, 年數) 或 (batch, 1) 的陣列
+    """
+    row = ledger["layout"]["row_index"][label]
+    ledger["values"][..., row, 1:] = np.asarray(values, dtype=float)
+
+
+def get_row(ledger, label, include_year0=False):
+    """Year 1 ~ Year N（include_year0=True 時含 Year 0）的值，為 ledger 的 view，呼叫端不可修改"""
+    row = ledger["layout"]["row_index"][label]
+    return ledger["values"][..., row, 0 if include_year0 else 1 :]
+
+
+def _row_sum(values, rows):
+    if len(rows) == 0:
+        return np.zeros(values.shape[:-2] + values.shape[-1:])
+    return values[..., rows, :].sum(axis=-2)
+
+
+def set_totals(ledger):
+    """
+    依行配置一次算出總收入、總支出、總支出(不含利息) 與 Net Cash（Year 1 ~ Year N）。
+    """
+    layout = ledger["layout"]
+    values = ledger["values"][..., 1:]
+    total_income = _row_sum(values, layout["income"])
+    total_expense = _row_sum(values, layout["expense"])
+
+    for label, total in (
+        ("總收入", total_income),
+        ("總支出", total_expense),
+        ("總支出(不含利息)", _row_sum(values, layout["expense_ex_interest"])),
+        ("Net Cash", total_income - total_expense),
+    ):
+        if has_row(ledger, label):
+            set_row(ledger, label, total)
+
+
+def set_year0(ledger, equity):
+    """
+    Year 0：容量相關的行沿用 Year 1，自備資金列為支出與負的淨現金流
+    （批次帳的 equity 可為長度 batch 的陣列）
+    """
+    values = ledger["values"]
+    rows = ledger["layout"]["year0_copy"]
+    values[..., rows, 0] = values[..., rows, 1]
+
+    row_index = ledger["layout"]["row_index"]
+    equity = np.asarray(equity, dtype=float)
+    values[..., row_index["總支出"], 0] = equity
+    values[..., row_index["總支出(不含利息)"], 0] = equity
+    values[..., row_index["Net Cash"], 0] = -equity
+
+
+def to_frame(ledger):
+    """轉成與原本 df_summary 相同行列的 DataFrame（Year 0 ~ Year N），只適用於單一情境的帳"""
+    if ledger["values"].ndim != 2:
+        raise ValueError("批次帳無法轉成單一的 DataFrame")
+    return pd.DataFrame(
+        ledger["values"].copy(),
+        index=list(ledger["layout"]["labels"]),
+        columns=[f"Year {i}" for i in range(ledger["years"] + 1)],
+    )
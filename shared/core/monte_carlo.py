@@ -0,0 +1,438 @@
+"""
+蒙地卡羅的不確定性分析 (P10 / P50 / P90 IRR)
+
+run_simulation 只算出一組確定的 IRR；這裡對下列參數抽樣，估計 IRR / ROI 的分布：
+
+- 電費調整係數：電價差收益（調整後電價）與降契約容量收益
+- 負載縮放比例：AMI 負載等比例縮放，影響所有與負載相關的收益與超約費用
+- 儲能健康度年衰減率 (%)：逐年的實際可用容量
+- 得標容量比例 (%)：輔助服務價金與聚合分潤
+
+不逐一呼叫 run_simulation，而是：
+
+- 先以 generate_summary 算一次基準情境，與抽樣無關的行（建置、租金、保險、利息等）直接沿用
+- 負載縮放比例依 load_scale_step 取整分組，同一組共用一個 ami_context
+  （可轉移電量、DR、即時備轉的容量反應曲線只算一次）
+- 同一組的抽樣每 batch_size 筆一批：各年可用容量攤平成一維，
+  透過 summary_generator 的收益函式一次查表，填入批次 ledger 後一次算出 Net Cash 與 IRR
+
+降契約容量收益依抽樣的電費調整係數，以 calculator_annual_cost 的算法（新、舊契約的
+年基本電費各自乘上係數後四捨五入再相減）重算。每筆抽樣的結果與下列設定的 run_simulation
+相同：電費調整係數、儲能健康度年衰減率、得標容量比例為抽樣值，AMI 負載乘上負載縮放比例，
+年節省基本電費為 run_all_simulations 以該電費調整係數算出的值（run_simulation 本身不會
+依電費調整係數重算年節省基本電費）。
+
+用法：
+    result = monte_carlo.run_monte_carlo(
+        config, df_ami, unit=8, mode="energy_dr", dr_program="2h", n_draws=10000, seed=0
+    )
+    result["quantiles"].loc["P50", "IRR"]
+"""
+
+import copy
+
+import numpy as np
+import pandas as pd
+
+from shared.core import (
+    ami_analysis,
+    config_loader,
+    financial_metrics,
+    ledger,
+    summary_generator,
+)
+
+# 抽樣的參數
+TARIFF_FACTOR = "電費調整係數"
+LOAD_SCALE = "負載縮放比例"
+DEGRADATION = "儲能健康度年衰減率"
+AWARD_RATIO = "得標容量比例"
+PARAMETERS = (TARIFF_FACTOR, LOAD_SCALE, DEGRADATION, AWARD_RATIO)
+
+# 輸出的分位數與指標
+QUANTILES = {"P10": 0.1, "P50": 0.5, "P90": 0.9}
+METRICS = ("IRR", "ROI", "Annual_ROI", "Average_ROI")
+
+# 分布需要的參數
+DISTRIBUTION_ARGS = {
+    "constant": ("value",),
+    "normal": ("mean", "std"),
+    "uniform": ("low", "high"),
+    "triangular": ("left", "mode", "right"),
+}
+
+
+def default_distributions(config):
+    """
+    以 config（update_config 之後）的設定為中心的預設分布：
+
+    - 電費調整係數：常態分布，標準差 0.05，限制在 ±0.15
+    - 負載縮放比例：常態分布，平均 1、標準差 0.05，限制在 0.8 ~ 1.2
+    - 儲能健康度年衰減率：三角分布，0.5 倍 ~ 1.5 倍，最可能值為設定值
+    - 得標容量比例：三角分布，設定值的一半 ~ 設定值，最可能值為設定值
+    """
+    tariff = config["電價方案"]["電費調整係數"]
+    degradation = config["儲能系統"]["儲能健康度年衰減率"]
+    award = config["即時備轉"]["得標容量比例"]
+    return {
+        TARIFF_FACTOR: {
+            "dist": "normal",
+            "mean": tariff,
+            "std": 0.05,
+            "clip": (tariff - 0.15, tariff + 0.15),
+        },
+        LOAD_SCALE: {"dist": "normal", "mean": 1.0, "std": 0.05, "clip": (0.8, 1.2)},
+        DEGRADATION: {
+            "dist": "triangular",
+            "left": degradation * 0.5,
+            "mode": degradation,
+            "right": degradation * 1.5,
+        },
+        AWARD_RATIO: {
+            "dist": "triangular",
+            "left": award * 0.5,
+            "mode": award,
+            "right": award,
+            "clip": (0, 100),
+        },
+    }
+
+
+def _sample(spec, n_draws, rng):
+    """依分布設定抽出 n_draws 筆，有 clip 時限制在 (下限, 上限) 之間"""
+    dist = spec.get("dist")
+    if dist not in DISTRIBUTION_ARGS:
+        raise ValueError(
+            f"不支援的分布: {dist}，需為 {', '.join(DISTRIBUTION_ARGS)} 其中之一"
+        )
+    missing = [arg for arg in DISTRIBUTION_ARGS[dist] if arg not in spec]
+    if missing:
+        raise ValueError(f"{dist} 分布缺少參數: {', '.join(missing)}")
+
+    if dist == "constant":
+        values = np.full(n_draws, float(spec["value"]))
+    elif dist == "normal":
+        values = rng.normal(spec["mean"], spec["std"], n_draws)
+    elif dist == "uniform":
+        values = rng.uniform(spec["low"], spec["high"], n_draws)
+    elif spec["left"] == spec["right"]:
+        # numpy 的三角分布不接受上下限相同
+        values = np.full(n_draws, float(spec["mode"]))
+    else:
+        values = rng.triangular(spec["left"], spec["mode"], spec["right"], n_draws)
+
+    if "clip" in spec:
+        values = np.clip(values, *spec["clip"])
+    return values
+
+
+def sample_draws(distributions, n_draws, seed=None):
+    """
+    依 PARAMETERS 的順序對每個參數抽樣。
+
+    Parameters:
+        distributions: {參數: 分布設定}，需包含 PARAMETERS 的所有參數
+        n_draws: 抽樣次數
+        seed: 亂數種子，相同的種子得到相同的抽樣
+
+    Returns:
+        pd.DataFrame: (n_draws, 參數數) 的抽樣結果
+    """
+    if n_draws < 1:
+        raise ValueError(f"抽樣次數必須大於 0: {n_draws}")
+    unknown = set(distributions) - set(PARAMETERS)
+    if unknown:
+        raise ValueError(f"不支援的抽樣參數: {', '.join(sorted(unknown))}")
+
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame(
+        {name: _sample(distributions[name], n_draws, rng) for name in PARAMETERS}
+    )
+
+
+def _contract_saving(config, tariff):
+    """
+    電費調整係數為 tariff 時的年節省基本電費，與 calculator_annual_cost 相同：
+    新、舊契約的年基本電費各自乘上電費調整係數後四捨五入，再相減
+    """
+    fees = [
+        config_loader.calculate_annual_basic_fee(
+            rate_table=config_loader.price_dict,
+            tou_program=config["電價方案"]["計費類別"],
+            contract_capacities=config["電價方案"]["契約容量"][name],
+        )["年總基本電費"]
+        for name in ("old", "new")
+    ]
+    return np.round(fees[0] * tariff) - np.round(fees[1] * tariff)
+
+
+def _evaluate_batch(
+    config, base_values, layout, ami_context, draws, years, flags, lc_mode
+):
+    """
+    一批抽樣（同一個負載縮放比例）的 Net Cash 與財務指標。
+
+    Returns:
+        dict: financial_metrics.compute_financial_metrics 的結果
+    """
+    is_aggregation, consider_large_consumer = flags
+    n_draws = len(draws)
+    book = ledger.new_ledger(layout, years, batch=n_draws)
+    book["values"][:] = base_values
+
+    def set_row(label, values):
+        if ledger.has_row(book, label):
+            ledger.set_row(book, label, np.asarray(values).reshape(n_draws, years))
+
+    cfg = config["儲能系統"]
+    損失率 = cfg["電能損失率(Round Trip)"] / 100
+    base_kWh = cfg["儲能容量"] * (cfg["SOC上限"] - cfg["SOC下限"]) / 100
+    年衰減率 = draws[DEGRADATION].to_numpy() / 100
+    usable_kWh = np.round(base_kWh * (1 - 年衰減率[:, None] * np.arange(years)), 3)
+    set_row("實際可用容量(kWh)", usable_kWh)
+
+    # 各年可用容量攤平成一維，所有抽樣的所有年份一次查表（保留容量為 0）
+    delta_kWh = (usable_kWh - ledger.get_row(book, "保留容量")).ravel()
+    tariff = np.repeat(draws[TARIFF_FACTOR].to_numpy(), years)
+
+    if ledger.has_row(book, "降契約容量收益"):
+        # config 的年節省基本電費加上電費調整係數改變後的差額
+        set_row(
+            "降契約容量收益",
+            config["降低契約容量"]["年節省基本電費"]
+            + _contract_saving(config, tariff)
+            - _contract_saving(config, config["電價方案"]["電費調整係數"]),
+        )
+
+    if ledger.has_row(book, "電價差收益"):
+        energy = summary_generator.transferable_energy_by_year(
+            config, ami_context, delta_kWh, consider_large_consumer
+        )
+        set_row("超約費用", energy["超約費用"])
+
+        # 與 update_config 相同，調整後電價取到小數 5 位
+        prices = tuple(
+            np.round(config["電價方案"][name] * tariff, 5)
+            for name in (
+                "夏月最高電價",
+                "夏月最低電價",
+                "非夏月最高電價",
+                "非夏月最低電價",
+            )
+        )
+        set_row(
+            "電價差收益",
+            summary_generator.arbitrage_revenue(
+                config,
+                energy["夏月每日可以轉移度數"],
+                energy["非夏月可以轉移度數"],
+                損失率,
+                prices=prices,
+            ),
+        )
+
+        if ledger.has_row(book, "用電大戶收益"):
+            set_row(
+                "用電大戶收益",
+                summary_generator.large_consumer_revenue(
+                    config,
+                    energy["夏月每日用電大戶放電度數"],
+                    energy["非夏月每日用電大戶放電度數"],
+                    lc_mode,
+                ),
+            )
+
+    if ledger.has_row(book, "日選時段型"):
+        set_row(
+            "日選時段型",
+            summary_generator.dr_revenue(
+                config, ami_context, delta_kWh, 損失率, consider_large_consumer
+            ),
+        )
+
+    if ledger.has_row(book, "輔助服務價金"):
+        set_row(
+            "輔助服務價金",
+            summary_generator.spinning_revenue(
+                config,
+                ami_context,
+                delta_kWh,
+                cfg["每日最大循環次數"],
+                is_aggregation,
+                consider_large_consumer,
+                得標容量比例=np.repeat(draws[AWARD_RATIO].to_numpy(), years),
+            ),
+        )
+        if ledger.has_row(book, "聚合分潤比例"):
+            聚合分潤比例 = config["聚合分潤"]["聚合分潤比例"] / 100
+            set_row(
+                "聚合分潤比例",
+                ledger.get_row(book, "輔助服務價金")
+                * (聚合分潤比例 if is_aggregation else 0),
+            )
+
+    ledger.set_totals(book)
+    return financial_metrics.compute_financial_metrics(
+        ledger.get_row(book, "Net Cash", include_year0=True)
+    )
+
+
+def summarize_draws(df_draws, bins=50):
+    """
+    抽樣結果的分位數與直方圖（略過 NaN，如 IRR 無解的抽樣）。
+
+    Returns:
+        tuple: (df_quantiles, histograms)
+            df_quantiles: index 為 P10 / P50 / P90 / mean / 無解比例，欄為 METRICS
+            histograms: {指標: {'counts': 次數, 'bin_edges': 區間邊界}}
+    """
+    rows = {}
+    histograms = {}
+    for metric in METRICS:
+        values = df_draws[metric].to_numpy(dtype=float)
+        finite = values[np.isfinite(values)]
+        column = {
+            label: np.quantile(finite, q) if finite.size else np.nan
+            for label, q in QUANTILES.items()
+        }
+        column["mean"] = finite.mean() if finite.size else np.nan
+        column["無解比例"] = 1 - finite.size / len(values)
+        rows[metric] = column
+
+        counts, bin_edges = np.histogram(finite, bins=bins)
+        histograms[metric] = {"counts": counts, "bin_edges": bin_edges}
+    return pd.DataFrame(rows), histograms
+
+
+def run_monte_carlo(
+    config,
+    df_ami,
+    unit,
+    mode="energy_only",
+    dr_program=None,
+    sp_program=None,
+    lc_program=None,
+    year=15,
+    n_draws=10000,
+    distributions=None,
+    seed=None,
+    batch_size=2000,
+    load_scale_step=0.01,
+    bins=50,
+):
+    """
+    對單一情境（台數與方案同 run_simulation）做蒙地卡羅分析。
+
+    Parameters:
+        distributions: {參數: 分布設定}，覆蓋 default_distributions 的同名參數；
+            分布設定如 {'dist': 'normal', 'mean': 1.0, 'std': 0.05, 'clip': (0.8, 1.2)}，
+            dist 可為 constant / normal / uniform / triangular
+        seed: 亂數種子
+        batch_size: 每批試算的抽樣數
+        load_scale_step: 負載縮放比例的取整間隔，同一個值共用 ami_context
+        bins: 直方圖的區間數
+
+    Returns:
+        dict: {
+            'draws': 每筆抽樣的參數與 IRR / ROI / Annual_ROI / Average_ROI / payback_year,
+            'quantiles': summarize_draws 的分位數表,
+            'histograms': summarize_draws 的直方圖,
+            'base': 未抽樣時（config 設定值）的 {'IRR', 'ROI', 'Annual_ROI', 'Average_ROI'},
+            'distributions': 實際使用的分布設定
+        }
+    """
+    if batch_size < 1:
+        raise ValueError(f"batch_size 必須大於 0: {batch_size}")
+    if load_scale_step <= 0:
+        raise ValueError(f"load_scale_step 必須大於 0: {load_scale_step}")
+
+    config = summary_generator.configure_scenario(
+        copy.deepcopy(config), unit, mode, dr_program, sp_program, lc_program
+    )
+    flags = (
+        summary_generator.is_aggregation_scenario(mode, sp_program),
+        summary_generator.is_large_consumer_scenario(lc_program),
+    )
+
+    used_distributions = default_distributions(config)
+    used_distributions.update(distributions or {})
+    df_draws = sample_draws(used_distributions, n_draws, seed)
+    df_draws[LOAD_SCALE] = np.round(df_draws[LOAD_SCALE] / load_scale_step) * (
+        load_scale_step
+    )
+
+    tou_program = config["電價方案"]["計費類別"]
+    contract_capacity = config["電價方案"]["契約容量"]["new"]
+
+    # 基準情境：與抽樣無關的行、Year 0 直接沿用（generate_summary 會改動 config，傳入副本）
+    df_base, ROI, IRR, Annual_ROI, Average_ROI = summary_generator.generate_summary(
+        copy.deepcopy(config),
+        df_ami,
+        mode=mode,
+        years=year,
+        include_contract_saving=False,
+        is_aggregation=flags[0],
+        lc_mode=lc_program,
+        ami_context=ami_analysis.build_ami_context(
+            df_ami, tou_program, contract_capacity
+        ),
+    )
+    layout = ledger.compile_layout(tuple(summary_generator.SCENARIO_ROWS[mode]))
+    base_values = df_base.to_numpy(dtype=float)
+
+    metrics = {name: np.full(n_draws, np.nan) for name in (*METRICS, "payback_year")}
+    load_scale = df_draws[LOAD_SCALE].to_numpy()
+    for scale in np.unique(load_scale):
+        df_scaled = df_ami.assign(load_kw=df_ami["load_kw"] * scale)
+        ami_context = ami_analysis.build_ami_context(
+            df_scaled, tou_program, contract_capacity
+        )
+        index = np.flatnonzero(load_scale == scale)
+        for start in range(0, len(index), batch_size):
+            batch = index[start : start + batch_size]
+            result = _evaluate_batch(
+                config,
+                base_values,
+                layout,
+                ami_context,
+                df_draws.iloc[batch],
+                year,
+                flags,
+                lc_program,
+            )
+            for name, values in metrics.items():
+                values[batch] = result[name]
+
+    for name, values in metrics.items():
+        df_draws[name] = values
+    df_quantiles, histograms = summarize_draws(df_draws, bins=bins)
+
+    return {
+        "draws": df_draws,
+        "quantiles": df_quantiles,
+        "histograms": histograms,
+        "base": {
+            "IRR": IRR,
+            "ROI": ROI,
+            "Annual_ROI": Annual_ROI,
+            "Average_ROI": Average_ROI,
+        },
+        "distributions": used_distributions,
+    }
+
+
+def result_to_dict(result):
+    """run_monte_carlo 結果中可序列化的摘要（不含逐筆抽樣），供 API 回傳"""
+    return {
+        "n_draws": len(result["draws"]),
+        "quantiles": result["quantiles"].to_dict(),
+        "histograms": {
+            metric: {
+                "counts": histogram["counts"].tolist(),
+                "bin_edges": histogram["bin_edges"].tolist(),
+            }
+            for metric, histogram in result["histograms"].items()
+        },
+        "base": {name: float(value) for name, value in result["base"].items()},
+        "distributions": result["distributions"],
+    }
@@ -0,0 +1,292 @@
+"""
+建置、維運與融資參數的敏感度分析（參數網格與龍捲風圖）
+
+「每單位建置成本改成 8000」、「利率改成 3%」這類問題只影響 generate_summary 的
+支出面（summary_generator.FINANCING_ROWS 與 Year 0 的自備資金），不需要逐點呼叫 run_simulation：
+
+- 先以 generate_summary 算一次基準情境，能量面的行（可用容量、電價差、DR、即時備轉、超約費用等）
+  所有網格點共用
+- 每個網格點只重設 config、以 update_config 更新衍生欄位，並重算 financing_rows
+- 所有網格點填入批次 ledger，一次算出 Net Cash 與 IRR / ROI
+
+只接受 FINANCIAL_SECTIONS 內的欄位；由 update_config 計算的欄位（如 儲能設備、案場維運成本）
+會被覆蓋，需改用其輸入欄位（如 每單位建置成本、系統服務單價 的 案場維運費用_年_%）。
+
+用法：
+    result = sensitivity.run_sensitivity(
+        config,
+        df_ami,
+        unit=8,
+        axes=[
+            (["建置成本(第0年繳)", "每單位建置成本"], [8000, 9000, 10000]),
+            (["融資成本", "利息費用"], [2, 3]),
+        ],
+        mode="energy_dr",
+        dr_program="2h",
+    )
+    result["grid"]     # 每個網格點的 IRR / ROI
+    result["tornado"]  # 各參數由最低值到最高值的 IRR / ROI 變化
+"""
+
+import copy
+from itertools import product
+
+import numpy as np
+import pandas as pd
+
+from shared.core import ami_analysis, financial_metrics, ledger, summary_generator
+
+# 只影響建置、維運、融資（支出面）的 config 區塊
+FINANCIAL_SECTIONS = (
+    "建置成本(第0年繳)",
+    "維運成本(年繳)",
+    "系統服務單價",
+    "融資成本",
+    "聚合分潤",
+    "自定義收益(年收/省)",
+)
+
+METRICS = ("IRR", "ROI", "Annual_ROI", "Average_ROI", "payback_year")
+
+# 網格點數上限
+MAX_GRID_POINTS = 20000
+
+
+def axis_label(path):
+    """參數軸的名稱，如 '建置成本(第0年繳).每單位建置成本'"""
+    return ".".join(path)
+
+
+def _get_path(config, path):
+    value = config
+    for key in path:
+        if not isinstance(value, dict) or key not in value:
+            raise ValueError(f"config 沒有欄位: {axis_label(path)}")
+        value = value[key]
+    return value
+
+
+def _set_path(config, path, value):
+    _get_path(config, path)
+    target = config
+    for key in path[:-1]:
+        target = target[key]
+    target[path[-1]] = value
+
+
+def _normalize_axes(config, axes):
+    """
+    檢查參數軸：路徑需存在且屬於 FINANCIAL_SECTIONS，值不可為空、路徑不可重複。
+
+    Returns:
+        list: [(路徑 tuple, 值 list), ...]
+    """
+    if not axes:
+        raise ValueError("至少需要一個參數軸")
+
+    normalized = []
+    for path, values in axes:
+        if isinstance(path, str) or not path:
+            raise ValueError(f"參數路徑需為 config 欄位名稱的序列: {path!r}")
+        path = tuple(path)
+        if path[0] not in FINANCIAL_SECTIONS:
+            raise ValueError(
+                f"{axis_label(path)} 會影響能量面的計算，"
+                f"敏感度分析只支援 {', '.join(FINANCIAL_SECTIONS)} 的欄位"
+            )
+        _get_path(config, path)
+        values = list(values)
+        if not values:
+            raise ValueError(f"{axis_label(path)} 沒有任何值")
+        normalized.append((path, values))
+
+    labels = [axis_label(path) for path, _ in normalized]
+    if len(set(labels)) != len(labels):
+        raise ValueError("參數軸不可重複")
+    return normalized
+
+
+def _point_config(config, scenario, point):
+    """套用一個網格點的參數值後，以 configure_scenario 更新衍生欄位"""
+    point_config = copy.deepcopy(config)
+    for path, value in point:
+        _set_path(point_config, path, value)
+    point_config = summary_generator.configure_scenario(point_config, **scenario)
+
+    # update_config 計算的欄位會被覆蓋，改這些欄位沒有作用
+    for path, value in point:
+        if _get_path(point_config, path) != value:
+            raise ValueError(
+                f"{axis_label(path)} 由 update_config 計算，請改用其輸入欄位"
+            )
+    return point_config
+
+
+def _evaluate_points(config, scenario, points, base_values, years, is_aggregation):
+    """
+    各網格點的財務指標：能量面沿用基準情境，只重算 financing_rows 與聚合分潤。
+
+    Returns:
+        dict: financial_metrics.compute_financial_metrics 的結果
+    """
+    mode = scenario["mode"]
+    layout = ledger.compile_layout(tuple(summary_generator.SCENARIO_ROWS[mode]))
+    book = ledger.new_ledger(layout, years, batch=len(points))
+    book["values"][:] = base_values
+
+    point_configs = [_point_config(config, scenario, point) for point in points]
+    financing = [
+        summary_generator.financing_rows(point_config, mode, years)
+        for point_config in point_configs
+    ]
+    for label in summary_generator.FINANCING_ROWS:
+        if ledger.has_row(book, label):
+            ledger.set_row(book, label, [rows[label] for rows in financing])
+
+    if is_aggregation and ledger.has_row(book, "聚合分潤比例"):
+        聚合分潤比例 = np.array(
+            [point_config["聚合分潤"]["聚合分潤比例"] for point_config in point_configs]
+        )
+        ledger.set_row(
+            book,
+            "聚合分潤比例",
+            ledger.get_row(book, "輔助服務價金") * (聚合分潤比例[:, None] / 100),
+        )
+
+    ledger.set_totals(book)
+    ledger.set_year0(book, [rows["自備資金"] for rows in financing])
+    return financial_metrics.compute_financial_metrics(
+        ledger.get_row(book, "Net Cash", include_year0=True)
+    )
+
+
+def _tornado(axes, metrics, base, offset):
+    """各參數軸取最低值與最高值（其他參數維持基準）時的指標與相對基準的變化"""
+    rows = []
+    for i, (path, values) in enumerate(axes):
+        low, high = offset + 2 * i, offset + 2 * i + 1
+        row = {"參數": axis_label(path), "低值": min(values), "高值": max(values)}
+        for metric in ("IRR", "ROI"):
+            row[f"{metric}_低"] = metrics[metric][low]
+            row[f"{metric}_高"] = metrics[metric][high]
+            row[f"Δ{metric}_低"] = metrics[metric][low] - base[metric]
+            row[f"Δ{metric}_高"] = metrics[metric][high] - base[metric]
+        row["IRR影響幅度"] = abs(row["IRR_高"] - row["IRR_低"])
+        rows.append(row)
+
+    # 影響幅度由大到小（龍捲風圖由上而下），IRR 無解時排在最後
+    return (
+        pd.DataFrame(rows)
+        .sort_values("IRR影響幅度", ascending=False, na_position="last")
+        .reset_index(drop=True)
+    )
+
+
+def run_sensitivity(
+    config,
+    df_ami,
+    unit,
+    axes,
+    mode="energy_only",
+    dr_program=None,
+    sp_program=None,
+    lc_program=None,
+    year=15,
+    ami_context=None,
+):
+    """
+    單一情境（台數與方案同 run_simulation）對建置、維運、融資參數的敏感度分析。
+
+    Parameters:
+        axes: [(config 欄位路徑, 值的序列), ...]，路徑如 ['融資成本', '利息費用']；
+            網格為所有參數軸的值的組合
+        ami_context: 與 run_simulation 相同，可共用其他情境的 AMI 分析快取
+
+    Returns:
+        dict: {
+            'grid': 每個網格點一列，各參數軸一欄，另有 IRR / ROI / Annual_ROI / Average_ROI / payback_year,
+            'tornado': 各參數的龍捲風圖資料（_tornado）,
+            'base': config 設定值的 {'IRR', 'ROI', 'Annual_ROI', 'Average_ROI'}
+        }
+    """
+    scenario = {
+        "unit": unit,
+        "mode": mode,
+        "dr_program": dr_program,
+        "sp_program": sp_program,
+        "lc_program": lc_program,
+    }
+    axes = _normalize_axes(config, axes)
+    n_grid = int(np.prod([len(values) for _, values in axes]))
+    if n_grid > MAX_GRID_POINTS:
+        raise ValueError(f"網格點數 {n_grid} 超過上限 {MAX_GRID_POINTS}")
+
+    base_config = summary_generator.configure_scenario(
+        copy.deepcopy(config), **scenario
+    )
+    if ami_context is None:
+        ami_context = ami_analysis.build_ami_context(
+            df_ami,
+            base_config["電價方案"]["計費類別"],
+            base_config["電價方案"]["契約容量"]["new"],
+        )
+
+    # 基準情境：能量面的行所有網格點共用（generate_summary 會改動 config，傳入副本）
+    is_aggregation = summary_generator.is_aggregation_scenario(mode, sp_program)
+    df_base, ROI, IRR, Annual_ROI, Average_ROI = summary_generator.generate_summary(
+        copy.deepcopy(base_config),
+        df_ami,
+        mode=mode,
+        years=year,
+        include_contract_saving=False,
+        is_aggregation=is_aggregation,
+        lc_mode=lc_program,
+        ami_context=ami_context,
+    )
+    base = {
+        "IRR": IRR,
+        "ROI": ROI,
+        "Annual_ROI": Annual_ROI,
+        "Average_ROI": Average_ROI,
+    }
+
+    # 網格點之後接著各參數軸的最低值、最高值（龍捲風圖），一次試算
+    paths = [path for path, _ in axes]
+    points = [
+        tuple(zip(paths, values)) for values in product(*(values for _, values in axes))
+    ]
+    for path, values in axes:
+        points += [((path, min(values)),), ((path, max(values)),)]
+
+    metrics = _evaluate_points(
+        config,
+        scenario,
+        points,
+        df_base.to_numpy(dtype=float),
+        year,
+        is_aggregation,
+    )
+
+    df_grid = pd.DataFrame(
+        [
+            {axis_label(path): value for path, value in point}
+            for point in points[:n_grid]
+        ]
+    )
+    for metric in METRICS:
+        df_grid[metric] = metrics[metric][:n_grid]
+
+    return {
+        "grid": df_grid,
+        "tornado": _tornado(axes, metrics, base, n_grid),
+        "base": base,
+    }
+
+
+def result_to_dict(result):
+    """run_sensitivity 的結果轉成可序列化的 dict，供 API 回傳"""
+    return {
+        "grid": result["grid"].to_dict(orient="records"),
+        "tornado": result["tornado"].to_dict(orient="records"),
+        "base": {name: float(value) for name, value in result["base"].items()},
+    }
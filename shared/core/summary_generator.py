@@ -1,14 +1,24 @@
 import copy
 import os
-import sqlite3
+import pickle
 import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from itertools import product
 
 import numpy as np
-import numpy_financial as npf
 import pandas as pd
 
-from shared.core import calculator, config_loader
+from shared.core import (
+    ami_analysis,
+    ami_cache,
+    ami_store,
+    calculator,
+    config_loader,
+    financial_metrics,
+    ledger,
+    unit_search,
+)
 
 
 def get_ami_db_path():
@@ -142,6 +152,437 @@ SCENARIO_ROWS = {
 }
 
 
+# === 只跟可用容量有關的收益 / 費用 ===
+# delta_kWh 為各年的可用容量，也可以是多組情境的各年度攤平成一維
+# （蒙地卡羅等批次試算共用同一套計算）
+
+
+def transferable_energy_by_year(
+    config, ami_context, delta_kWh, consider_large_consumer
+):
+    """
+    逐年的每日可轉移電量、用電大戶放電度數與超約費用。
+
+    Returns:
+        dict: {
+            '夏月每日可以轉移度數', '非夏月可以轉移度數',
+            '夏月每日用電大戶放電度數', '非夏月每日用電大戶放電度數',
+            '超約費用',
+            '每日最大循環次數': 非夏月只有一個高峰時為 1，其餘同 config
+        }
+    """
+    損失率 = config["儲能系統"]["電能損失率(Round Trip)"] / 100
+    cycles = config["儲能系統"]["每日最大循環次數"]
+    pcs_max_kW = config["儲能系統"]["PCS 標稱功率"]
+
+    # 計算每年的每日平均可轉移電量
+    _, df_ami2 = ami_analysis.get_transferable_energy(
+        ami_context, pcs_max_kW, [("00:00", "23:45")], consider_large_consumer
+    )
+
+    # 判斷是否超約，超約的話，計算超約費用
+    # 後面可能會因為電池退化而導致可用容量降低，進而超約
+    # 超約的話：用電大戶跟DR都要扣除額外超越的電量
+
+    # 取出夏月跟非夏月1循環的超約電量統計
+    max_summer_over_1 = df_ami2[(df_ami2["season"] == "summer")]["超約電量"].max()
+    max_not_summer_over_1 = df_ami2[(df_ami2["season"] == "not_summer")][
+        "超約電量"
+    ].max()
+    # print(f"[debug] 夏月超約: {max_summer_over_1} kWh, 非夏月超約: {max_not_summer_over_1} kWh")
+
+    # 最大的超約費可以先算，不管1循環或2循環
+    penality_result = ami_analysis.get_over_capacity_penalties(
+        ami_context, pcs_max_kW, consider_large_consumer
+    )
+
+    # 各年可轉移電量由 ami_context 快取的容量反應曲線查表
+    # 1. 夏月先算，夏月都只有1循環，所以共用，不用區分
+    result_te_summer = ami_analysis.lookup_transfered_energy(
+        ami_context,
+        pcs_max_kW,
+        delta_kWh,
+        "summer",
+        損失率,
+        consider_large_consumer=consider_large_consumer,
+    )
+
+    夏月每日可以轉移度數 = result_te_summer["可轉移電量"]
+    夏月每日用電大戶放電度數 = result_te_summer["用電大戶義務可轉移電量"]
+
+    # 2. 非夏月再算，考慮兩循環
+    if cycles == 1:
+        result_te_not_summer = ami_analysis.lookup_transfered_energy(
+            ami_context,
+            pcs_max_kW,
+            delta_kWh,
+            "not_summer",
+            損失率,
+            consider_large_consumer=consider_large_consumer,
+        )
+        非夏月可以轉移度數 = result_te_not_summer["可轉移電量"]
+        非夏月每日用電大戶放電度數 = result_te_not_summer["用電大戶義務可轉移電量"]
+
+    elif cycles >= 2:
+        # 確認有兩個高峰
+        if ami_analysis.get_not_summer_high_peaks(ami_context) == 2:
+            # time_periods = [('00:00', '10:45'), ('11:00', '23:45')]
+            # 第一循環
+            _, df_ami2_2 = ami_analysis.get_transferable_energy(
+                ami_context, pcs_max_kW, time_periods=[("00:00", "10:45")]
+            )
+            非夏月可以轉移度數_1 = ami_analysis.lookup_transfered_energy(
+                ami_context,
+                pcs_max_kW,
+                delta_kWh,
+                "not_summer",
+                損失率,
+                time_periods=[("00:00", "10:45")],
+            )["可轉移電量"]
+
+            max_not_summer_over_2_1 = df_ami2_2[(df_ami2_2["season"] == "not_summer")][
+                "超約電量"
+            ].max()
+            # print(f"[debug] 非夏月第一時段超約: {max_not_summer_over_2_1} kWh")
+
+            # 第二循環，只有第二循環才會有用電大戶
+            _, df_ami2_2 = ami_analysis.get_transferable_energy(
+                ami_context,
+                pcs_max_kW,
+                time_periods=[("11:00", "23:45")],
+                consider_large_consumer=consider_large_consumer,
+            )
+            result_te_not_summer_2 = ami_analysis.lookup_transfered_energy(
+                ami_context,
+                pcs_max_kW,
+                delta_kWh,
+                "not_summer",
+                損失率,
+                time_periods=[("11:00", "23:45")],
+                consider_large_consumer=consider_large_consumer,
+            )
+            非夏月可以轉移度數_2 = result_te_not_summer_2["可轉移電量"]
+            非夏月每日用電大戶放電度數 = result_te_not_summer_2[
+                "用電大戶義務可轉移電量"
+            ]
+
+            max_not_summer_over_2_2 = df_ami2_2[(df_ami2_2["season"] == "not_summer")][
+                "超約電量"
+            ].max()
+            # print(f"[debug] 非夏月第二時段超約: {max_not_summer_over_2_2} kWh")
+
+            # print('非夏月可以轉移度數_1', 非夏月可以轉移度數_1 , '非夏月可以轉移度數_2', 非夏月可以轉移度數_2)
+            非夏月可以轉移度數 = 非夏月可以轉移度數_1 + 非夏月可以轉移度數_2
+
+        # 如果只有一個高峰，則不分時段
+        else:
+            result_te_not_summer = ami_analysis.lookup_transfered_energy(
+                ami_context,
+                pcs_max_kW,
+                delta_kWh,
+                "not_summer",
+                損失率,
+                consider_large_consumer=consider_large_consumer,
+            )
+            非夏月可以轉移度數 = result_te_not_summer["可轉移電量"]
+            非夏月每日用電大戶放電度數 = result_te_not_summer["用電大戶義務可轉移電量"]
+            cycles = 1
+
+    # 超約費用計算，但通常都是夏月超約比較多，所以通常2循環影響不大
+    if cycles == 1:
+        annual_penalty_list = config_loader.calculate_annual_capacity_penalties(
+            delta_kWh,
+            max_summer_over_1,
+            max_not_summer_over_1,
+            penality_result,
+            損失率,
+        )
+    else:
+        # print(f"[debug] 非夏月最大超約: {max(max_not_summer_over_2_1, max_not_summer_over_2_2)} kWh")
+        annual_penalty_list = config_loader.calculate_annual_capacity_penalties(
+            delta_kWh,
+            max_summer_over_1,
+            max(max_not_summer_over_2_1, max_not_summer_over_2_2),
+            penality_result,
+            損失率,
+        )
+
+    return {
+        "夏月每日可以轉移度數": 夏月每日可以轉移度數,
+        "非夏月可以轉移度數": 非夏月可以轉移度數,
+        "夏月每日用電大戶放電度數": 夏月每日用電大戶放電度數,
+        "非夏月每日用電大戶放電度數": 非夏月每日用電大戶放電度數,
+        "超約費用": annual_penalty_list,
+        "每日最大循環次數": cycles,
+    }
+
+
+def arbitrage_revenue(
+    config, 夏月每日可以轉移度數, 非夏月可以轉移度數, 損失率, prices=None
+):
+    """
+    電價差收益 = 價差 - 充電損失成本。
+    prices 為 (夏月最高, 夏月最低, 非夏月最高, 非夏月最低) 電價，可為與可轉移電量等長的陣列；
+    None 時取 config 的調整後電價。
+    """
+    if prices is None:
+        prices = (
+            config["電價方案"]["調整後夏月最高電價"],
+            config["電價方案"]["調整後夏月最低電價"],
+            config["電價方案"]["調整後非夏月最高電價"],
+            config["電價方案"]["調整後非夏月最低電價"],
+        )
+    夏月最高電價, 夏月最低電價, 非夏月最高電價, 非夏月最低電價 = prices
+    夏月天數 = config["電價方案"]["夏月天數"]
+    非夏月天數 = config["電價方案"]["非夏月天數"]
+
+    # 充電度數 * 充電效率 * 放電效率 = 放電度數
+    # 往返效率 =  放電度數/充電度數 = 充電效率 * 放電效率
+    # 充電效率 = 放電效率 = 往返效率^(1/2)
+
+    # a. 價差
+    a = (夏月最高電價 - 夏月最低電價) * 夏月天數 * 夏月每日可以轉移度數 + (
+        非夏月最高電價 - 非夏月最低電價
+    ) * 非夏月天數 * 非夏月可以轉移度數
+
+    # b. 充電成本
+    b = (
+        夏月最低電價 * 夏月天數 * 夏月每日可以轉移度數 * 損失率
+        + 非夏月最低電價 * 非夏月天數 * 非夏月可以轉移度數 * 損失率
+    )
+
+    # #print('result', a-b)
+    return a - b
+
+
+def large_consumer_revenue(
+    config, 夏月每日用電大戶放電度數, 非夏月每日用電大戶放電度數, lc_mode
+):
+    """用電大戶的年度電費扣減"""
+    # print('用電大戶放電度數_夏月', 夏月每日用電大戶放電度數)
+    # print('用電大戶放電度數_非夏月', 非夏月每日用電大戶放電度數)
+    用電大戶放電度數 = (
+        config["電價方案"]["夏月天數"] * 夏月每日用電大戶放電度數
+        + config["電價方案"]["非夏月天數"] * 非夏月每日用電大戶放電度數
+    ).round()
+    # print('[debug] 用電大戶放電度數:', 用電大戶放電度數)
+    return [
+        calculator.compute_large_consumer_reduction(
+            config["再生能源義務用戶"]["義務裝置容量"], x, lc_mode
+        )
+        for x in 用電大戶放電度數
+    ]
+
+
+def dr_revenue(config, ami_context, delta_kWh, 損失率, consider_large_consumer):
+    """日選時段型的年度收益"""
+    # 抑低契約容量 = config['日選時段型']['抑低契約容量']
+
+    # 抑低時段內的統計與儲能容量無關，由 ami_context 快取；各年容量查容量反應曲線
+    dr_window = (
+        ami_context,
+        config["儲能系統"]["PCS 標稱功率"],
+        config["日選時段型"]["開始時段"],
+        config["日選時段型"]["結束時段"],
+    )
+    dr_hr = config["日選時段型"]["執行時數"]
+    dr_bms_kWh = delta_kWh * np.sqrt(1 - 損失率)
+    if dr_hr > 0:
+        抑低契約容量 = calculator.dr_capacity_from_curve(
+            ami_analysis.get_dr_capacity_curve(
+                *dr_window, dr_hr, consider_large_consumer
+            ),
+            dr_bms_kWh,
+        )
+    else:
+        抑低契約容量 = calculator.dr_capacity_from_stats(
+            ami_analysis.get_dr_window_stats(*dr_window, consider_large_consumer),
+            dr_hr,
+            dr_bms_kWh,
+        )
+    # #print('抑低契約容量', 抑低契約容量)
+
+    當日執行率 = config["日選時段型"]["當日執行率"]
+    執行時數 = config["日選時段型"]["執行時數"]
+    扣減電價 = config["日選時段型"]["流動電費扣減費率"]
+    扣減倍率 = config["日選時段型"]["扣減比率"]
+    可參與天數 = config["日選時段型"]["5月-10月可參與天數"]
+
+    日選收益 = (
+        抑低契約容量 * 當日執行率 * 執行時數 * 扣減電價 * 扣減倍率 * 可參與天數 / 10000
+    )
+    # #print('日選收益', 日選收益)
+    return 日選收益
+
+
+def spinning_revenue(
+    config,
+    ami_context,
+    delta_kWh,
+    cycles,
+    is_aggregation,
+    consider_large_consumer,
+    得標容量比例=None,
+):
+    """
+    即時備轉的年度輔助服務價金。
+    得標容量比例 (%) 可為與 delta_kWh 等長的陣列，None 時取 config 的設定。
+    """
+    效能價格 = config["即時備轉"]["1級效能價格"]
+    容量價格 = config["即時備轉"]["容量價格"]
+    # 每日參與時數 = 24
+    日選執行時數 = config["日選時段型"]["執行時數"]
+    # 僅輔助日 = config['可參與輔助服務時數']['僅參與輔助服務天數']
+    # 同時輔助日 = config['可參與輔助服務時數']['日選時段同時參與天數']
+    if 得標容量比例 is None:
+        得標容量比例 = config["即時備轉"]["得標容量比例"]
+    得標比例 = 得標容量比例 / 100
+    折扣比例 = config["即時備轉"]["折扣比例"] / 100
+
+    # 聚合後折扣 = config['可參與輔助服務時數']['聚合後收益折扣'] / 100
+    # 大於1000比例 = config['可參與輔助服務時數']['大於1000kW比例'] / 100
+    每月觸發次數 = config["即時備轉"]["每月觸發次數"]
+    日前電價 = config["即時備轉"]["日前電能邊際價格"]
+
+    # 1MW以上才可以投標
+    if is_aggregation:
+        投標容量 = config["即時備轉"]["投標容量"]
+    else:
+        if config["即時備轉"]["投標容量"] < 1000:
+            投標容量 = 0
+        else:
+            投標容量 = config["即時備轉"]["投標容量"]
+
+    夏月天數 = config["電價方案"]["夏月天數"]
+    非夏月天數 = config["電價方案"]["非夏月天數"]
+    不可投標天數 = config["可參與輔助服務時數"]["不可投標天數"]
+
+    # 先把歲修排在非工作日
+    非工作日 = 365 - 夏月天數 - 非夏月天數 - 不可投標天數
+    # 日選執行時數 = config['日選時段型']['執行時數']
+
+    # 非工作日的特徵、工作日依 (季節, 尖峰) 的特徵只跟 AMI 與 PCS 功率有關，
+    # 由 ami_context 快取；逐年只有可用容量 (delta_kWh) 不同，一次算完所有年份
+    series_ami_weekend, df_spinning_stats = ami_analysis.get_spinning_stats(
+        ami_context, config["儲能系統"]["PCS 標稱功率"], consider_large_consumer
+    )
+    sp_total_single, sp_total_agg = calculator.compute_total_spinning_gain_by_year(
+        series_ami_weekend,
+        df_spinning_stats,
+        delta_kWh,
+        非工作日,
+        夏月天數,
+        非夏月天數,
+        容量價格,
+        效能價格,
+        日選執行時數,
+        cycles,
+    )
+    if is_aggregation:
+        輔助服務價金 = list(sp_total_agg)
+    else:
+        # 單一案場投標量 小於1000kW，不能參加
+        if 投標容量 < 1000:
+            輔助服務價金 = [0] * len(delta_kWh)
+        else:
+            輔助服務價金 = list(sp_total_single)
+
+    # a = (
+    #     (效能價格 + 容量價格) * (每日參與時數 - 2) * 僅輔助日 +
+    #     (效能價格 + 容量價格) * (每日參與時數 - 2 - 日選執行時數) * 同時輔助日
+    # ) * 投標容量 / 1000 * 得標比例 * 折扣比例
+
+    b = 每月觸發次數 * 日前電價 * 12 * 投標容量 / 1000
+
+    # #print(輔助服務價金)
+    輔助服務價金 = pd.Series(輔助服務價金) * 得標比例 * 折扣比例
+    輔助服務價金 = 輔助服務價金 + b
+    # #print(輔助服務價金)
+    # #print('b:',b)
+
+    # 輔助服務價金 = (a + b) * 聚合後折扣 * 大於1000比例
+    return 輔助服務價金.values
+
+
+# 建置、維運與融資相關的行
+FINANCING_ROWS = (
+    "自定義收益",
+    "土地租金",
+    "保險費用",
+    "維運+監控EMS費用",
+    "利息費用",
+)
+
+
+def financing_rows(config, mode, years):
+    """
+    只跟建置、維運、融資設定有關的行（FINANCING_ROWS）與 Year 0 的自備資金，
+    與 AMI、可用容量無關（敏感度分析只需要重算這一部分）。
+
+    Returns:
+        dict: {行名: 各年的值, '自備資金': 自備資金}
+    """
+    rows = {}
+
+    # 這裡可以加入自定義收益的計算邏輯
+    rows["自定義收益"] = [config["自定義收益(年收/省)"]["自定義收益"]] * years
+
+    # === 支出部分 ===
+    儲能容量 = config["儲能系統"]["儲能容量"]
+    土地租金單價 = config["維運成本(年繳)"]["土地年租金"]
+    rows["土地租金"] = [儲能容量 * 土地租金單價] * years
+
+    保險費率 = config["維運成本(年繳)"]["保險費率"]
+    rows["保險費用"] = [
+        config["建置成本(第0年繳)"]["儲能設備"] * 保險費率 / 100
+    ] * years
+
+    維運成本 = config["維運成本(年繳)"]["案場維運成本"]
+    EMS維運成本 = config["維運成本(年繳)"]["EMS維運成本"]
+    其他固定成本 = config["維運成本(年繳)"]["其他固定成本"]
+    # 只有即時備轉才需要電力交易費用
+    if "regulation" in mode:
+        電力交易費用 = config["維運成本(年繳)"]["電力交易雲端平台"]
+    else:
+        電力交易費用 = 0
+
+    # TODO: 維運成本 kW or kWh 計價
+    rows["維運+監控EMS費用"] = [
+        維運成本 + EMS維運成本 + 電力交易費用 + 其他固定成本
+    ] * years
+
+    建置成本 = (
+        config["建置成本(第0年繳)"]["儲能設備"]
+        + config["建置成本(第0年繳)"]["儲能設備安裝"]
+        + config["建置成本(第0年繳)"]["高壓設備"]
+        + config["建置成本(第0年繳)"]["高壓設備安裝"]
+        + config["建置成本(第0年繳)"]["設計/監造/簽證費用"]
+        + config["建置成本(第0年繳)"]["其他"]
+        + config["建置成本(第0年繳)"]["EMS"]
+    )
+
+    貸款成數 = config["融資成本"]["貸款成數"] / 100
+
+    if 貸款成數 <= 0:
+        # 如果貸款成數為0，則不計算利息費用
+        rows["利息費用"] = [0] * years
+    else:
+        利率 = config["融資成本"]["利息費用"] / 100
+        # 利率為0, 輸出錯誤
+        if 利率 <= 0:
+            raise ValueError("利率必須大於0")
+
+        年限 = config["融資成本"]["攤還年限"]
+
+        貸款金額 = 建置成本 * 貸款成數
+        年本息 = calculator.loan_pmt_per_year(貸款金額, 年限, 利率)
+        rows["利息費用"] = [年本息] * min(年限, years) + [0] * max(0, years - 年限)
+
+    # 自備資金列為 Year 0 的支出
+    rows["自備資金"] = 建置成本 * (1 - 貸款成數)
+    return rows
+
+
 # === 主函式 ===
 def generate_summary(
     config,
@@ -151,14 +592,14 @@ def generate_summary(
     include_contract_saving=False,
     is_aggregation=False,
     lc_mode="義務時數型",
+    ami_context=None,
 ):
     if mode not in SCENARIO_ROWS:
         raise ValueError(f"Unsupported mode: {mode}")
 
-    # 初始化 DataFrame
-    years_list = [f"Year {i}" for i in range(1, years + 1)]
+    # 初始化逐年財務帳（float64 陣列，回傳前才轉成 DataFrame）
     row_labels = SCENARIO_ROWS[mode]
-    df_summary = pd.DataFrame(index=row_labels, columns=years_list).fillna("")
+    book = ledger.new_ledger(ledger.compile_layout(tuple(row_labels)), years)
 
     # === 填資料 ===
 
@@ -172,468 +613,142 @@ def generate_summary(
     cycles = config["儲能系統"]["每日最大循環次數"]
     tou_program = config["電價方案"]["計費類別"]
 
-    df_ami_0 = df_ami.copy()
+    # 與方案無關的 AMI 計算，由 ami_context 快取；未提供時只供本情境使用
+    if ami_context is None:
+        ami_context = ami_analysis.build_ami_context(
+            df_ami, tou_program, config["電價方案"]["契約容量"]["new"]
+        )
+    else:
+        ami_analysis.check_ami_context(
+            ami_context, tou_program, config["電價方案"]["契約容量"]["new"]
+        )
 
     # 是否是用電大戶
-    if lc_mode in ["義務時數型", "累進回饋型"]:
-        consider_large_consumer = True
-    else:
-        consider_large_consumer = False
+    consider_large_consumer = is_large_consumer_scenario(lc_mode)
 
     if "建置容量(kWh)" in row_labels:
-        df_summary.loc["建置容量(kWh)"] = [建置容量] * years
+        ledger.set_row(book, "建置容量(kWh)", [建置容量] * years)
 
     if "實際可用容量(kWh)" in row_labels:
         base_kWh = 儲能容量 * (SOC上限 - SOC下限) / 100
         usable_kWh = [
             round(base_kWh * (1 - 年衰減率 * (i - 1)), 3) for i in range(1, years + 1)
         ]
-        df_summary.loc["實際可用容量(kWh)"] = usable_kWh
+        ledger.set_row(book, "實際可用容量(kWh)", usable_kWh)
 
     if "投標容量" in row_labels:
         if is_aggregation:
-            df_summary.loc["投標容量"] = [config["即時備轉"]["投標容量"]] * years
+            ledger.set_row(book, "投標容量", [config["即時備轉"]["投標容量"]] * years)
         else:
             if config["即時備轉"]["投標容量"] < 1000:
-                df_summary.loc["投標容量"] = [0] * years
+                ledger.set_row(book, "投標容量", [0] * years)
             else:
-                df_summary.loc["投標容量"] = [config["即時備轉"]["投標容量"]] * years
+                ledger.set_row(
+                    book, "投標容量", [config["即時備轉"]["投標容量"]] * years
+                )
 
     if "保留容量" in row_labels:
-        df_summary.loc["保留容量"] = [0] * years
+        ledger.set_row(book, "保留容量", [0] * years)
 
     if "降契約容量收益" in row_labels:
-        df_summary.loc["降契約容量收益"] = [
-            config["降低契約容量"]["年節省基本電費"]
-        ] * years
+        ledger.set_row(
+            book, "降契約容量收益", [config["降低契約容量"]["年節省基本電費"]] * years
+        )
 
     if "電價差收益" in row_labels:
-        # 尖峰價 = config['電價方案']['調整後加權平均尖峰電價']
-        # 離峰價 = config['電價方案']['調整後加權平均離峰電價']
-        夏月最高電價 = config["電價方案"]["調整後夏月最高電價"]
-        夏月最低電價 = config["電價方案"]["調整後夏月最低電價"]
-        非夏月最高電價 = config["電價方案"]["調整後非夏月最高電價"]
-        非夏月最低電價 = config["電價方案"]["調整後非夏月最低電價"]
         夏月天數 = config["電價方案"]["夏月天數"]
         非夏月天數 = config["電價方案"]["非夏月天數"]
 
         損失率 = cfg["電能損失率(Round Trip)"] / 100
 
-        delta_kWh = df_summary.loc["實際可用容量(kWh)"] - df_summary.loc["保留容量"]
-        # #print('delta_kWh',type(delta_kWh), delta_kWh)
-
-        # 計算每年的每日平均可轉移電量
-        df_ami, df_ami2 = calculator.calculate_transferable_energy(
-            df_ami_0,
-            tou_program,
-            config["電價方案"]["契約容量"]["new"],
-            config["儲能系統"]["PCS 標稱功率"],
-            [("00:00", "23:45")],
-            consider_large_consumer,
-        )
-
-        # 判斷是否超約，超約的話，計算超約費用
-        # 後面可能會因為電池退化而導致可用容量降低，進而超約
-        # 超約的話：用電大戶跟DR都要扣除額外超越的電量
-
-        # 取出夏月跟非夏月1循環的超約電量統計
-        max_summer_over_1 = df_ami2[(df_ami2["season"] == "summer")]["超約電量"].max()
-        max_not_summer_over_1 = df_ami2[(df_ami2["season"] == "not_summer")][
-            "超約電量"
-        ].max()
-        # print(f"[debug] 夏月超約: {max_summer_over_1} kWh, 非夏月超約: {max_not_summer_over_1} kWh")
-
-        # 最大的超約費可以先算，不管1循環或2循環
-        penality_result = config_loader.calculate_over_capacity_penalties(
-            df_ami,
-            config["電價方案"]["計費類別"],
-            config_loader.price_dict,
-            config["電價方案"]["契約容量"]["new"],
+        delta_kWh = ledger.get_row(book, "實際可用容量(kWh)") - ledger.get_row(
+            book, "保留容量"
         )
+        # #print('delta_kWh',type(delta_kWh), delta_kWh)
 
-        # 1. 夏月先算，夏月都只有1循環，所以共用，不用區分
-        result_te_summer = calculator.batch_calculate_transfered_energy(
-            df_ami2, delta_kWh, "summer", 損失率, consider_large_consumer
+        # 逐年的每日可轉移電量、用電大戶放電度數與超約費用
+        energy = transferable_energy_by_year(
+            config, ami_context, delta_kWh, consider_large_consumer
         )
+        夏月每日可以轉移度數 = energy["夏月每日可以轉移度數"]
+        非夏月可以轉移度數 = energy["非夏月可以轉移度數"]
+        夏月每日用電大戶放電度數 = energy["夏月每日用電大戶放電度數"]
+        非夏月每日用電大戶放電度數 = energy["非夏月每日用電大戶放電度數"]
+        # 非夏月只有一個高峰時，不分時段、改為1循環
+        config["儲能系統"]["每日最大循環次數"] = energy["每日最大循環次數"]
 
-        夏月每日可以轉移度數 = result_te_summer["可轉移電量"]
-        夏月每日用電大戶放電度數 = result_te_summer["用電大戶義務可轉移電量"]
-
-        # 2. 非夏月再算，考慮兩循環
-        if config["儲能系統"]["每日最大循環次數"] == 1:
-            result_te_not_summer = calculator.batch_calculate_transfered_energy(
-                df_ami2, delta_kWh, "not_summer", 損失率, consider_large_consumer
-            )
-            非夏月可以轉移度數 = result_te_not_summer["可轉移電量"]
-            非夏月每日用電大戶放電度數 = result_te_not_summer["用電大戶義務可轉移電量"]
-
-        elif config["儲能系統"]["每日最大循環次數"] >= 2:
-            # 確認有兩個高峰
-            if (
-                calculator.count_high_peaks(
-                    df_ami[
-                        (df_ami["is_summer"] == 0) & (df_ami["weekday2"] == "Monday")
-                    ].tou_level
-                )
-                == 2
-            ):
-                # time_periods = [('00:00', '10:45'), ('11:00', '23:45')]
-                # 第一循環
-                _, df_ami2_2 = calculator.calculate_transferable_energy(
-                    df_ami_0,
-                    tou_program,
-                    config["電價方案"]["契約容量"]["new"],
-                    config["儲能系統"]["PCS 標稱功率"],
-                    time_periods=[("00:00", "10:45")],
-                )
-                非夏月可以轉移度數_1 = calculator.batch_calculate_transfered_energy(
-                    df_ami2_2, delta_kWh, "not_summer", 損失率
-                )["可轉移電量"]
-
-                max_not_summer_over_2_1 = df_ami2_2[
-                    (df_ami2_2["season"] == "not_summer")
-                ]["超約電量"].max()
-                # print(f"[debug] 非夏月第一時段超約: {max_not_summer_over_2_1} kWh")
-
-                # 第二循環，只有第二循環才會有用電大戶
-                _, df_ami2_2 = calculator.calculate_transferable_energy(
-                    df_ami_0,
-                    tou_program,
-                    config["電價方案"]["契約容量"]["new"],
-                    config["儲能系統"]["PCS 標稱功率"],
-                    time_periods=[("11:00", "23:45")],
-                    consider_large_consumer=consider_large_consumer,
-                )
-                result_te_not_summer_2 = calculator.batch_calculate_transfered_energy(
-                    df_ami2_2, delta_kWh, "not_summer", 損失率, consider_large_consumer
-                )
-                非夏月可以轉移度數_2 = result_te_not_summer_2["可轉移電量"]
-                非夏月每日用電大戶放電度數 = result_te_not_summer_2[
-                    "用電大戶義務可轉移電量"
-                ]
-
-                max_not_summer_over_2_2 = df_ami2_2[
-                    (df_ami2_2["season"] == "not_summer")
-                ]["超約電量"].max()
-                # print(f"[debug] 非夏月第二時段超約: {max_not_summer_over_2_2} kWh")
-
-                # print('非夏月可以轉移度數_1', 非夏月可以轉移度數_1 , '非夏月可以轉移度數_2', 非夏月可以轉移度數_2)
-                非夏月可以轉移度數 = 非夏月可以轉移度數_1 + 非夏月可以轉移度數_2
-
-            # 如果只有一個高峰，則不分時段
-            else:
-                result_te_not_summer = calculator.batch_calculate_transfered_energy(
-                    df_ami2, delta_kWh, "not_summer", 損失率, consider_large_consumer
-                )
-                非夏月可以轉移度數 = result_te_not_summer["可轉移電量"]
-                非夏月每日用電大戶放電度數 = result_te_not_summer[
-                    "用電大戶義務可轉移電量"
-                ]
-                config["儲能系統"]["每日最大循環次數"] = 1
-
-        # 超約費用計算，但通常都是夏月超約比較多，所以通常2循環影響不大
-        if config["儲能系統"]["每日最大循環次數"] == 1:
-            annual_penalty_list = config_loader.calculate_annual_capacity_penalties(
-                delta_kWh,
-                max_summer_over_1,
-                max_not_summer_over_1,
-                penality_result,
-                損失率,
-            )
-        else:
-            # print(f"[debug] 非夏月最大超約: {max(max_not_summer_over_2_1, max_not_summer_over_2_2)} kWh")
-            annual_penalty_list = config_loader.calculate_annual_capacity_penalties(
-                delta_kWh,
-                max_summer_over_1,
-                max(max_not_summer_over_2_1, max_not_summer_over_2_2),
-                penality_result,
-                損失率,
-            )
-
-        df_summary.loc["超約費用"] = annual_penalty_list
+        ledger.set_row(book, "超約費用", energy["超約費用"])
 
         # print('非夏月可以轉移度數', 非夏月可以轉移度數)
         # print(pd.DataFrame({'夏月': 夏月每日可以轉移度數, '非夏月': 非夏月可以轉移度數, '可用容量': delta_kWh.values}))
 
-        # 充電度數 * 充電效率 * 放電效率 = 放電度數
-        # 往返效率 =  放電度數/充電度數 = 充電效率 * 放電效率
-        # 充電效率 = 放電效率 = 往返效率^(1/2)
-
-        # print('用電大戶放電度數_夏月', 夏月每日用電大戶放電度數)
-        # print('用電大戶放電度數_非夏月', 非夏月每日用電大戶放電度數)
-
-        # a. 價差
-        a = (夏月最高電價 - 夏月最低電價) * 夏月天數 * 夏月每日可以轉移度數 + (
-            非夏月最高電價 - 非夏月最低電價
-        ) * 非夏月天數 * 非夏月可以轉移度數
-
-        # b. 充電成本
-        b = (
-            夏月最低電價 * 夏月天數 * 夏月每日可以轉移度數 * 損失率
-            + 非夏月最低電價 * 非夏月天數 * 非夏月可以轉移度數 * 損失率
-        )
-
-        # #print('result', a-b)
         # 直接assign 要小心，沒有index 要加 values，從頭到尾插入
-        df_summary.loc["電價差收益"] = (a - b).values
+        ledger.set_row(
+            book,
+            "電價差收益",
+            arbitrage_revenue(
+                config, 夏月每日可以轉移度數, 非夏月可以轉移度數, 損失率
+            ).values,
+        )
 
         # #print('電價差收益', df_summary.loc["電價差收益"])
 
     if "用電大戶收益" in row_labels:
         # print ('[debug] 用電大戶配合用電', config['再生能源義務用戶']['義務裝置容量'])
         # print('[debug] 方案', lc_mode)
-
-        # print('用電大戶放電度數_夏月', 夏月每日用電大戶放電度數)
-        # print('用電大戶放電度數_非夏月', 非夏月每日用電大戶放電度數)
-        用電大戶放電度數 = (
-            夏月天數 * 夏月每日用電大戶放電度數
-            + 非夏月天數 * 非夏月每日用電大戶放電度數
-        ).round()
-        # print('[debug] 用電大戶放電度數:', 用電大戶放電度數)
-        lc_reduction_fee = [
-            calculator.compute_large_consumer_reduction(
-                config["再生能源義務用戶"]["義務裝置容量"], x, lc_mode
-            )
-            for x in 用電大戶放電度數
-        ]
-        # print('[debug] 用電大戶配合用電:', lc_reduction_fee)
-        df_summary.loc["用電大戶收益"] = lc_reduction_fee
+        ledger.set_row(
+            book,
+            "用電大戶收益",
+            large_consumer_revenue(
+                config, 夏月每日用電大戶放電度數, 非夏月每日用電大戶放電度數, lc_mode
+            ),
+        )
 
     if "日選時段型" in row_labels:
-        delta_kWh = df_summary.loc["實際可用容量(kWh)"] - df_summary.loc["保留容量"]
-
-        # 抑低契約容量 = config['日選時段型']['抑低契約容量']
-
-        抑低契約容量 = []
-        # #print(df_ami2)
-        for avail_kWh in delta_kWh:
-            _, dr_kw = calculator.calculate_dr_capacity(
-                df_ami,
-                df_ami2,
-                config["日選時段型"]["開始時段"],
-                config["日選時段型"]["結束時段"],
-                config["日選時段型"]["執行時數"],
-                avail_kWh * np.sqrt(1 - 損失率),
-            )
-            抑低契約容量.append(dr_kw)
-
-        抑低契約容量 = pd.Series(抑低契約容量)
-        # #print('抑低契約容量', 抑低契約容量)
-
-        當日執行率 = config["日選時段型"]["當日執行率"]
-        執行時數 = config["日選時段型"]["執行時數"]
-        扣減電價 = config["日選時段型"]["流動電費扣減費率"]
-        扣減倍率 = config["日選時段型"]["扣減比率"]
-        可參與天數 = config["日選時段型"]["5月-10月可參與天數"]
-
-        日選收益 = (
-            抑低契約容量
-            * 當日執行率
-            * 執行時數
-            * 扣減電價
-            * 扣減倍率
-            * 可參與天數
-            / 10000
+        delta_kWh = ledger.get_row(book, "實際可用容量(kWh)") - ledger.get_row(
+            book, "保留容量"
+        )
+        ledger.set_row(
+            book,
+            "日選時段型",
+            dr_revenue(config, ami_context, delta_kWh, 損失率, consider_large_consumer),
         )
-        # #print('日選收益', 日選收益)
-        # df_summary.loc["日選時段型"] = [round(日選收益, 2)] * years
-        df_summary.loc["日選時段型"] = 日選收益.values
 
     if "輔助服務價金" in row_labels:
-        效能價格 = config["即時備轉"]["1級效能價格"]
-        容量價格 = config["即時備轉"]["容量價格"]
-        # 每日參與時數 = 24
-        日選執行時數 = config["日選時段型"]["執行時數"]
-        # 僅輔助日 = config['可參與輔助服務時數']['僅參與輔助服務天數']
-        # 同時輔助日 = config['可參與輔助服務時數']['日選時段同時參與天數']
-        得標比例 = config["即時備轉"]["得標容量比例"] / 100
-        折扣比例 = config["即時備轉"]["折扣比例"] / 100
-
-        # 聚合後折扣 = config['可參與輔助服務時數']['聚合後收益折扣'] / 100
-        # 大於1000比例 = config['可參與輔助服務時數']['大於1000kW比例'] / 100
-        每月觸發次數 = config["即時備轉"]["每月觸發次數"]
-        日前電價 = config["即時備轉"]["日前電能邊際價格"]
-
-        # 1MW以上才可以投標
-        if is_aggregation:
-            投標容量 = config["即時備轉"]["投標容量"]
-        else:
-            if config["即時備轉"]["投標容量"] < 1000:
-                投標容量 = 0
-            else:
-                投標容量 = config["即時備轉"]["投標容量"]
-
-        不可投標天數 = config["可參與輔助服務時數"]["不可投標天數"]
-
-        # 先把歲修排在非工作日
-        非工作日 = 365 - 夏月天數 - 非夏月天數 - 不可投標天數
-        # 日選執行時數 = config['日選時段型']['執行時數']
-
-        輔助服務價金 = []
-        # #print(df_ami)
-
-        for avail_kWh in delta_kWh:
-            df_ami_weekend = df_ami[df_ami["weekday"] != "week"].copy()
-            df_ami_week = df_ami[df_ami["weekday"] == "week"].copy()
-
-            # 非工作日的特徵
-            series_ami_weekend = calculator.spining_weekend_load_kw_stats(
-                df_ami_weekend, config["儲能系統"]["PCS 標稱功率"]
-            )
-            # #print('series_ami_weekend', series_ami_weekend)
-            # 工作日的特徵，但區分夏月跟非夏月
-            df_ami_week2 = calculator.compute_spinning_summary(
-                df_ami_week, config["儲能系統"]["PCS 標稱功率"], avail_kWh
-            )
-
-            # print('df_ami_week2', df_ami_week2)
-
-            sp_total_single, sp_total_agg = calculator.compute_total_spinning_gain_sum(
-                series_ami_weekend,
-                df_ami_week2,
-                非工作日,
-                夏月天數,
-                非夏月天數,
-                容量價格,
-                效能價格,
-                日選執行時數,
+        ledger.set_row(
+            book,
+            "輔助服務價金",
+            spinning_revenue(
+                config,
+                ami_context,
+                delta_kWh,
                 cycles,
-            )
-            # print('sp_total_single', sp_total_single, sp_total_agg)
-            if is_aggregation:
-                輔助服務價金.append(sp_total_agg)
-            else:
-                # 單一案場投標量 小於1000kW，不能參加
-                if 投標容量 < 1000:
-                    輔助服務價金.append(0)
-                else:
-                    輔助服務價金.append(sp_total_single)
-
-        # a = (
-        #     (效能價格 + 容量價格) * (每日參與時數 - 2) * 僅輔助日 +
-        #     (效能價格 + 容量價格) * (每日參與時數 - 2 - 日選執行時數) * 同時輔助日
-        # ) * 投標容量 / 1000 * 得標比例 * 折扣比例
-
-        b = 每月觸發次數 * 日前電價 * 12 * 投標容量 / 1000
-
-        # #print(輔助服務價金)
-        輔助服務價金 = pd.Series(輔助服務價金) * 得標比例 * 折扣比例
-        輔助服務價金 = 輔助服務價金 + b
-        # #print(輔助服務價金)
-        # #print('b:',b)
-
-        # 輔助服務價金 = (a + b) * 聚合後折扣 * 大於1000比例
-        df_summary.loc["輔助服務價金"] = 輔助服務價金.values
-
-    if "自定義收益" in row_labels:
-        # 這裡可以加入自定義收益的計算邏輯
-        # 例如：df_summary.loc["自定義收益"] = [1000] * years
-        df_summary.loc["自定義收益"] = [
-            config["自定義收益(年收/省)"]["自定義收益"]
-        ] * years
-
-    # === 小計總收入 ===
-    income_rows = [
-        "降契約容量收益",
-        "電價差收益",
-        "日選時段型",
-        "輔助服務價金",
-        "用電大戶收益",
-        "自定義收益",
-    ]
-    total_income = sum(
-        df_summary.loc[row] for row in income_rows if row in df_summary.index
-    )
-    df_summary.loc["總收入"] = total_income
-
-    # === 支出部分 ===
-    if "土地租金" in row_labels:
-        土地租金單價 = config["維運成本(年繳)"]["土地年租金"]
-        df_summary.loc["土地租金"] = [儲能容量 * 土地租金單價] * years
-
-    if "保險費用" in row_labels:
-        保險費率 = config["維運成本(年繳)"]["保險費率"]
-        df_summary.loc["保險費用"] = [
-            config["建置成本(第0年繳)"]["儲能設備"] * 保險費率 / 100
-        ] * years
-
-    if "維運+監控EMS費用" in row_labels:
-        維運成本 = config["維運成本(年繳)"]["案場維運成本"]
-        EMS維運成本 = config["維運成本(年繳)"]["EMS維運成本"]
-        其他固定成本 = config["維運成本(年繳)"]["其他固定成本"]
-        # 只有即時備轉才需要電力交易費用
-        if "regulation" in mode:
-            電力交易費用 = config["維運成本(年繳)"]["電力交易雲端平台"]
-        else:
-            電力交易費用 = 0
+                is_aggregation,
+                consider_large_consumer,
+            ),
+        )
 
-        # TODO: 維運成本 kW or kWh 計價
-        df_summary.loc["維運+監控EMS費用"] = (
-            [維運成本 + EMS維運成本 + 電力交易費用 + 其他固定成本]
-        ) * years
+    # 建置、維運與融資相關的行（與 AMI、可用容量無關）
+    financing = financing_rows(config, mode, years)
+    for label in FINANCING_ROWS:
+        if label in row_labels:
+            ledger.set_row(book, label, financing[label])
 
     if "聚合分潤比例" in row_labels:
         聚合分潤比例 = config["聚合分潤"]["聚合分潤比例"] / 100
         if is_aggregation:
-            df_summary.loc["聚合分潤比例"] = (
-                df_summary.loc["輔助服務價金"] * 聚合分潤比例
+            ledger.set_row(
+                book,
+                "聚合分潤比例",
+                ledger.get_row(book, "輔助服務價金") * 聚合分潤比例,
             )
         else:
-            df_summary.loc["聚合分潤比例"] = df_summary.loc["輔助服務價金"] * 0
-
-    if "利息費用" in row_labels:
-        建置成本 = (
-            config["建置成本(第0年繳)"]["儲能設備"]
-            + config["建置成本(第0年繳)"]["儲能設備安裝"]
-            + config["建置成本(第0年繳)"]["高壓設備"]
-            + config["建置成本(第0年繳)"]["高壓設備安裝"]
-            + config["建置成本(第0年繳)"]["設計/監造/簽證費用"]
-            + config["建置成本(第0年繳)"]["其他"]
-            + config["建置成本(第0年繳)"]["EMS"]
-        )
-
-        貸款成數 = config["融資成本"]["貸款成數"] / 100
-
-        if 貸款成數 <= 0:
-            # 如果貸款成數為0，則不計算利息費用
-            df_summary.loc["利息費用"] = [0] * years
-        else:
-            利率 = config["融資成本"]["利息費用"] / 100
-            # 利率為0, 輸出錯誤
-            if 利率 <= 0:
-                raise ValueError("利率必須大於0")
-
-            年限 = config["融資成本"]["攤還年限"]
-
-            貸款金額 = 建置成本 * 貸款成數
-            年本息 = calculator.loan_pmt_per_year(貸款金額, 年限, 利率)
-            貸款支出 = [年本息] * min(年限, years) + [0] * max(0, years - 年限)
-
-            df_summary.loc["利息費用"] = 貸款支出
-
-    # === 小計總支出 ===
-    expense_rows = [
-        "超約費用",
-        "土地租金",
-        "保險費用",
-        "維運+監控EMS費用",
-        "聚合分潤比例",
-        "利息費用",
-    ]
-    total_expense = sum(
-        df_summary.loc[row] for row in expense_rows if row in df_summary.index
-    )
-    total_expense_ex_interest = sum(
-        df_summary.loc[row]
-        for row in expense_rows
-        if row in df_summary.index and row != "利息費用"
-    )
-
-    df_summary.loc["總支出"] = total_expense
-    df_summary.loc["總支出(不含利息)"] = total_expense_ex_interest
+            ledger.set_row(
+                book, "聚合分潤比例", ledger.get_row(book, "輔助服務價金") * 0
+            )
 
-    # === Net Cash ===
-    df_summary.loc["Net Cash"] = df_summary.loc["總收入"] - df_summary.loc["總支出"]
+    # === 小計總收入、總支出與 Net Cash ===
+    ledger.set_totals(book)
 
     # 更新config 的 電價試算結果
 
@@ -648,7 +763,8 @@ def generate_summary(
     )
 
     total_base_fee_saving = (
-        df_summary.loc["降契約容量收益"].mean() - df_summary.loc["超約費用"].mean()
+        ledger.get_row(book, "降契約容量收益").mean()
+        - ledger.get_row(book, "超約費用").mean()
     )
 
     config["電價試算"]["應用儲能"]["年基本電費"] = (
@@ -656,9 +772,9 @@ def generate_summary(
     )
 
     total_fee_saving = sum(
-        df_summary.loc[row].mean()
+        ledger.get_row(book, row).mean()
         for row in ["電價差收益", "日選時段型", "用電大戶收益"]
-        if row in df_summary.index
+        if ledger.has_row(book, row)
     )
 
     config["電價試算"]["應用儲能"]["年流動電費"] = round(
@@ -674,42 +790,20 @@ def generate_summary(
         2,
     )
 
-    # #print("Summary DataFrame:")
-    # #print(df_summary)
-
-    # === ROI/IRR ===
-    淨現金總和 = df_summary.loc["Net Cash"].sum()
-    自備資金 = 建置成本 * (1 - 貸款成數)
-
     # === 處理 Year 0 ===
-    df_summary.insert(0, "Year 0", np.nan)  # 先填 0
-    # 1. 與 Year 1 相同的欄位
-    copy_rows = ["建置容量(kWh)", "實際可用容量(kWh)", "投標容量", "保留容量"]
-    for row in copy_rows:
-        if row in df_summary.index:
-            df_summary.at[row, "Year 0"] = df_summary.at[row, "Year 1"]
-
-    # 2. 自備資金支出與淨現金流
-    df_summary.at["總支出", "Year 0"] = 自備資金
-    df_summary.at["總支出(不含利息)", "Year 0"] = 自備資金
-    df_summary.at["Net Cash", "Year 0"] = -自備資金
-
-    # print(f"[debug] 淨現金總和: {淨現金總和:.2f}")
-    # print(f"[debug] 自備資金: {自備資金:.2f}")
-
-    ROI = (淨現金總和 - 自備資金) / 自備資金
-    # cash_flows = [-自備資金] + df_summary.loc["Net Cash"].tolist()
-    cash_flows = df_summary.loc["Net Cash"].tolist()
-    IRR = npf.irr(cash_flows)
-
-    # Annual_ROI = (1 + ROI) ** (1/years) - 1
-    # 出現-1時，其實表示全部賠光，計算可能就沒意義，所以報錯
-    if ROI > -1:
-        Annual_ROI = (1 + ROI) ** (1 / years) - 1
-    else:
-        Annual_ROI = float("nan")  # 或者直接設為 0、或顯示錯誤訊息
+    # 容量相關的行與 Year 1 相同；自備資金列為支出與負的淨現金流
+    ledger.set_year0(book, financing["自備資金"])
 
-    Average_ROI = ROI / years
+    # === ROI/IRR ===
+    # 與批次試算共用 financial_metrics（Year 0 ~ Year N 的 Net Cash）
+    metrics = financial_metrics.compute_financial_metrics(
+        ledger.get_row(book, "Net Cash", include_year0=True)
+    )
+    ROI = metrics["ROI"][0]
+    IRR = metrics["IRR"][0]
+    # 出現-1時，其實表示全部賠光，Annual_ROI 為 NaN
+    Annual_ROI = metrics["Annual_ROI"][0]
+    Average_ROI = metrics["Average_ROI"][0]
 
     # 顯示
     # #print(f"ROI: {ROI:.2%}")
@@ -717,25 +811,31 @@ def generate_summary(
     # #print(f"Annual ROI: {Annual_ROI:.2%}")
     # #print(f"Average ROI: {Average_ROI:.2%}")
 
-    return df_summary, ROI, IRR, Annual_ROI, Average_ROI
+    return ledger.to_frame(book), ROI, IRR, Annual_ROI, Average_ROI
 
 
 # dr_program: '0h', '1h', '2h', '3h', '4h', '5h', '6h', '7h', '8h'
 # sp_program: 'single', 'agg'
 
 
-def run_simulation(
-    config,
-    unit,
-    df_ami,
-    mode="energy_only",
-    dr_program=None,
-    sp_program=None,
-    lc_program=None,
-    year=15,
+# 有即時備轉的模式
+REGULATION_MODES = ("energy_regulation", "energy_dr_regulation")
+
+
+def is_aggregation_scenario(mode, sp_program):
+    """即時備轉以聚合 ('agg') 投標；只有有即時備轉的模式才算"""
+    return mode in REGULATION_MODES and sp_program == "agg"
+
+
+def is_large_consumer_scenario(lc_program):
+    """是否參與用電大戶方案（義務時數型、累進回饋型）"""
+    return lc_program in ["義務時數型", "累進回饋型"]
+
+
+def configure_scenario(
+    config, unit, mode, dr_program=None, sp_program=None, lc_program=None
 ):
-    start_time = time.time()
-    print("DEBUG: [run_simulation]")
+    """設定台數與各方案，並以 update_config 重算衍生欄位"""
     config["儲能系統"]["台數"] = unit
 
     if mode == "energy_dr":
@@ -762,29 +862,35 @@ def run_simulation(
         ], "用電大戶方案需為 '義務時數型' 或 '累進回饋型'"
         config["日選時段型"]["執行方案"] = "0h"
 
-    config = config_loader.update_config(config)
+    return config_loader.update_config(config)
+
+
+def run_simulation(
+    config,
+    unit,
+    df_ami,
+    mode="energy_only",
+    dr_program=None,
+    sp_program=None,
+    lc_program=None,
+    year=15,
+    ami_context=None,
+):
+    start_time = time.time()
+    print("DEBUG: [run_simulation]")
+    config = configure_scenario(config, unit, mode, dr_program, sp_program, lc_program)
     # df_ami = config_loader.norm_ami(df_ami_raw, df_tou_2025, ID, config['電價方案']['計費類別'])
 
-    if (mode == "energy_dr_regulation") | (mode == "energy_regulation"):
-        df_summary, ROI, IRR, Annual_ROI, Average_ROI = generate_summary(
-            config,
-            df_ami,
-            mode=mode,
-            years=year,
-            include_contract_saving=False,
-            is_aggregation=(sp_program == "agg"),
-            lc_mode=lc_program,
-        )
-    else:
-        df_summary, ROI, IRR, Annual_ROI, Average_ROI = generate_summary(
-            config,
-            df_ami,
-            mode=mode,
-            years=year,
-            include_contract_saving=False,
-            is_aggregation=False,
-            lc_mode=lc_program,
-        )
+    df_summary, ROI, IRR, Annual_ROI, Average_ROI = generate_summary(
+        config,
+        df_ami,
+        mode=mode,
+        years=year,
+        include_contract_saving=False,
+        is_aggregation=is_aggregation_scenario(mode, sp_program),
+        lc_mode=lc_program,
+        ami_context=ami_context,
+    )
 
     result = {
         "台數": unit,
@@ -823,97 +929,375 @@ def run_and_store(mode_key, 台數, df, results, mode, dict_summary, gain, confi
     dict_summary[(台數, mode_key)] = {"df": df, "config": copy.deepcopy(config)}
 
 
-def simulate_energy_only(台數選項, config, df_ami, year, results, mode, dict_summary):
-    for 台數 in 台數選項:
-        gain, df = run_simulation(
-            config=config, unit=台數, df_ami=df_ami, mode="energy_only", year=year
-        )
-        run_and_store("電價套利", 台數, df, results, mode, dict_summary, gain, config)
+def _scenario(mode_key, 台數, mode, dr_program=None, sp_program=None, lc_program=None):
+    return {
+        "mode_key": mode_key,
+        "台數": 台數,
+        "mode": mode,
+        "dr_program": dr_program,
+        "sp_program": sp_program,
+        "lc_program": lc_program,
+    }
 
 
-def simulate_lc(
-    台數選項, 用電大戶方案, config, df_ami, year, results, mode, dict_summary
-):
-    for 台數, 方案 in product(台數選項, 用電大戶方案):
-        gain, df = run_simulation(
-            config=config,
-            unit=台數,
-            df_ami=df_ami,
-            mode="energy_lc",
-            lc_program=方案,
-            year=year,
+def plan_energy_only(台數選項):
+    return [_scenario("電價套利", 台數, "energy_only") for 台數 in 台數選項]
+
+
+def plan_lc(台數選項, 用電大戶方案):
+    return [
+        _scenario(f"電價套利-{方案}", 台數, "energy_lc", lc_program=方案)
+        for 台數, 方案 in product(台數選項, 用電大戶方案)
+    ]
+
+
+def plan_dr(台數選項, dr方案選項):
+    return [
+        _scenario(f"電價套利-日選{dr方案}", 台數, "energy_dr", dr_program=dr方案)
+        for 台數, dr方案 in product(台數選項, dr方案選項)
+    ]
+
+
+def plan_sp(台數選項, sp方案選項):
+    plan = []
+    for 台數, sp方案 in product(台數選項, sp方案選項):
+        sp_str = "單一" if sp方案 == "single" else "聚合"
+        plan.append(
+            _scenario(
+                f"電價套利-即時{sp_str}",
+                台數,
+                "energy_regulation",
+                dr_program="0h",
+                sp_program=sp方案,
+            )
         )
-        run_and_store(
-            f"電價套利-{方案}", 台數, df, results, mode, dict_summary, gain, config
+    return plan
+
+
+def plan_dr_sp(台數選項, dr方案選項, sp方案選項):
+    plan = []
+    for 台數, dr方案, sp方案 in product(台數選項, dr方案選項, sp方案選項):
+        sp_str = "單一" if sp方案 == "single" else "聚合"
+        plan.append(
+            _scenario(
+                f"電價套利-日選{dr方案}-即時{sp_str}",
+                台數,
+                "energy_dr_regulation",
+                dr_program=dr方案,
+                sp_program=sp方案,
+            )
         )
+    return plan
 
 
-def simulate_dr(
-    台數選項, dr方案選項, config, df_ami, year, results, mode, dict_summary
-):
-    for 台數, dr方案 in product(台數選項, dr方案選項):
-        gain, df = run_simulation(
-            config=config,
-            unit=台數,
-            df_ami=df_ami,
-            mode="energy_dr",
-            dr_program=dr方案,
-            year=year,
+def build_scenario_plan(台數選項, dr方案選項, 即時備轉方案選項, 用電大戶方案):
+    """
+    列出所有要試算的情境（依 plan_* 的順序）。
+
+    Returns:
+        list[dict]: 每個情境為
+            {'mode_key', '台數', 'mode', 'dr_program', 'sp_program', 'lc_program'}
+    """
+    dr有值 = bool(dr方案選項)
+    sp有值 = bool(即時備轉方案選項)
+    lc有值 = bool(用電大戶方案)
+
+    # 共用 energy_only
+    plan = plan_energy_only(台數選項)
+
+    # 1.A 只有lc
+    if lc有值 and not dr有值 and not sp有值:
+        plan += plan_lc(台數選項, 用電大戶方案)
+    # 1.B 只有dr
+    if dr有值 and not sp有值 and not lc有值:
+        plan += plan_dr(台數選項, dr方案選項)
+    # 1.C 只有即時備轉
+    if not dr有值 and sp有值 and not lc有值:
+        plan += plan_sp(台數選項, 即時備轉方案選項)
+    # 2.A  DR + 即時備轉方案
+    if dr有值 and sp有值 and not lc有值:
+        plan += plan_dr(台數選項, dr方案選項)
+        plan += plan_sp(台數選項, 即時備轉方案選項)
+        plan += plan_dr_sp(台數選項, dr方案選項, 即時備轉方案選項)
+    # 2.B  DR + 用電大戶方案
+    if dr有值 and not sp有值 and lc有值:
+        plan += plan_dr(台數選項, dr方案選項)
+        plan += plan_lc(台數選項, 用電大戶方案)
+    # 2.C  即時備轉 + 用電大戶方案
+    if not dr有值 and sp有值 and lc有值:
+        plan += plan_sp(台數選項, 即時備轉方案選項)
+        plan += plan_lc(台數選項, 用電大戶方案)
+    # 3. 全部
+    if dr有值 and sp有值 and lc有值:
+        plan += plan_lc(台數選項, 用電大戶方案)
+        plan += plan_dr(台數選項, dr方案選項)
+        plan += plan_sp(台數選項, 即時備轉方案選項)
+        plan += plan_dr_sp(台數選項, dr方案選項, 即時備轉方案選項)
+
+    return plan
+
+
+def run_scenario(config, df_ami, scenario, year, ami_context=None):
+    """
+    執行單一情境。config 會先 deepcopy，情境之間互不影響，可以平行執行。
+    ami_context 為同一 sweep 共用的 AMI 分析 context（見 ami_analysis）。
+
+    Returns:
+        tuple: (gain, df_summary, config)
+    """
+    return run_simulation(
+        config=copy.deepcopy(config),
+        unit=scenario["台數"],
+        df_ami=df_ami,
+        mode=scenario["mode"],
+        dr_program=scenario["dr_program"],
+        sp_program=scenario["sp_program"],
+        lc_program=scenario["lc_program"],
+        year=year,
+        ami_context=ami_context,
+    )
+
+
+def prepare_ami_context(ami_context, config, plan):
+    """
+    在主程序先算好 plan 各情境會用到的 ami_context 快取（依各情境的 PCS 標稱功率），
+    process pool 的 worker 收到的 context 已填好，不必各自重算。
+    """
+    for scenario in plan:
+        scenario_config = configure_scenario(
+            copy.deepcopy(config),
+            scenario["台數"],
+            scenario["mode"],
+            scenario["dr_program"],
+            scenario["sp_program"],
+            scenario["lc_program"],
         )
-        run_and_store(
-            f"電價套利-日選{dr方案}",
-            台數,
-            df,
-            results,
-            mode,
-            dict_summary,
-            gain,
-            config,
+        pcs_max_kW = scenario_config["儲能系統"]["PCS 標稱功率"]
+        consider_large_consumer = is_large_consumer_scenario(scenario["lc_program"])
+
+        ami_analysis.get_transferable_energy(
+            ami_context, pcs_max_kW, ami_analysis.FULL_DAY, consider_large_consumer
+        )
+        ami_analysis.get_slot_cube(ami_context, pcs_max_kW)
+        ami_analysis.get_over_capacity_penalties(
+            ami_context, pcs_max_kW, consider_large_consumer
         )
+        # 非夏月兩循環時分兩個時段計算（同 transferable_energy_by_year）
+        if (
+            scenario_config["儲能系統"]["每日最大循環次數"] >= 2
+            and ami_analysis.get_not_summer_high_peaks(ami_context) == 2
+        ):
+            ami_analysis.get_transferable_energy(
+                ami_context, pcs_max_kW, [("00:00", "10:45")]
+            )
+            ami_analysis.get_transferable_energy(
+                ami_context, pcs_max_kW, [("11:00", "23:45")], consider_large_consumer
+            )
+        if scenario["mode"] in ("energy_dr", "energy_dr_regulation"):
+            ami_analysis.get_dr_window_stats(
+                ami_context,
+                pcs_max_kW,
+                scenario_config["日選時段型"]["開始時段"],
+                scenario_config["日選時段型"]["結束時段"],
+                consider_large_consumer,
+            )
+        if scenario["mode"] in ("energy_regulation", "energy_dr_regulation"):
+            ami_analysis.get_spinning_stats(
+                ami_context, pcs_max_kW, consider_large_consumer
+            )
+    return ami_context
 
 
-def simulate_sp(
-    台數選項, sp方案選項, config, df_ami, year, results, mode, dict_summary
-):
-    for 台數, sp方案 in product(台數選項, sp方案選項):
-        sp_str = "單一" if sp方案 == "single" else "聚合"
-        gain, df = run_simulation(
-            config=config,
-            unit=台數,
-            df_ami=df_ami,
-            mode="energy_regulation",
-            dr_program="0h",
-            sp_program=sp方案,
-            year=year,
+# process pool 的 worker 只在初始化時收一次 config / df_ami，避免每個情境都重新序列化
+_worker_context = {}
+
+
+def _init_scenario_worker(config, df_ami, year, ami_context):
+    _worker_context["config"] = config
+    _worker_context["df_ami"] = df_ami
+    _worker_context["year"] = year
+    _worker_context["ami_context"] = ami_context
+
+
+def _run_scenario_in_worker(scenario):
+    return run_scenario(
+        _worker_context["config"],
+        _worker_context["df_ami"],
+        scenario,
+        _worker_context["year"],
+        _worker_context["ami_context"],
+    )
+
+
+def _create_process_pool(max_workers, config, df_ami, year, ami_context):
+    """
+    建立共用 config / df_ami / ami_context 的 process pool；
+    環境不支援（如 AWS Lambda 沒有 /dev/shm）時回傳 None。
+    """
+    try:
+        return ProcessPoolExecutor(
+            max_workers=max_workers,
+            initializer=_init_scenario_worker,
+            initargs=(config, df_ami, year, ami_context),
         )
-        run_and_store(
-            f"電價套利-即時{sp_str}",
-            台數,
-            df,
-            results,
-            mode,
-            dict_summary,
-            gain,
-            config,
+    except (OSError, NotImplementedError) as e:
+        print(f"[debug] 無法使用 process pool ({e})，改用 thread pool")
+        return None
+
+
+def _map_in_process_pool(pool, plan):
+    """
+    以 _create_process_pool 建立的 pool 試算 plan；worker 異常結束或參數無法序列化時
+    回傳 None，由呼叫端改用 thread pool 重跑。情境本身拋出的錯誤不在此列，直接往外拋。
+    """
+    try:
+        return list(pool.map(_run_scenario_in_worker, plan))
+    except (BrokenProcessPool, pickle.PicklingError) as e:
+        print(f"[debug] process pool 無法完成試算 ({e!r})，改用 thread pool")
+        return None
+
+
+def execute_scenario_plan(
+    plan, config, df_ami, year, max_workers=None, executor="process", ami_context=None
+):
+    """
+    執行 build_scenario_plan 產生的所有情境，回傳與 plan 同順序的
+    [(gain, df_summary, config), ...]。
+
+    Parameters:
+        max_workers: 平行數，None 時為 CPU 數；1 或只有一個情境時直接依序執行
+        executor: 'process' 或 'thread'。環境不支援 process pool（如 AWS Lambda
+            沒有 /dev/shm）時自動改用 thread pool
+    """
+    if executor not in ("process", "thread"):
+        raise ValueError(f"executor 需為 'process' 或 'thread'，實際為 {executor}")
+
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+    max_workers = min(max_workers, len(plan))
+
+    if max_workers <= 1:
+        return [
+            run_scenario(config, df_ami, scenario, year, ami_context)
+            for scenario in plan
+        ]
+
+    if executor == "process":
+        # worker 只收到 context 的副本，先在主程序填好快取，避免每個 worker 重算
+        if ami_context is not None:
+            prepare_ami_context(ami_context, config, plan)
+        pool = _create_process_pool(max_workers, config, df_ami, year, ami_context)
+        if pool is not None:
+            with pool:
+                outputs = _map_in_process_pool(pool, plan)
+            if outputs is not None:
+                return outputs
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        return list(
+            pool.map(
+                lambda scenario: run_scenario(
+                    config, df_ami, scenario, year, ami_context
+                ),
+                plan,
+            )
         )
 
 
-def simulate_dr_sp(
-    台數選項, dr方案選項, sp方案選項, config, df_ami, year, results, mode, dict_summary
+def search_scenario_units(
+    config,
+    df_ami,
+    plan,
+    max_units,
+    year,
+    seeds=None,
+    objective="IRR",
+    discount_rate=None,
+    max_workers=None,
+    executor="process",
+    ami_context=None,
 ):
-    for 台數, dr方案, sp方案 in product(台數選項, dr方案選項, sp方案選項):
-        sp_str = "單一" if sp方案 == "single" else "聚合"
-        mode_key = f"電價套利-日選{dr方案}-即時{sp_str}"
-        gain, df = run_simulation(
-            config=config,
-            unit=台數,
-            df_ami=df_ami,
-            mode="energy_dr_regulation",
-            dr_program=dr方案,
-            sp_program=sp方案,
-            year=year,
+    """
+    以黃金分割搜尋各模式組合在 1 ~ max_units 台中的最佳台數（見 unit_search）。
+    同一輪各模式需要的台數一次平行試算（整個搜尋共用同一個 pool），試算過的不再重算。
+
+    Parameters:
+        plan: build_scenario_plan 產生的情境，每個 mode_key 取第一個當模板（台數會被取代）
+        seeds: 先試算的台數（如 generate_fixed_step_combinations 的格點），決定初始區間
+        objective: 'IRR'，或 'NPV'（以 discount_rate 折現 Net Cash）
+
+    Returns:
+        tuple: (best_plan, outputs, evaluations)
+            best_plan 為各模式最佳台數的情境，outputs 為與其同順序的 (gain, df_summary, config)，
+            evaluations 為 {mode_key: 試算次數}
+    """
+    if executor not in ("process", "thread"):
+        raise ValueError(f"executor 需為 'process' 或 'thread'，實際為 {executor}")
+    if objective not in ("IRR", "NPV"):
+        raise ValueError(f"objective 需為 'IRR' 或 'NPV'，實際為 {objective}")
+    if objective == "NPV" and discount_rate is None:
+        raise ValueError("objective 為 'NPV' 時需提供 discount_rate")
+
+    templates = {}
+    for scenario in plan:
+        templates.setdefault(scenario["mode_key"], scenario)
+
+    # 整個搜尋共用同一個 process pool（每輪重建 pool 的成本比試算本身還高），
+    # worker 的 ami_context 快取也跨輪保留；起始格點與兩端的台數先在主程序填好
+    pool = None
+    if executor == "process" and min(max_workers or os.cpu_count() or 1, max_units) > 1:
+        if ami_context is not None:
+            seed_units = {units for units in seeds or [] if 1 <= units <= max_units}
+            prepare_ami_context(
+                ami_context,
+                config,
+                [
+                    dict(template, 台數=units)
+                    for template in templates.values()
+                    for units in sorted(seed_units | {1, max_units})
+                ],
+            )
+        pool = _create_process_pool(max_workers, config, df_ami, year, ami_context)
+
+    outputs = {}
+
+    def evaluate(requests):
+        nonlocal pool
+        scenarios = [dict(templates[key], 台數=units) for key, units in requests]
+        batch = None
+        if pool is not None:
+            batch = _map_in_process_pool(pool, scenarios)
+            if batch is None:
+                pool.shutdown()
+                pool = None
+        if batch is None:
+            batch = execute_scenario_plan(
+                scenarios,
+                config,
+                df_ami,
+                year,
+                max_workers=max_workers,
+                executor="thread",
+                ami_context=ami_context,
+            )
+        outputs.update(zip(requests, batch))
+        if objective == "IRR":
+            return [gain["IRR"] for gain, _, _ in batch]
+        net_cash = np.array([df.loc["Net Cash"].to_numpy() for _, df, _ in batch])
+        return financial_metrics.npv(net_cash, discount_rate)
+
+    try:
+        best = unit_search.golden_section_search(
+            list(templates), 1, max_units, evaluate, seeds=seeds
         )
-        run_and_store(mode_key, 台數, df, results, mode, dict_summary, gain, config)
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+    best_plan = [dict(templates[key], 台數=best[key]["台數"]) for key in templates]
+    best_outputs = [outputs[(key, best[key]["台數"])] for key in templates]
+    evaluations = {key: len(best[key]["evaluations"]) for key in templates}
+    return best_plan, best_outputs, evaluations
 
 
 # 這個函式會執行所有的模擬，並回傳結果
@@ -941,7 +1325,16 @@ def run_all_simulations(
     即時備轉方案選項=["single", "agg"],
     用電大戶方案=["義務時數型"],
     year=15,
+    max_workers=None,
+    executor="process",
+    sizing_search=None,
+    discount_rate=None,
 ):
+    """
+    sizing_search 為 None 時依 units（未提供時為 generate_fixed_step_combinations 的格點）
+    試算所有台數；為 'IRR' 或 'NPV' 時改以 search_scenario_units 搜尋各模式組合的最佳台數，
+    df_results 每個模式組合只有最佳台數一列，並多一欄「評估次數」。
+    """
     # === input 檢查 ===
     if not isinstance(ID, (int, str)):
         raise ValueError(f"ID 格式錯誤，應為 int 或 str，實際為 {type(ID)}")
@@ -998,6 +1391,16 @@ def run_all_simulations(
 
     if not isinstance(year, int) or year <= 0:
         raise ValueError("year 格式錯誤，應為正整數")
+    if max_workers is not None and (
+        not isinstance(max_workers, int) or max_workers <= 0
+    ):
+        raise ValueError("max_workers 格式錯誤，應為正整數或 None")
+    if sizing_search not in (None, "IRR", "NPV"):
+        raise ValueError("sizing_search 格式錯誤，應為 'IRR'、'NPV' 或 None")
+    if sizing_search is not None and units is not None:
+        raise ValueError("sizing_search 模式會自行搜尋台數，units 需為 None")
+    if sizing_search == "NPV" and not isinstance(discount_rate, (int, float)):
+        raise ValueError("sizing_search 為 'NPV' 時 discount_rate 應為數字")
 
     results = []
     mode = []
@@ -1058,59 +1461,72 @@ def run_all_simulations(
         config["再生能源義務用戶"]["義務裝置容量"] = 0
         用電大戶方案 = []
 
-    # 依據手動曲線更新，如果有的話，直接照著更新的曲線來縮放 AMI 數據，否則照契約容量縮放
-    # 原始資料是15分鐘，負載生成跟手拉是小時資料，所以需要縮放
-    if (json_ami_hourly_update is not None) and (len(json_ami_hourly_update) > 0):
-        print("[debug] 2. 使用手動曲線更新縮放 AMI 數據")
-
-        # 重新连接到 SQLite 数据库
-        conn = sqlite3.connect(get_ami_db_path())
-
-        # 查询 'ID'
-        query = "SELECT * FROM week_all WHERE ID = " + str(ID)
-        df_ami_raw = pd.read_sql(query, conn)
-        # 关闭数据库连接
-        conn.close()
-        df_ami_raw["variable"] = pd.to_datetime(
-            df_ami_raw["variable"], format="%H:%M:%S.%f"
-        ).dt.strftime("%H:%M")
-
-        df_ami_raw = config_loader.scale_15min_by_hour(
-            df_ami_raw, json_ami_hourly_update
-        )
-    elif (json_ami_15min is not None) and (len(json_ami_15min) > 0):
-        print("[debug] 3. 使用手動曲線更新縮放 AMI 數據")
-        df_ami_raw = config_loader.ami_15min_json_to_df(json_ami_15min)
+    def build_df_ami():
+        # 依據手動曲線更新，如果有的話，直接照著更新的曲線來縮放 AMI 數據，否則照契約容量縮放
+        # 原始資料是15分鐘，負載生成跟手拉是小時資料，所以需要縮放
+        if (json_ami_hourly_update is not None) and (len(json_ami_hourly_update) > 0):
+            print("[debug] 2. 使用手動曲線更新縮放 AMI 數據")
 
-    else:
-        # 依據輸入契約容量，縮放 AMI 數據，直接用最大負載作為契約容量，與負載生成時一樣
-        # origin_capacity = int(df_ami_raw["value"].max().round() / 0.9)
-        print("[debug] 1. 使用契約容量縮放 AMI 數據")
-        start_time = time.time()
-        print("DEBUG: start reading ami db")
-        # 重新连接到 SQLite 数据库
-        conn = sqlite3.connect(get_ami_db_path())
-
-        # 查询 'ID'
-        query = "SELECT * FROM week_all WHERE ID = " + str(ID)
-        df_ami_raw = pd.read_sql(query, conn)
-        # 关闭数据库连接
-        conn.close()
-        end_time = time.time()
-        print(
-            f"DEBUG: finished reading ami db, execution_time: {(end_time-start_time):.2f}s"
-        )
-        df_ami_raw["variable"] = pd.to_datetime(
-            df_ami_raw["variable"], format="%H:%M:%S.%f"
-        ).dt.strftime("%H:%M")
+            # 從 AMI store 取出代表週負載，沒有 store 時退回 SQLite
+            df_ami_raw = ami_store.load_ami_profile(ID, db_path=get_ami_db_path())
 
-        origin_capacity = int(df_ami_raw["value"].max().round())
-        # 縮放
-        df_ami_raw["value"] = (
-            df_ami_raw["value"] * main_contract_capacity / origin_capacity
-        ).round()
+            # 同一 ID 上一次的小時曲線還在時，只重算有變動的 (代表日, 小時) 格子
+            previous = ami_cache.get_last_hourly_scaling(ID, tou_program, df_tou_2025)
+            if previous is not None and len(previous["df_ami"]) == len(df_ami_raw):
+                changed_hourly = config_loader.diff_hourly_dicts(
+                    previous["hourly"], json_ami_hourly_update
+                )
+                df_ami = config_loader.rescale_15min_by_hour(
+                    previous["df_ami"], df_ami_raw, changed_hourly
+                )
+            else:
+                df_ami = config_loader.norm_ami(
+                    config_loader.scale_15min_by_hour(
+                        df_ami_raw, json_ami_hourly_update
+                    ),
+                    df_tou_2025,
+                    tou_program,
+                )
+            ami_cache.put_last_hourly_scaling(
+                ID, tou_program, df_tou_2025, json_ami_hourly_update, df_ami
+            )
+            return df_ami
+        elif (json_ami_15min is not None) and (len(json_ami_15min) > 0):
+            print("[debug] 3. 使用手動曲線更新縮放 AMI 數據")
+            df_ami_raw = config_loader.ami_15min_json_to_df(json_ami_15min)
+
+        else:
+            # 依據輸入契約容量，縮放 AMI 數據，直接用最大負載作為契約容量，與負載生成時一樣
+            # origin_capacity = int(df_ami_raw["value"].max().round() / 0.9)
+            print("[debug] 1. 使用契約容量縮放 AMI 數據")
+            start_time = time.time()
+            print("DEBUG: start reading ami db")
+            # 從 AMI store 取出代表週負載，沒有 store 時退回 SQLite
+            df_ami_raw = ami_store.load_ami_profile(ID, db_path=get_ami_db_path())
+            end_time = time.time()
+            print(
+                f"DEBUG: finished reading ami db, execution_time: {(end_time-start_time):.2f}s"
+            )
+
+            origin_capacity = int(df_ami_raw["value"].max().round())
+            # 縮放
+            df_ami_raw["value"] = (
+                df_ami_raw["value"] * main_contract_capacity / origin_capacity
+            ).round()
+
+        return config_loader.norm_ami(df_ami_raw, df_tou_2025, tou_program)
 
-    df_ami = config_loader.norm_ami(df_ami_raw, df_tou_2025, tou_program)
+    # 同一組 AMI 輸入在 warm container 內重複試算時，直接取用快取的 norm_ami 結果
+    ami_cache_key = ami_cache.make_key(
+        ID,
+        tou_program,
+        json_ami_hourly_update=json_ami_hourly_update,
+        json_ami_15min=json_ami_15min,
+        main_contract_capacity=main_contract_capacity,
+    )
+    df_ami = ami_cache.get_or_build(
+        ami_cache_key, df_tou_2025, tou_program, build_df_ami
+    )
 
     dict_annual_cost_summary = config_loader.calculator_annual_cost(
         df_ami,
@@ -1140,137 +1556,72 @@ def run_all_simulations(
         "年節省基本電費_契約調整(元)"
     ]
 
-    # 依據契約容量，決定台數
-    if units is None:
-        台數選項 = calculator.generate_fixed_step_combinations(
-            int(main_contract_capacity * 0.8),
-            pcs_power=int(config["儲能系統"]["單台 PCS 標稱功率"]),
-            max_groups=4,
-        )
-    else:
-        台數選項 = units
-
-    # 如果沒有台數選項，則設為1
-    if not 台數選項:
-        台數選項 = [1]
-
-    print("[debug] 台數選項", 台數選項)
-
-    # 判斷模式組合
-    dr有值 = bool(dr方案選項)
-    sp有值 = bool(即時備轉方案選項)
-    lc有值 = bool(用電大戶方案)
-
-    # 共用 energy_only
-    simulate_energy_only(台數選項, config, df_ami, year, results, mode, dict_summary)
-
-    # 各功能模組呼叫
-    # 1.A 只有lc
-    if lc有值 and not dr有值 and not sp有值:
-        simulate_lc(
-            台數選項, 用電大戶方案, config, df_ami, year, results, mode, dict_summary
-        )
-    # 1.B 只有dr
-    if dr有值 and not sp有值 and not lc有值:
-        simulate_dr(
-            台數選項, dr方案選項, config, df_ami, year, results, mode, dict_summary
-        )
+    pcs_power = int(config["儲能系統"]["單台 PCS 標稱功率"])
+    # 與方案無關的 AMI 計算在各情境間共用，每個 PCS 功率只算一次
+    ami_context = ami_analysis.build_ami_context(
+        df_ami, tou_program, config["電價方案"]["契約容量"]["new"]
+    )
 
-    # 1.C 只有即時備轉
-    if not dr有值 and sp有值 and not lc有值:
-        simulate_sp(
-            台數選項,
-            即時備轉方案選項,
+    if sizing_search is not None:
+        # 搜尋範圍與格點相同：1 ~ 契約容量 8 成可裝的台數，並以原本的格點為起點
+        max_units = max(1, int(main_contract_capacity * 0.8) // pcs_power)
+        print("[debug] 台數搜尋範圍", (1, max_units), "目標", sizing_search)
+        plan, outputs, evaluations = search_scenario_units(
             config,
             df_ami,
+            build_scenario_plan([1], dr方案選項, 即時備轉方案選項, 用電大戶方案),
+            max_units,
             year,
-            results,
-            mode,
-            dict_summary,
+            seeds=calculator.generate_fixed_step_combinations(
+                int(main_contract_capacity * 0.8), pcs_power=pcs_power, max_groups=4
+            ),
+            objective=sizing_search,
+            discount_rate=discount_rate,
+            max_workers=max_workers,
+            executor=executor,
+            ami_context=ami_context,
         )
+        for scenario, (gain, _, _) in zip(plan, outputs):
+            gain["評估次數"] = evaluations[scenario["mode_key"]]
+    else:
+        # 依據契約容量，決定台數
+        if units is None:
+            台數選項 = calculator.generate_fixed_step_combinations(
+                int(main_contract_capacity * 0.8),
+                pcs_power=pcs_power,
+                max_groups=4,
+            )
+        else:
+            台數選項 = units
 
-    # 2.A  DR + 即時備轉方案
-    if dr有值 and sp有值 and not lc有值:
-        simulate_dr(
-            台數選項, dr方案選項, config, df_ami, year, results, mode, dict_summary
-        )
-        simulate_sp(
-            台數選項,
-            即時備轉方案選項,
-            config,
-            df_ami,
-            year,
-            results,
-            mode,
-            dict_summary,
-        )
-        simulate_dr_sp(
-            台數選項,
-            dr方案選項,
-            即時備轉方案選項,
-            config,
-            df_ami,
-            year,
-            results,
-            mode,
-            dict_summary,
-        )
+        # 如果沒有台數選項，則設為1
+        if not 台數選項:
+            台數選項 = [1]
 
-    # 2.B  DR + 用電大戶方案
-    if dr有值 and not sp有值 and lc有值:
-        simulate_dr(
-            台數選項, dr方案選項, config, df_ami, year, results, mode, dict_summary
-        )
-        simulate_lc(
-            台數選項, 用電大戶方案, config, df_ami, year, results, mode, dict_summary
-        )
-        # simulate_dr_sp(台數選項, dr方案選項, 用電大戶方案, config, df_ami, year, results, mode, dict_summary)
+        print("[debug] 台數選項", 台數選項)
 
-    # 2.C  即時備轉 + 用電大戶方案
-    if not dr有值 and sp有值 and lc有值:
-        simulate_sp(
-            台數選項,
-            即時備轉方案選項,
+        # 列出所有情境後平行試算，結果依 plan 順序合併
+        plan = build_scenario_plan(台數選項, dr方案選項, 即時備轉方案選項, 用電大戶方案)
+        outputs = execute_scenario_plan(
+            plan,
             config,
             df_ami,
             year,
-            results,
-            mode,
-            dict_summary,
-        )
-        simulate_lc(
-            台數選項, 用電大戶方案, config, df_ami, year, results, mode, dict_summary
+            max_workers=max_workers,
+            executor=executor,
+            ami_context=ami_context,
         )
-        # simulate_dr_sp(台數選項, 即時備轉方案選項, 用電大戶方案, config, df_ami, year, results, mode, dict_summary)
 
-    # 3. 全部
-    if dr有值 and sp有值 and lc有值:
-        simulate_lc(
-            台數選項, 用電大戶方案, config, df_ami, year, results, mode, dict_summary
-        )
-        simulate_dr(
-            台數選項, dr方案選項, config, df_ami, year, results, mode, dict_summary
-        )
-        simulate_sp(
-            台數選項,
-            即時備轉方案選項,
-            config,
-            df_ami,
-            year,
-            results,
-            mode,
-            dict_summary,
-        )
-        simulate_dr_sp(
-            台數選項,
-            dr方案選項,
-            即時備轉方案選項,
-            config,
-            df_ami,
-            year,
+    for scenario, (gain, df, scenario_config) in zip(plan, outputs):
+        run_and_store(
+            scenario["mode_key"],
+            scenario["台數"],
+            df,
             results,
             mode,
             dict_summary,
+            gain,
+            scenario_config,
         )
 
     # 合併結果
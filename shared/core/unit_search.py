@@ -0,0 +1,145 @@
+"""
+台數的最佳化搜尋
+
+generate_fixed_step_combinations 只取最多 4 個等距的台數，每個模式都完整試算，
+最佳台數只能落在格點上。這裡把目標值（IRR 或 NPV）視為台數的單峰函數，
+以整數的黃金分割搜尋 (golden-section search) 逐步縮小區間：
+
+- 先試算起始格點（如原本的 4 個台數，一定加上搜尋範圍的兩端），
+  每個局部最大的格點各以左右相鄰的格點為一個初始區間，分別搜尋：
+  目標值在台數間可能有跳動（如即時備轉的投標門檻），只追最佳格點會錯過
+  另一側的峰值（例如 1 台最好，但 8 台是格點中最好的）；
+  IRR 無解 (NaN) 的台數無法比較大小，有格點可避免整段區間都落在 NaN 上，
+  結果也一定不比格點差
+- 每一輪各模式、各區間只需要 1~2 個新的台數，試算過的台數直接取用（memoize）
+- 所有模式同步推進，同一輪需要的台數一次交給 evaluate（可平行試算）
+- 區間縮到 3 台以內時全部試算，取所有試算過的台數中目標值最大者
+
+4 個格點加上兩端時，每個局部最大的區間約需 log_φ(區間長度 / 2) + 2 次試算，
+單峰時在 [1, N] 台中共約 6 + log_φ(N / 4) + 2 次（N = 36 時約 13 次），
+逐台試算則需 N 次。
+
+用法：
+    best = unit_search.golden_section_search(
+        ["電價套利"], 1, 40, evaluate, seeds=[10, 20, 30, 40]
+    )
+    best["電價套利"]["台數"]
+"""
+
+import math
+
+# 黃金比例的倒數 (√5 - 1) / 2 ≈ 0.618
+GOLDEN = (math.sqrt(5) - 1) / 2
+
+
+def _score(value):
+    """目標值為 NaN（如 IRR 無解）時視為最差"""
+    return -math.inf if value is None or math.isnan(value) else value
+
+
+def _probe_points(lo, hi):
+    """區間 [lo, hi] 內的兩個試算點 c < d，縮小區間後其中一點會與下一輪重複"""
+    offset = round((hi - lo) * (1 - GOLDEN))
+    c, d = lo + offset, hi - offset
+    if c >= d:
+        d = c + 1
+    return c, d
+
+
+def _narrow(lo, hi, values):
+    """
+    以已試算的值縮小區間，直到需要新的試算或區間已不超過 3 台。
+
+    Returns:
+        tuple: (lo, hi, 需要試算的台數)
+    """
+    while hi - lo > 2:
+        c, d = _probe_points(lo, hi)
+        missing = [units for units in (c, d) if units not in values]
+        if missing:
+            return lo, hi, missing
+        score_c, score_d = _score(values[c]), _score(values[d])
+        if score_c == score_d == -math.inf:
+            # 兩點都無解時無法比較，往目前最佳（有解）的台數靠近
+            move_up = _best_units(values) > d
+        else:
+            # 相同時保留台數較少的一側
+            move_up = score_c < score_d
+        if move_up:
+            lo = c
+        else:
+            hi = d
+    return lo, hi, [units for units in range(lo, hi + 1) if units not in values]
+
+
+def _best_units(values):
+    """目標值最大的台數；相同時取台數較少者"""
+    return max(sorted(values), key=lambda units: _score(values[units]))
+
+
+def _seed_brackets(seeds, values):
+    """
+    每個局部最大的起始格點，以左右相鄰的格點為一個初始區間。
+    seeds 已排序且包含搜尋範圍的兩端；所有格點都無解時以整個範圍為區間。
+    """
+    scores = [_score(values[units]) for units in seeds]
+    if max(scores) == -math.inf:
+        return [(seeds[0], seeds[-1])]
+
+    brackets = []
+    for i, score in enumerate(scores):
+        left = scores[i - 1] if i > 0 else -math.inf
+        right = scores[i + 1] if i + 1 < len(seeds) else -math.inf
+        if score > -math.inf and score >= left and score >= right:
+            brackets.append((seeds[max(i - 1, 0)], seeds[min(i + 1, len(seeds) - 1)]))
+    return brackets
+
+
+def golden_section_search(keys, lo, hi, evaluate, seeds=None):
+    """
+    對每個 key 在 [lo, hi] 台中搜尋目標值最大的台數。
+
+    Parameters:
+        keys: 要搜尋的模式（如 mode_key）
+        lo, hi: 台數的搜尋範圍（含兩端）
+        evaluate: callable，傳入 [(key, 台數), ...]，回傳同順序的目標值
+        seeds: 起始格點，另外一定會試算 lo 與 hi；None 時只以兩端為起始格點
+
+    Returns:
+        dict: {key: {'台數': 最佳台數, 'value': 目標值, 'evaluations': {台數: 目標值}}}
+    """
+    if lo < 1 or hi < lo:
+        raise ValueError(f"台數搜尋範圍錯誤: [{lo}, {hi}]")
+
+    evaluations = {key: {} for key in keys}
+
+    # 搜尋範圍的兩端一定試算
+    seeds = sorted({units for units in seeds or [] if lo <= units <= hi} | {lo, hi})
+    requests = [(key, units) for key in keys for units in seeds]
+    for (key, units), value in zip(requests, evaluate(requests)):
+        evaluations[key][units] = value
+    brackets = {key: _seed_brackets(seeds, evaluations[key]) for key in keys}
+
+    while True:
+        requests = []
+        for key in keys:
+            narrowed = []
+            for bracket in brackets[key]:
+                key_lo, key_hi, missing = _narrow(*bracket, evaluations[key])
+                narrowed.append((key_lo, key_hi))
+                requests += [(key, units) for units in missing]
+            brackets[key] = narrowed
+
+        # 不同區間可能需要同一個台數
+        requests = list(dict.fromkeys(requests))
+        if not requests:
+            break
+        for (key, units), value in zip(requests, evaluate(requests)):
+            evaluations[key][units] = value
+
+    result = {}
+    for key in keys:
+        values = evaluations[key]
+        best = _best_units(values)
+        result[key] = {"台數": best, "value": values[best], "evaluations": values}
+    return result
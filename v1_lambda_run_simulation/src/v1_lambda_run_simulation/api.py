@@ -1,14 +1,20 @@
 import asyncio
+import copy
 import json
 import math
 import time
 from typing import Any, Dict
 
-import pandas as pd
 from aws_lambda_powertools.utilities.typing import LambdaContext
 
-from shared.core.summary_generator import run_simulation
+from shared.core import ami_analysis, ami_wire, monte_carlo, sensitivity
+from shared.core.summary_generator import run_scenario, run_simulation
 from shared.utils.lambda_response import LambdaResponseBuilder
+from v1_lambda_run_simulation.schemas.run_simulation_batch_req import (
+    RunSimulationBatchRequest,
+    RunSimulationBatchResponse,
+    RunSimulationBatchResultData,
+)
 from v1_lambda_run_simulation.schemas.run_simulation_req import (
     RunSimulationRequest,
     RunSimulationResponse,
@@ -56,16 +62,23 @@ async def process_run_simulation(
 
         # Convert serialized df_ami back to DataFrame if needed
         df_ami_recover_start_time = time.time()
-        df_ami = None
         logger.info("[DEBUG] Start df_ami convert")
-        if request.df_ami and isinstance(request.df_ami, dict):
-            df_ami = pd.DataFrame(request.df_ami)
+        # 支援 ami_columnar_v1 精簡格式與舊的 DataFrame.to_dict() 格式
+        df_ami = ami_wire.df_ami_from_payload(request.df_ami)
         df_ami_recover_execution_time = time.time() - df_ami_recover_start_time
 
         logger.info(
             f"[DEBUG] Star run simulation: {request.task_id}, mode: {request.mode}"
         )
 
+        # run_simulation 會改動 config（如非夏月循環次數），
+        # 蒙地卡羅與敏感度分析使用原始設定的副本
+        original_config = (
+            copy.deepcopy(request.config)
+            if request.monte_carlo is not None or request.sensitivity is not None
+            else None
+        )
+
         run_simulation_start_time = time.time()
 
         # Execute run_simulation - this is the core logic from summary_generator.py
@@ -88,6 +101,49 @@ async def process_run_simulation(
             "config": config,
         }
 
+        # 蒙地卡羅：同一情境對電費、負載、衰減率、得標比例抽樣，回傳 IRR / ROI 的分布
+        monte_carlo_execution_time = 0.0
+        if request.monte_carlo is not None:
+            monte_carlo_start_time = time.time()
+            mc_result = monte_carlo.run_monte_carlo(
+                original_config,
+                df_ami,
+                request.unit,
+                mode=request.mode,
+                dr_program=request.dr_program,
+                sp_program=request.sp_program,
+                lc_program=request.lc_program,
+                year=request.year,
+                n_draws=request.monte_carlo.n_draws,
+                distributions=request.monte_carlo.distributions,
+                seed=request.monte_carlo.seed,
+                bins=request.monte_carlo.bins,
+            )
+            result["monte_carlo"] = sanitize_for_json(
+                monte_carlo.result_to_dict(mc_result)
+            )
+            monte_carlo_execution_time = time.time() - monte_carlo_start_time
+
+        # 敏感度分析：能量面沿用同一情境，只重算建置、維運、融資的行
+        sensitivity_execution_time = 0.0
+        if request.sensitivity is not None:
+            sensitivity_start_time = time.time()
+            sensitivity_result = sensitivity.run_sensitivity(
+                original_config,
+                df_ami,
+                request.unit,
+                [(axis.path, axis.values) for axis in request.sensitivity.axes],
+                mode=request.mode,
+                dr_program=request.dr_program,
+                sp_program=request.sp_program,
+                lc_program=request.lc_program,
+                year=request.year,
+            )
+            result["sensitivity"] = sanitize_for_json(
+                sensitivity.result_to_dict(sensitivity_result)
+            )
+            sensitivity_execution_time = time.time() - sensitivity_start_time
+
         # write_result_back_start_time = time.time()
         # # Write result back to database (commented for testing - using logger instead)
         # async with async_session_maker() as session:
@@ -113,6 +169,8 @@ async def process_run_simulation(
                 "unit": request.unit,
                 "df_ami convertion time": round(df_ami_recover_execution_time, 2),
                 "run_simulation time": round(run_simulation_execution_time, 2),
+                "monte_carlo time": round(monte_carlo_execution_time, 2),
+                "sensitivity time": round(sensitivity_execution_time, 2),
                 "total_execution_time": round(total_execution_time, 2),
                 "result_ROI": gain.get("ROI", "N/A"),
                 "result_IRR": gain.get("IRR", "N/A"),
@@ -172,6 +230,122 @@ async def process_run_simulation(
         )
 
 
+async def process_run_simulation_batch(
+    request: RunSimulationBatchRequest,
+) -> RunSimulationBatchResponse:
+    """
+    Process batch run simulation
+    df_ami 只轉換一次，與方案無關的 AMI 計算由 ami_context 在各情境間共用
+    """
+    start_time = time.time()
+
+    df_ami_recover_start_time = time.time()
+    df_ami = ami_wire.df_ami_from_payload(request.df_ami)
+    df_ami_recover_execution_time = time.time() - df_ami_recover_start_time
+
+    ami_context = None
+    if df_ami is not None:
+        ami_context = ami_analysis.build_ami_context(
+            df_ami,
+            request.config["電價方案"]["計費類別"],
+            request.config["電價方案"]["契約容量"]["new"],
+        )
+
+    logger.info(
+        f"[DEBUG] Start run simulation batch: {request.evaluate_var_result_id}, "
+        f"variants: {len(request.variants)}"
+    )
+
+    results = []
+    failed_count = 0
+    for variant in request.variants:
+        task_start_time = time.time()
+        scenario = {
+            "mode_key": variant.mode_key,
+            "台數": variant.unit,
+            "mode": variant.mode,
+            "dr_program": variant.dr_program,
+            "sp_program": variant.sp_program,
+            "lc_program": variant.lc_program,
+        }
+        try:
+            # config 會在 run_scenario 內 deepcopy，各情境互不影響
+            gain, df_summary, config = run_scenario(
+                request.config, df_ami, scenario, request.year, ami_context
+            )
+            task_execution_time = time.time() - task_start_time
+            results.append(
+                RunSimulationResultData(
+                    task_id=variant.task_id,
+                    evaluate_var_result_id=request.evaluate_var_result_id,
+                    task_result={
+                        "gain": gain,
+                        "df_summary": (
+                            df_summary.to_dict() if df_summary is not None else None
+                        ),
+                        "config": config,
+                    },
+                    execution_time=task_execution_time,
+                )
+            )
+            logger.info(
+                "Batch simulation task completed",
+                extra={
+                    "task_id": variant.task_id,
+                    "evaluate_var_result_id": request.evaluate_var_result_id,
+                    "mode_key": variant.mode_key,
+                    "unit": variant.unit,
+                    "run_simulation time": round(task_execution_time, 2),
+                    "result_ROI": gain.get("ROI", "N/A"),
+                    "result_IRR": gain.get("IRR", "N/A"),
+                },
+            )
+        except Exception as e:
+            task_execution_time = time.time() - task_start_time
+            failed_count += 1
+            logger.error(
+                "Batch simulation task failed",
+                extra={
+                    "task_id": variant.task_id,
+                    "evaluate_var_result_id": request.evaluate_var_result_id,
+                    "mode_key": variant.mode_key,
+                    "error_message": str(e),
+                    "execution_time": round(task_execution_time, 2),
+                },
+            )
+            results.append(
+                RunSimulationResultData(
+                    task_id=variant.task_id,
+                    evaluate_var_result_id=request.evaluate_var_result_id,
+                    error_message=str(e),
+                    execution_time=task_execution_time,
+                )
+            )
+
+    total_execution_time = time.time() - start_time
+    logger.info(
+        "Simulation batch completed",
+        extra={
+            "evaluate_var_result_id": request.evaluate_var_result_id,
+            "variants": len(request.variants),
+            "failed_count": failed_count,
+            "df_ami convertion time": round(df_ami_recover_execution_time, 2),
+            "total_execution_time": round(total_execution_time, 2),
+        },
+    )
+
+    return RunSimulationBatchResponse(
+        success=failed_count == 0,
+        result=RunSimulationBatchResultData(
+            evaluate_var_result_id=request.evaluate_var_result_id,
+            results=results,
+            failed_count=failed_count,
+            df_ami_convert_time=df_ami_recover_execution_time,
+            execution_time=total_execution_time,
+        ),
+    )
+
+
 async def async_handler(
     event: Dict[str, Any], context: LambdaContext
 ) -> Dict[str, Any]:
@@ -189,6 +363,19 @@ async def async_handler(
             # logger.info(f"req json body: {json.dumps(event)}")
             body = event
 
+        # 批次請求：共用 config 與 df_ami，逐一計算 variants 中的情境
+        # 部分情境失敗時仍回傳 200，個別錯誤記錄在 results[].error_message
+        if isinstance(body, dict) and "variants" in body:
+            batch_request = RunSimulationBatchRequest.model_validate(body)
+            batchRsps = await process_run_simulation_batch(batch_request)
+            response = LambdaResponseBuilder.success(
+                data=batchRsps.result.model_dump(),
+                message="" if batchRsps.success else "部分情境計算失敗",
+                status_code=200,
+            )
+            response["headers"]["Access-Control-Allow-Origin"] = "*"
+            return response
+
         request = RunSimulationRequest.model_validate(body)
 
         # Process simulation
@@ -0,0 +1,57 @@
+"""Schema for batch run simulation request"""
+
+from typing import List, Optional
+
+from pydantic import BaseModel, Field
+
+from v1_lambda_run_simulation.schemas.run_simulation_req import (
+    RunSimulationResultData,
+)
+
+
+class RunSimulationVariant(BaseModel):
+    """批次請求中的單一情境（共用批次的 config 與 df_ami）"""
+
+    unit: int = Field(..., description="台數")
+    mode: str = Field("energy_only", description="運作模式")
+    dr_program: Optional[str] = Field(None, description="DR 方案")
+    sp_program: Optional[str] = Field(None, description="即時備轉方案")
+    lc_program: Optional[str] = Field(None, description="用電大戶方案")
+    mode_key: str = Field(
+        ..., description="模式組合鍵 (例如: '電價套利-日選2h-即時單一')"
+    )
+    task_id: str = Field(..., description="此次模擬的唯一識別碼")
+
+
+class RunSimulationBatchRequest(BaseModel):
+    """批次模擬計算請求：同一 evaluate_var_result_id 的多個情境共用 config 與 df_ami"""
+
+    config: dict = Field(..., description="共用的配置參數")
+    df_ami: Optional[dict] = Field(
+        None,
+        description="AMI 數據 (DataFrame.to_dict() 或 ami_columnar_v1 精簡格式)",
+    )
+    year: int = Field(15, description="評估年限")
+    evaluate_var_result_id: str = Field(
+        ..., description="評估變數結果ID (用於群組識別)"
+    )
+    variants: List[RunSimulationVariant] = Field(
+        ..., min_length=1, description="要計算的情境列表"
+    )
+
+
+class RunSimulationBatchResultData(BaseModel):
+    evaluate_var_result_id: str = Field(..., description="群組ID")
+    results: List[RunSimulationResultData] = Field(
+        ..., description="各情境的計算結果，順序與 variants 相同"
+    )
+    failed_count: int = Field(0, description="失敗的情境數")
+    df_ami_convert_time: Optional[float] = Field(
+        None, description="df_ami 轉換時間 (秒)"
+    )
+    execution_time: Optional[float] = Field(None, description="總執行時間 (秒)")
+
+
+class RunSimulationBatchResponse(BaseModel):
+    success: bool = Field(..., description="所有情境是否皆成功")
+    result: RunSimulationBatchResultData = Field(..., description="批次計算結果")
@@ -1,22 +1,63 @@
 """Schema for run simulation request"""
 
-from typing import Optional
+from typing import List, Optional
 
 from pydantic import BaseModel, Field
 
 
+class MonteCarloOptions(BaseModel):
+    """蒙地卡羅分析的設定（shared.core.monte_carlo.run_monte_carlo）"""
+
+    n_draws: int = Field(10000, ge=1, le=100000, description="抽樣次數")
+    seed: Optional[int] = Field(None, description="亂數種子")
+    distributions: Optional[dict] = Field(
+        None,
+        description="覆蓋預設分布的參數 (例如: {'電費調整係數': {'dist': 'normal', 'mean': 1.0, 'std': 0.05}})",
+    )
+    bins: int = Field(50, ge=1, description="直方圖的區間數")
+
+
+class SensitivityAxis(BaseModel):
+    """敏感度分析的一個參數軸"""
+
+    path: List[str] = Field(
+        ...,
+        min_length=1,
+        description="config 欄位路徑 (例如: ['融資成本', '利息費用'])",
+    )
+    values: List[float] = Field(..., min_length=1, description="要試算的值")
+
+
+class SensitivityOptions(BaseModel):
+    """敏感度分析的設定（shared.core.sensitivity.run_sensitivity）"""
+
+    axes: List[SensitivityAxis] = Field(
+        ..., min_length=1, description="參數軸，網格為所有參數軸的值的組合"
+    )
+
+
 class RunSimulationRequest(BaseModel):
     """單一模擬計算請求"""
 
     # Core simulation parameters (extracted from run_simulation function)
     config: dict = Field(..., description="配置參數")
     unit: int = Field(..., description="台數")
-    df_ami: Optional[dict] = Field(None, description="AMI 數據 (序列化後的 DataFrame)")
+    df_ami: Optional[dict] = Field(
+        None,
+        description="AMI 數據 (DataFrame.to_dict() 或 ami_columnar_v1 精簡格式)",
+    )
     mode: str = Field("energy_only", description="運作模式")
     dr_program: Optional[str] = Field(None, description="DR 方案")
     sp_program: Optional[str] = Field(None, description="即時備轉方案")
     lc_program: Optional[str] = Field(None, description="用電大戶方案")
     year: int = Field(15, description="評估年限")
+    monte_carlo: Optional[MonteCarloOptions] = Field(
+        None, description="提供時另外回傳 IRR / ROI 的 P10 / P50 / P90 與直方圖"
+    )
+    sensitivity: Optional[SensitivityOptions] = Field(
+        None,
+        description="提供時另外回傳建置、維運、融資參數的 IRR / ROI 網格與龍捲風圖",
+    )
 
     # Additional metadata for result storage
     evaluate_var_result_id: str = Field(